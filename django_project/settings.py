@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 """
 
 import os
+import sys
 from decouple import config, Csv
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -28,6 +29,9 @@ SECRET_KEY = config('SECRET_KEY', default='buh1%m)5=9ge@*pw$ypg$vfh#41r#460rv9gt
 # Set DEBUG=False in production via environment variable
 DEBUG = config('DEBUG', default=True, cast=bool)
 
+# `manage.py test`: keeps tests off shared state and quiet (see CACHES, LOGGING)
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
 # Set ALLOWED_HOSTS via environment variable in production
 # Example: ALLOWED_HOSTS=example.com,www.example.com,api.example.com
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='127.0.0.1,localhost,0.0.0.0,testserver', cast=Csv())
@@ -49,7 +53,10 @@ INSTALLED_APPS = [
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'ingredient.middleware.RequestTimingMiddleware',
+    'ingredient.middleware.NPlusOneMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'ingredient.replicas.ReplicaMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -81,13 +88,68 @@ WSGI_APPLICATION = 'django_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
+# SQLite tuned for several workers (see ingredient/sqlite/base.py): WAL,
+# write transactions that take the lock when they begin, and retries with
+# jittered backoff when the database is locked anyway. The development
+# db.sqlite3 is tracked in git and switching it to WAL rewrites its header
+# and leaves -wal/-shm files beside it, so DEBUG keeps the rollback journal
+# unless SQLITE_JOURNAL_MODE says otherwise.
+SQLITE_JOURNAL_MODE = config('SQLITE_JOURNAL_MODE', default='DELETE' if DEBUG else 'WAL')
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'ingredient.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': SQLITE_JOURNAL_MODE,
+                # NORMAL is only crash-safe with WAL
+                'synchronous': 'NORMAL' if SQLITE_JOURNAL_MODE.upper() == 'WAL' else 'FULL',
+                'busy_timeout': config('SQLITE_BUSY_TIMEOUT_MS', default=5000, cast=int),
+                'cache_size': -config('SQLITE_CACHE_SIZE_KB', default=64 * 1024, cast=int),
+                'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+            },
+            'lock_retries': config('SQLITE_LOCK_RETRIES', default=5, cast=int),
+        },
     }
 }
 
+# Read-only copies of the database (comma-separated SQLite files, refreshed
+# with `manage.py sync_replicas`) that the read-only views read from; empty
+# reads everything from the primary. Tests use the primary for all of them.
+DATABASE_REPLICAS = config('DATABASE_REPLICAS', default='', cast=Csv())
+DATABASE_REPLICA_ALIASES = [f'replica_{index}' for index in range(len(DATABASE_REPLICAS))]
+for alias, name in zip(DATABASE_REPLICA_ALIASES, DATABASE_REPLICAS):
+    DATABASES[alias] = {**DATABASES['default'], 'NAME': name, 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['ingredient.replicas.ReplicaRouter']
+
+# Seconds a browser keeps reading from the primary after one of its requests
+# wrote; keep it longer than the interval between sync_replicas runs
+REPLICA_READ_AFTER_WRITE = config('REPLICA_READ_AFTER_WRITE', default=120, cast=int)
+
+# Every worker must share one cache: the version counters in
+# ingredient/caching.py are how a write in one worker makes the others
+# rebuild their indexes, price matrix, card fragments and ETags. Files in
+# CACHE_DIR are shared by the workers on one host; set REDIS_URL (needs the
+# redis package) to share them across hosts. Tests get a private in-memory
+# cache so they never clear or read the running site's.
+REDIS_URL = config('REDIS_URL', default='')
+if TESTING:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+elif REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR', default=os.path.join(BASE_DIR, '.django_cache')),
+            # Versions, card fragments, payloads and per-user state; culling
+            # only costs a rebuild, but keep it rare
+            'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=20000, cast=int)},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -134,6 +196,51 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Processes that resize uploaded recipe images into WebP/JPEG variants
+# (0 resizes inline, in the request that saved the image)
+IMAGE_VARIANT_WORKERS = config('IMAGE_VARIANT_WORKERS', default=2, cast=int)
+
+# Recipe view counts are buffered in memory and written in batches once
+# the buffer is this many seconds old or holds this many views
+VIEW_COUNT_FLUSH_INTERVAL = config('VIEW_COUNT_FLUSH_INTERVAL', default=5, cast=int)
+VIEW_COUNT_FLUSH_THRESHOLD = config('VIEW_COUNT_FLUSH_THRESHOLD', default=100, cast=int)
+
+# Seconds the community page's site totals are served before one request
+# recounts them in the background (stale totals are served meanwhile)
+COMMUNITY_STATS_TTL = config('COMMUNITY_STATS_TTL', default=300, cast=int)
+
+# Fraction of requests whose SQL/template timings are logged on
+# 'ingredient.timing' (0 disables, 1 times every request). Only DEBUG or
+# staff responses also carry them in a Server-Timing header.
+REQUEST_TIMING_SAMPLE_RATE = config('REQUEST_TIMING_SAMPLE_RATE', default=1.0 if DEBUG else 0.01, cast=float)
+
+# N+1 query detection for development and tests: 'log' or 'raise' when one
+# request runs the same query from the same line more than the threshold
+N_PLUS_ONE_MODE = config('N_PLUS_ONE_MODE', default='log' if DEBUG else 'off')
+N_PLUS_ONE_THRESHOLD = config('N_PLUS_ONE_THRESHOLD', default=5, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'ingredient': {
+            'handlers': ['console'],
+            'level': config('INGREDIENT_LOG_LEVEL', default='WARNING'),
+        },
+        # Sampled request timings are info lines; keep them out of test output
+        'ingredient.timing': {
+            'handlers': ['console'],
+            'level': config('REQUEST_TIMING_LOG_LEVEL', default='WARNING' if TESTING else 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Production Security Settings
 # Only apply strict settings if not in DEBUG mode
 if not DEBUG:
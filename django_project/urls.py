@@ -13,6 +13,7 @@ urlpatterns = [
     # Home & Recipes
     path('', ingredient_views.home, name='home'),
     path('recipes/', ingredient_views.recipes, name='recipes'),
+    path('recipes/search/', ingredient_views.recipe_search, name='recipe_search'),
     path('recipe/<int:recipe_id>/', ingredient_views.recipe_detail, name='recipe_detail'),
     
     # Legacy ingredient search (keep for compatibility)
@@ -46,14 +47,20 @@ urlpatterns = [
     # Shopping List
     path('shopping-list/', ingredient_views.shopping_list, name='shopping_list'),
     path('recipe/<int:recipe_id>/add-to-list/', ingredient_views.add_to_shopping_list, name='add_to_shopping_list'),
+    path('shopping-list/add-recipes/', ingredient_views.add_recipes_to_shopping_list, name='add_recipes_to_shopping_list'),
     path('shopping-list/<int:item_id>/toggle/', ingredient_views.toggle_shopping_item, name='toggle_shopping_item'),
     path('shopping-list/<int:item_id>/delete/', ingredient_views.delete_shopping_item, name='delete_shopping_item'),
     path('shopping-list/add-manual/', ingredient_views.add_manual_shopping_item, name='add_manual_shopping_item'),
     path('shopping-list/clear/', ingredient_views.clear_shopping_list, name='clear_shopping_list'),
+    path('api/shopping-list/cost/', ingredient_views.shopping_list_cost, name='shopping_list_cost'),
     
     # API endpoints (legacy)
     path('api/ingredient_id/<ingredientName>', ingredient_views.get_ingredientId),
+    path('api/ingredients/autocomplete/', ingredient_views.ingredient_autocomplete, name='ingredient_autocomplete'),
     path('api/match_recipe/', ingredient_views.get_match_recipe),
+    path('api/pantry/match/', ingredient_views.pantry_match, name='pantry_match'),
+    path('api/recipes/state/', ingredient_views.recipe_state_view, name='recipe_state'),
+    path('api/recipes/<int:recipe_id>/cost/', ingredient_views.recipe_cost, name='recipe_cost'),
 ]
 
 if settings.DEBUG:
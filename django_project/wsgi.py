@@ -7,6 +7,7 @@ For more information on this file, see
 https://docs.djangoproject.com/en/2.1/howto/deployment/wsgi/
 """
 
+import atexit
 import os
 
 from django.core.wsgi import get_wsgi_application
@@ -14,3 +15,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_project.settings')
 
 application = get_wsgi_application()
+
+# Write recipe views still buffered when a serving process exits
+from ingredient.counters import view_counter  # noqa: E402
+
+atexit.register(view_counter.flush)
@@ -4,6 +4,10 @@ from .models import (
     RecipeStep, Favorite, Rating, Review, ShoppingList, ShoppingListItem,
     IngredientPrice
 )
+from .cards import bump_card_versions
+from .pantry import invalidate_pantry_index
+from .search import reindex_recipes
+from .stats import mark_stats_stale
 
 
 # ============ LEGACY MODELS ============
@@ -65,13 +69,23 @@ class RecipeAdmin(admin.ModelAdmin):
     
     actions = ['publish_recipes', 'unpublish_recipes']
     
+    def _set_published(self, queryset, published):
+        # queryset.update() sends no signals, so refresh what they would have
+        recipe_ids = list(queryset.values_list('pk', flat=True))
+        updated = queryset.update(is_published=published)
+        bump_card_versions(recipe_ids)
+        reindex_recipes(recipe_ids)
+        invalidate_pantry_index()
+        mark_stats_stale()
+        return updated
+    
     def publish_recipes(self, request, queryset):
-        updated = queryset.update(is_published=True)
+        updated = self._set_published(queryset, True)
         self.message_user(request, f'{updated} recipe(s) published successfully.')
     publish_recipes.short_description = 'Publish selected recipes'
     
     def unpublish_recipes(self, request, queryset):
-        updated = queryset.update(is_published=False)
+        updated = self._set_published(queryset, False)
         self.message_user(request, f'{updated} recipe(s) unpublished successfully.')
     unpublish_recipes.short_description = 'Unpublish selected recipes'
 
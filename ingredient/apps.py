@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class IngredientConfig(AppConfig):
     name = 'ingredient'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,142 @@
+"""In-memory ingredient autocomplete.
+
+Every Ingredient and legacy ingredientItem name is kept in a sorted array
+of lowercase keys, one key per word start, so "pep" finds both "Pepper" and
+"Black Pepper". A prefix lookup is a bisect for the matching range followed
+by picking the k names used by the most recipes, with no database queries.
+The legacy search page asks for legacy names only, spelled and counted as
+in ingredientItem, because the match API compares them exactly.
+
+Each worker builds its own Completer. New ingredients are inserted in place;
+renames and deletes bump a shared version (see caching.py) so every worker
+rebuilds, and usage counts are refreshed by a rebuild every REFRESH_INTERVAL.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.db import transaction
+from django.db.models import Count
+
+from .caching import bump_version, bump_version_on_commit, get_version
+from .models import Ingredient, RecipeIngredient, ingredientItem, recipeItem
+
+COMPLETER_VERSION = 'ingredient-autocomplete'
+REFRESH_INTERVAL = 10 * 60
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 25
+
+_completer = None
+_lock = threading.Lock()
+
+
+def normalize(name):
+    return ' '.join(name.lower().split())
+
+
+class Completer:
+    """Prefix search over ingredient names, ranked by recipe usage"""
+
+    def __init__(self, version=None):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.keys = []
+        self.entries = {}
+        # Legacy names only: normalized -> [ingredientItem name, legacy recipes]
+        self.legacy = {}
+        self.legacy_ids = {}
+
+    @classmethod
+    def build(cls, version=None):
+        """Load both ingredient catalogs and their usage counts from the primary with four queries"""
+        completer = cls(version)
+        usage = dict(RecipeIngredient.objects.using('default').order_by().values('ingredient_id')
+                     .annotate(n=Count('id')).values_list('ingredient_id', 'n'))
+        for pk, name in Ingredient.objects.using('default').values_list('pk', 'name'):
+            completer.add(name, usage.get(pk, 0))
+
+        through = recipeItem.list_ingredient.through
+        usage = dict(through.objects.using('default').order_by().values('ingredientitem_id')
+                     .annotate(n=Count('id')).values_list('ingredientitem_id', 'n'))
+        for pk, name in ingredientItem.objects.using('default').values_list('pk', 'name'):
+            completer.add(name, usage.get(pk, 0), legacy=True)
+            completer.legacy_ids[name] = pk
+        return completer
+
+    def add(self, name, recipes=0, legacy=False):
+        """Insert a name, or add ``recipes`` to its count if it is already known"""
+        normalized = normalize(name)
+        if not normalized:
+            return
+        if legacy:
+            entry = self.legacy.get(normalized)
+            if entry is None:
+                self.legacy[normalized] = [name, recipes]
+            else:
+                entry[1] += recipes
+        entry = self.entries.get(normalized)
+        if entry is not None:
+            entry[1] += recipes
+            return
+        self.entries[normalized] = [name, recipes]
+        words = normalized.split(' ')
+        for i in range(len(words)):
+            insort(self.keys, (' '.join(words[i:]), normalized))
+
+    def complete(self, prefix, limit=DEFAULT_LIMIT, legacy=False):
+        """The ``limit`` most used names with a word starting with ``prefix``"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        entries = self.legacy if legacy else self.entries
+        keys = self.keys
+        matches = set()
+        for i in range(bisect_left(keys, (prefix,)), len(keys)):
+            key, normalized = keys[i]
+            if not key.startswith(prefix):
+                break
+            if normalized in entries:
+                matches.add(normalized)
+        best = heapq.nsmallest(limit, matches, key=lambda n: (-entries[n][1], n))
+        return [{'name': entries[n][0], 'recipes': entries[n][1]} for n in best]
+
+
+def get_completer():
+    """Return this worker's completer, rebuilding it if stale"""
+    global _completer
+    version = get_version(COMPLETER_VERSION)
+    completer = _completer
+    if (completer is not None and completer.version == version
+            and time.monotonic() - completer.built_at < REFRESH_INTERVAL):
+        return completer
+
+    with _lock:
+        if (_completer is None or _completer.version != version
+                or time.monotonic() - _completer.built_at >= REFRESH_INTERVAL):
+            _completer = Completer.build(version)
+        return _completer
+
+
+def add_ingredient_name(name, legacy_id=None):
+    """Insert a newly created ingredient into this worker's completer once committed"""
+    def add():
+        version = bump_version(COMPLETER_VERSION)
+        with _lock:
+            completer = _completer
+            if completer is None:
+                return
+            completer.add(name, legacy=legacy_id is not None)
+            if legacy_id is not None:
+                completer.legacy_ids[name] = legacy_id
+            # Keep using the patched copy unless another worker changed something too
+            if completer.version == version - 1:
+                completer.version = version
+    transaction.on_commit(add)
+
+
+def invalidate_completer():
+    """Make every worker rebuild its completer"""
+    global _completer
+    _completer = None
+    bump_version_on_commit(COMPLETER_VERSION)
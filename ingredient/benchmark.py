@@ -0,0 +1,284 @@
+"""Per-view performance benchmarks.
+
+BenchmarkRunner drives every URL in the project through the test client
+against whatever data is in the database and reports p50/p95 latency, the
+number of queries and the peak Python memory of each view. ``compare``
+checks a run against a saved baseline. The ``benchmark`` management command
+builds synthetic datasets at several scales and runs both.
+
+Each route in the URLconf needs a Scenario describing how to call it, so a
+new URL cannot silently go unbenchmarked (see tests.py).
+"""
+import json
+import platform
+import re
+import tracemalloc
+from time import perf_counter
+
+import django
+from django.db import connection
+from django.test import Client
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import timezone
+from django.views.static import serve
+
+from .middleware import record_query_patterns
+from .models import Recipe, ShoppingList, ShoppingListItem, ingredientItem
+
+RESULTS_VERSION = 1
+PASSWORD = 'demo123'
+
+_PARAM = re.compile(r'<(?:\w+:)?(\w+)>')
+
+
+def project_routes(resolver=None, prefix=''):
+    """Route strings of every project URL, excluding the admin and static files"""
+    routes = []
+    for pattern in (resolver or get_resolver()).url_patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            if getattr(pattern, 'app_name', None) == 'admin':
+                continue
+            routes.extend(project_routes(pattern, route))
+        elif isinstance(pattern, URLPattern) and pattern.callback is not serve:
+            if route not in routes:
+                routes.append(route)
+    return routes
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class Fixtures:
+    """Objects the scenarios point at; attribute names match URL parameters"""
+
+    def __init__(self, user, recipe, legacy_ingredient):
+        self.user = user
+        self.recipe_id = recipe.pk
+        self.ingredientId = legacy_ingredient.pk
+        self.ingredientName = legacy_ingredient.name
+        self.item_id = None
+        # A page of cards, for the bulk endpoints
+        self.recipe_ids = list(Recipe.objects.filter(is_published=True).order_by('-pk')
+                               .values_list('pk', flat=True)[:50])
+
+    @classmethod
+    def load(cls):
+        recipe = (Recipe.objects.filter(is_published=True, created_by__isnull=False)
+                  .select_related('created_by').order_by('pk').first())
+        legacy_ingredient = ingredientItem.objects.order_by('pk').first()
+        if recipe is None or legacy_ingredient is None:
+            raise ValueError('Benchmarks need at least one published recipe with an author '
+                             'and one legacy ingredient; generate a dataset first.')
+        user = recipe.created_by
+        user.set_password(PASSWORD)
+        user.save(update_fields=['password'])
+        return cls(user, recipe, legacy_ingredient)
+
+    def new_shopping_item(self):
+        shopping_list, _ = ShoppingList.objects.get_or_create(user=self.user)
+        self.item_id = ShoppingListItem.objects.create(
+            shopping_list=shopping_list, ingredient_name='Salt', amount=1, unit='kg').pk
+
+
+def _logged_out(client, fixtures):
+    client.logout()
+
+
+def _logged_in(client, fixtures):
+    client.force_login(fixtures.user)
+
+
+def _shopping_item(client, fixtures):
+    if fixtures.item_id is None or not ShoppingListItem.objects.filter(pk=fixtures.item_id).exists():
+        fixtures.new_shopping_item()
+
+
+def _new_shopping_item(client, fixtures):
+    fixtures.new_shopping_item()
+
+
+class Scenario:
+    """How to request one route: method, body, and whether to log in first"""
+
+    def __init__(self, route, method='get', login=True, data=None, json=None, setup=None):
+        self.route = route
+        self.method = method
+        self.login = login
+        self.data = data
+        self.json = json
+        self.setup = setup
+
+    @property
+    def name(self):
+        return f'{self.method.upper()} /{self.route}'
+
+    def path(self, fixtures):
+        return '/' + _PARAM.sub(lambda match: str(getattr(fixtures, match.group(1))), self.route)
+
+    def request(self, client, fixtures):
+        path = self.path(fixtures)
+        if self.json is not None:
+            body = self.json(fixtures) if callable(self.json) else self.json
+            return client.generic(self.method.upper(), path, data=json.dumps(body),
+                                  content_type='application/json')
+        data = self.data(fixtures) if callable(self.data) else self.data
+        return getattr(client, self.method)(path, data or {})
+
+
+SCENARIOS = [
+    Scenario(''),
+    Scenario('recipes/'),
+    Scenario('recipes/search/', data={'q': 'spicy pilau'}),
+    Scenario('recipe/<int:recipe_id>/'),
+    Scenario('ingredients/'),
+    Scenario('search/<int:ingredientId>/'),
+    Scenario('signup/', login=False),
+    Scenario('login/', method='post', login=False, setup=_logged_out,
+             data=lambda fixtures: {'username': fixtures.user.username, 'password': PASSWORD}),
+    Scenario('logout/', setup=_logged_in),
+    Scenario('profile/'),
+    Scenario('favorites/'),
+    Scenario('recipe/<int:recipe_id>/favorite/', method='post'),
+    Scenario('my-recipes/'),
+    Scenario('community/'),
+    Scenario('recipe/add/'),
+    Scenario('recipe/<int:recipe_id>/edit/'),
+    Scenario('recipe/<int:recipe_id>/comment/', method='post', data={'text': 'Benchmark comment'}),
+    Scenario('recipe/<int:recipe_id>/like/', method='post'),
+    Scenario('recipe/<int:recipe_id>/review/'),
+    Scenario('recipe/<int:recipe_id>/rating/', method='post', data={'score': '4'}),
+    Scenario('shopping-list/'),
+    Scenario('recipe/<int:recipe_id>/add-to-list/', method='post'),
+    Scenario('shopping-list/add-recipes/', method='post',
+             data=lambda fixtures: {'recipe_ids': [fixtures.recipe_id]}),
+    Scenario('shopping-list/<int:item_id>/toggle/', method='post', setup=_shopping_item),
+    Scenario('shopping-list/<int:item_id>/delete/', method='post', setup=_new_shopping_item),
+    Scenario('shopping-list/add-manual/', method='post',
+             json={'name': 'Tomatoes', 'amount': '2', 'unit': 'kg'}),
+    Scenario('shopping-list/clear/', method='post', setup=_new_shopping_item),
+    Scenario('api/shopping-list/cost/', data={'market': 'nairobi'}),
+    Scenario('api/ingredient_id/<ingredientName>'),
+    Scenario('api/ingredients/autocomplete/', data={'q': 'to'}),
+    Scenario('api/match_recipe/', method='post',
+             json=lambda fixtures: {'listIngredient': [fixtures.ingredientName]}),
+    Scenario('api/pantry/match/', data={'ingredients': 'onions,tomatoes,garlic,oil,salt,beef'}),
+    Scenario('api/recipes/state/', data=lambda fixtures: {'ids': ','.join(map(str, fixtures.recipe_ids))}),
+    Scenario('api/recipes/<int:recipe_id>/cost/', data={'servings': '8', 'market': 'mombasa'}),
+    Scenario('ai/'),
+    Scenario('statistic/'),
+]
+
+
+class BenchmarkRunner:
+    """Times each scenario ``iterations`` times after ``warmup`` untimed requests"""
+
+    def __init__(self, scenarios=None, iterations=20, warmup=2, routes=None):
+        self.scenarios = scenarios if scenarios is not None else SCENARIOS
+        if routes:
+            self.scenarios = [scenario for scenario in self.scenarios
+                              if any(route in scenario.route for route in routes)]
+        self.iterations = max(1, iterations)
+        self.warmup = max(0, warmup)
+
+    def run(self, fixtures=None):
+        """Return ``{scenario name: measurements}`` for every scenario"""
+        fixtures = fixtures or Fixtures.load()
+        return {scenario.name: self.measure(scenario, fixtures) for scenario in self.scenarios}
+
+    def measure(self, scenario, fixtures):
+        client = Client(raise_request_exception=False)
+        if scenario.login:
+            client.force_login(fixtures.user)
+
+        def prepare():
+            if scenario.setup:
+                scenario.setup(client, fixtures)
+
+        for _ in range(self.warmup):
+            prepare()
+            scenario.request(client, fixtures)
+
+        timings = []
+        for _ in range(self.iterations):
+            prepare()
+            start = perf_counter()
+            response = scenario.request(client, fixtures)
+            timings.append((perf_counter() - start) * 1000)
+
+        prepare()
+        with record_query_patterns() as recorder:
+            scenario.request(client, fixtures)
+
+        # Peak memory is measured on a separate request; tracing slows everything down
+        prepare()
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            scenario.request(client, fixtures)
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+
+        return {
+            'path': scenario.path(fixtures),
+            'status': response.status_code,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'queries': sum(recorder.patterns.values()),
+            'peak_memory_kib': round(peak / 1024, 1),
+        }
+
+
+def environment():
+    """Metadata stored with results so baselines are compared like for like"""
+    return {
+        'version': RESULTS_VERSION,
+        'created_at': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': f'{connection.vendor} {connection.Database.sqlite_version}'
+                    if connection.vendor == 'sqlite' else connection.vendor,
+        'machine': platform.machine(),
+    }
+
+
+def _slower(current, baseline, tolerance, min_ms):
+    return current > baseline * (1 + tolerance) and current - baseline >= min_ms
+
+
+def compare(current, baseline, tolerance=0.25, min_ms=1.0):
+    """Regressions of ``current`` against ``baseline`` as human-readable lines.
+
+    A view regresses when its p95 latency grows by more than ``tolerance``
+    (and by at least ``min_ms``, to ignore sub-millisecond noise) or when it
+    issues more queries. Running the migrations and loading each dataset are
+    checked the same way. Scales or views missing from either run are skipped.
+    """
+    regressions = []
+    if 'migrate_ms' in current and 'migrate_ms' in baseline:
+        if _slower(current['migrate_ms'], baseline['migrate_ms'], tolerance, min_ms):
+            regressions.append(f'migrations: {baseline["migrate_ms"]:.0f}ms -> {current["migrate_ms"]:.0f}ms')
+    for scale, result in current.get('scales', {}).items():
+        before = baseline.get('scales', {}).get(scale)
+        if before is None:
+            continue
+        if _slower(result['generate_ms'], before['generate_ms'], tolerance, min_ms):
+            regressions.append(f'[{scale}] dataset load: {before["generate_ms"]:.0f}ms -> {result["generate_ms"]:.0f}ms')
+        for name, view in result.get('views', {}).items():
+            old = before.get('views', {}).get(name)
+            if old is None:
+                continue
+            if _slower(view['p95_ms'], old['p95_ms'], tolerance, min_ms):
+                regressions.append(f'[{scale}] {name}: p95 {old["p95_ms"]:.1f}ms -> {view["p95_ms"]:.1f}ms')
+            if view['queries'] > old['queries']:
+                regressions.append(f'[{scale}] {name}: {old["queries"]} -> {view["queries"]} queries')
+    return regressions
@@ -0,0 +1,77 @@
+"""Shared version counters for in-process caches.
+
+Each worker keeps its own copy of structures like the ingredient index. A
+version number stored in Django's cache lets a write in one worker tell the
+others that their copy is stale, so the cache must be shared by every
+worker (see CACHES in settings.py); a per-process cache only reaches the
+worker that wrote.
+
+Versions are bumped after the write commits, so when two bumps race on a
+backend whose ``incr`` is not atomic (the file cache) and one increment is
+lost, no worker can have built its copy between the two writes: both were
+committed before either bump read the version.
+
+A version that is missing (never set, or evicted) starts again from the
+current time rather than from 1, so it never repeats a value that some
+worker or cached fragment was built against.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(name):
+    return f'nourish:version:{name}'
+
+
+def _initial_version():
+    return time.time_ns() // 1000
+
+
+def get_version(name):
+    """Return the current version of a named cache, creating it if missing"""
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """Increment the version of a named cache so every worker rebuilds it"""
+    key = _version_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+        return cache.incr(key)
+
+
+def bump_version_on_commit(name):
+    """Bump a version once the current transaction commits"""
+    transaction.on_commit(lambda: bump_version(name))
+
+
+def get_versions(names):
+    """Return ``{name: version}`` for several named caches with one cache read"""
+    keys = {_version_key(name): name for name in names}
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        start = _initial_version()
+        for key in missing:
+            cache.add(key, start, timeout=None)
+        found.update(cache.get_many(missing))
+    return {keys[key]: found.get(key) for key in keys}
+
+
+def bump_versions_on_commit(names):
+    """Bump several versions once the current transaction commits"""
+    names = list(names)
+
+    def bump():
+        for name in names:
+            bump_version(name)
+    transaction.on_commit(bump)
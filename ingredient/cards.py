@@ -0,0 +1,74 @@
+"""Cached recipe card fragments for the list pages.
+
+Each card is rendered once and stored under a key holding the recipe's
+``updated_at`` and its card version, a shared counter (see caching.py)
+bumped whenever something a card shows changes: the recipe itself, its
+ratings, reviews or ingredients. A page of cards is one read for the
+versions, one read for the fragments and a render only for the cards that
+missed.
+
+Versions are bumped by the signals in signals.py and by code that changes
+recipes with ``queryset.update()``, which sends no signals (for example the
+admin's publish actions). Old fragments are never deleted; they expire after
+CARD_TIMEOUT.
+"""
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from .caching import bump_versions_on_commit, get_versions
+from .conditional import bump_catalog, bump_recipe_pages
+from .replicas import REPLICA_VERSION
+
+CARD_TIMEOUT = 24 * 60 * 60
+# Change when the card templates change, so old fragments are not served
+MARKUP_VERSION = 3
+
+
+def _version_name(recipe_id):
+    return f'recipe-card:{recipe_id}'
+
+
+def bump_card_versions(recipe_ids):
+    """Make the cached cards of these recipes stale once the transaction commits.
+
+    Whatever a card shows is also on the recipe's page and the list pages,
+    so their ETags (see conditional.py) change with it.
+    """
+    recipe_ids = set(recipe_ids)
+    bump_versions_on_commit(_version_name(pk) for pk in recipe_ids)
+    bump_recipe_pages(recipe_ids)
+    bump_catalog()
+
+
+def render_cards(recipes, template_name, user=None):
+    """Render one card per recipe with ``template_name``, reusing cached fragments.
+
+    The template gets ``recipe`` and ``is_own`` (whether ``user`` wrote the
+    recipe), which is part of the cache key since it changes the markup.
+    """
+    recipes = list(recipes)
+    if not recipes:
+        return ''
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    versions = get_versions([REPLICA_VERSION, *(_version_name(recipe.pk) for recipe in recipes)])
+    # Cards read from a replica are only reused until the replicas are next refreshed
+    replicas = versions[REPLICA_VERSION]
+    keys = []
+    for recipe in recipes:
+        is_own = user_id is not None and recipe.created_by_id == user_id
+        version = versions[_version_name(recipe.pk)]
+        updated = recipe.updated_at.timestamp() if recipe.updated_at else 0
+        keys.append(f'nourish:card:{MARKUP_VERSION}:{template_name}:{recipe.pk}:{updated}:{version}.{replicas}:'
+                    f'{int(is_own)}')
+
+    fragments = cache.get_many(keys)
+    missing = {}
+    template = get_template(template_name)
+    for recipe, key in zip(recipes, keys):
+        if key not in fragments:
+            is_own = user_id is not None and recipe.created_by_id == user_id
+            fragments[key] = missing[key] = template.render({'recipe': recipe, 'is_own': is_own})
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+    return mark_safe(''.join(fragments[key] for key in keys))
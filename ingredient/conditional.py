@@ -0,0 +1,92 @@
+"""Conditional GET for recipe pages and JSON that rarely change.
+
+Views wrapped in conditional() get a weak ETag built from version counters
+(see caching.py) rather than from the response body, so a request whose
+If-None-Match still matches is answered with 304 before the view runs a
+query or renders a template. The versions are bumped on commit by the
+signals in signals.py:
+
+- ``recipe-page:<id>`` for anything recipe_detail shows about one recipe;
+- ``recipe-catalog`` for anything the list pages show (bumped together
+  with the card versions in cards.py);
+- ``user-state:<id>`` for a user's favorites, likes and ratings;
+- ``replica-sync`` whenever the read replicas are refreshed (see replicas.py).
+
+Logged-in users get validators that include their id and state version,
+so their pages never match the anonymous ones. Requests with pending flash
+messages always get a full response, so the messages are shown.
+"""
+import hashlib
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from .caching import bump_version_on_commit, bump_versions_on_commit, get_versions
+from .replicas import REPLICA_VERSION
+
+CATALOG_VERSION = 'recipe-catalog'
+
+
+def recipe_page_version(recipe_id):
+    return f'recipe-page:{recipe_id}'
+
+
+def user_state_version(user_id):
+    return f'user-state:{user_id}'
+
+
+def bump_recipe_pages(recipe_ids):
+    """Make the detail pages of these recipes stale once the transaction commits"""
+    bump_versions_on_commit(recipe_page_version(pk) for pk in set(recipe_ids))
+
+
+def bump_catalog():
+    """Make every recipe list page stale once the transaction commits"""
+    bump_version_on_commit(CATALOG_VERSION)
+
+
+def make_etag(names, *extra, user=None):
+    """A weak ETag over the named versions and any extra values.
+
+    With a logged-in ``user`` it also covers who they are and their state
+    version, so it never matches another user's or an anonymous ETag.
+    """
+    names = [*names, REPLICA_VERSION]
+    if user is not None and user.is_authenticated:
+        names.append(user_state_version(user.pk))
+        extra += (f'user:{user.pk}:{user.username}',)
+    parts = [str(version) for version in get_versions(names).values()]
+    parts.extend(str(value) for value in extra)
+    return 'W/"%s"' % hashlib.sha1('|'.join(parts).encode()).hexdigest()[:20]
+
+
+def conditional(etag_func, not_modified=None, private=True):
+    """Answer GET/HEAD with 304 when ``etag_func(request, *args, **kwargs)`` still matches.
+
+    ``not_modified`` is called instead of the view for a 304, for side
+    effects the view would have had (like counting a recipe view).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or (private and len(get_messages(request))):
+                return view(request, *args, **kwargs)
+
+            etag = etag_func(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=etag)
+            if response is not None:
+                if not_modified is not None:
+                    not_modified(request, *args, **kwargs)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                response.headers.setdefault('ETag', etag)
+            # Browsers must revalidate; shared caches must not keep per-user pages
+            patch_cache_control(response, no_cache=True, private=private or None)
+            if private:
+                patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
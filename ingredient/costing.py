@@ -0,0 +1,154 @@
+"""Recipe and shopping list cost estimates from IngredientPrice.
+
+PriceMatrix keeps every price row in memory as ingredient -> market ->
+[(unit, KES per unit, name)], plus a lookup from ingredient name to id because
+shopping list items only store a name. It is built with one query and kept
+by each worker until a price or ingredient change bumps its version (see
+caching.py), so pricing a recipe in all six markets costs one cache lookup
+for the version and no price queries.
+
+A line is priced in the requested market, falling back to the 'average'
+market, using the first price whose unit the line's quantity converts to
+(see units.py). Lines with no usable price are listed as unpriced rather
+than guessed.
+"""
+import threading
+from decimal import Decimal
+
+from .autocomplete import normalize
+from .caching import bump_version_on_commit, get_version
+from .models import IngredientPrice
+from .units import UnitConversionError, convert, quantize
+
+PRICE_VERSION = 'price-matrix'
+DEFAULT_MARKET = 'average'
+MARKETS = [market for market, _ in IngredientPrice.MARKET_CHOICES]
+MARKET_NAMES = dict(IngredientPrice.MARKET_CHOICES)
+
+_matrix = None
+_lock = threading.Lock()
+
+
+class PriceMatrix:
+    """Every ingredient price, keyed by ingredient id and market"""
+
+    def __init__(self, prices, ids, version=None):
+        self.prices = prices
+        self.ids = ids
+        self.version = version
+        # (ingredient id, unit, market) -> KES per one unit, or None
+        self._unit_costs = {}
+
+    @classmethod
+    def build(cls, version=None):
+        """Load every price row from the primary with one query"""
+        prices = {}
+        ids = {}
+        rows = (IngredientPrice.objects.using('default').order_by('ingredient_id', 'market', 'pk')
+                .values_list('ingredient_id', 'ingredient__name', 'market', 'unit', 'price_kes'))
+        for ingredient_id, name, market, unit, price in rows:
+            prices.setdefault(ingredient_id, {}).setdefault(market, []).append((unit, price, name))
+            ids.setdefault(normalize(name), ingredient_id)
+        return cls(prices, ids, version)
+
+    def ingredient_id(self, name):
+        """The id of a priced ingredient called ``name``, or None"""
+        return self.ids.get(normalize(name))
+
+    def unit_cost(self, ingredient_id, unit, market=DEFAULT_MARKET):
+        """KES for one ``unit`` of an ingredient in ``market``, or None if it cannot be priced"""
+        key = (ingredient_id, unit, market)
+        if key in self._unit_costs:
+            return self._unit_costs[key]
+        markets = self.prices.get(ingredient_id, {})
+        cost = None
+        # The average market stands in when this market has no price in a convertible unit
+        for price_unit, price, name in [*markets.get(market, ()), *markets.get(DEFAULT_MARKET, ())]:
+            try:
+                cost = convert(1, unit, price_unit, name) * price
+            except UnitConversionError:
+                continue
+            break
+        self._unit_costs[key] = cost
+        return cost
+
+    def estimate(self, lines, market=DEFAULT_MARKET, multiplier=1):
+        """Price ``(ingredient_id, name, amount, unit)`` lines, scaling amounts by ``multiplier``.
+
+        Returns ``{'total', 'lines', 'unpriced'}``; each line carries its
+        ``cost``, which is None when it could not be priced.
+        """
+        multiplier = Decimal(multiplier)
+        total = Decimal(0)
+        priced, unpriced = [], []
+        for ingredient_id, name, amount, unit in lines:
+            amount = Decimal(amount) * multiplier
+            per_unit = self.unit_cost(ingredient_id, unit, market) if ingredient_id is not None else None
+            cost = None if per_unit is None else quantize(amount * per_unit)
+            if cost is None:
+                unpriced.append(name)
+            else:
+                total += cost
+            priced.append({'ingredient': name, 'amount': quantize(amount), 'unit': unit, 'cost': cost})
+        return {'total': total, 'lines': priced, 'unpriced': unpriced}
+
+    def totals(self, lines, multiplier=1):
+        """Total cost of the lines in every market"""
+        return {market: self.estimate(lines, market, multiplier)['total'] for market in MARKETS}
+
+
+def get_price_matrix():
+    """Return this worker's price matrix, rebuilding it if a price changed"""
+    global _matrix
+    version = get_version(PRICE_VERSION)
+    matrix = _matrix
+    if matrix is not None and matrix.version == version:
+        return matrix
+
+    with _lock:
+        if _matrix is None or _matrix.version != version:
+            _matrix = PriceMatrix.build(version)
+        return _matrix
+
+
+def invalidate_price_matrix():
+    """Drop this worker's matrix and tell the other workers to drop theirs"""
+    global _matrix
+    _matrix = None
+    bump_version_on_commit(PRICE_VERSION)
+
+
+def _per_serving(total, servings):
+    return quantize(total / servings) if servings else None
+
+
+def recipe_lines(ingredients):
+    """Costing lines for RecipeIngredient objects with their ingredient loaded"""
+    return [(item.ingredient_id, item.ingredient.name, item.amount, item.unit) for item in ingredients]
+
+
+def cost_recipe(recipe, ingredients, servings=None, market=DEFAULT_MARKET):
+    """Estimate a recipe scaled to ``servings`` in ``market``, with totals for every market"""
+    matrix = get_price_matrix()
+    servings = servings or recipe.servings
+    multiplier = Decimal(servings) / recipe.servings if recipe.servings > 0 else 1
+    lines = recipe_lines(ingredients)
+    estimate = matrix.estimate(lines, market, multiplier)
+    estimate.update({
+        'recipe': recipe.pk,
+        'servings': servings,
+        'market': market,
+        'per_serving': _per_serving(estimate['total'], servings),
+        'markets': matrix.totals(lines, multiplier),
+    })
+    return estimate
+
+
+def cost_shopping_list(shopping_list, market=DEFAULT_MARKET):
+    """Estimate the items still to buy on a shopping list"""
+    matrix = get_price_matrix()
+    items = shopping_list.items.filter(is_purchased=False).values_list('ingredient_name', 'amount', 'unit')
+    lines = [(matrix.ingredient_id(name), name, amount, unit) for name, amount, unit in items]
+    estimate = matrix.estimate(lines, market)
+    estimate.update({'market': market, 'markets': matrix.totals(lines)})
+    return estimate
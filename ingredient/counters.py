@@ -0,0 +1,102 @@
+"""Write-behind buffer for recipe view counts.
+
+recipe_detail only bumps an in-memory counter. Pending counts are written
+with ``F()`` updates once the buffer is old or large enough, after the
+response has been sent (see signals.py). Recipes with the same pending
+count share a single UPDATE.
+
+Only the serving process (wsgi.py) also flushes at exit. Tests and
+management commands never do, so they cannot write buffered views into
+whichever database is configured once they finish. The price is that views
+still buffered when a process dies without a clean exit are lost: at most
+VIEW_COUNT_FLUSH_THRESHOLD views, or VIEW_COUNT_FLUSH_INTERVAL seconds of
+them.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounterBuffer:
+    """Collects per-recipe view increments and flushes them in batches"""
+
+    def __init__(self, interval=None, threshold=None):
+        self.interval = interval
+        self.threshold = threshold
+        self._pending = defaultdict(int)
+        self._total = 0
+        self._since = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _setting(self, name, default):
+        value = getattr(self, name)
+        if value is None:
+            value = getattr(settings, f'VIEW_COUNT_FLUSH_{name.upper()}', default)
+        return value
+
+    def increment(self, recipe_id):
+        with self._lock:
+            if not self._total:
+                # Age the buffer from its oldest pending view, not from the last flush
+                self._since = time.monotonic()
+            self._pending[recipe_id] += 1
+            self._total += 1
+
+    def pending(self, recipe_id):
+        """Views recorded for ``recipe_id`` that have not been written yet"""
+        return self._pending.get(recipe_id, 0)
+
+    def due(self):
+        """Whether the buffer is old or large enough to be flushed"""
+        if not self._total:
+            return False
+        return (self._total >= self._setting('threshold', 100)
+                or time.monotonic() - self._since >= self._setting('interval', 5))
+
+    def clear(self):
+        with self._lock:
+            self._pending = defaultdict(int)
+            self._total = 0
+            self._since = time.monotonic()
+
+    def flush(self):
+        """Write all pending counts, returning how many views were written"""
+        from .models import Recipe
+
+        with self._lock:
+            pending = self._pending
+            total = self._total
+            self._pending = defaultdict(int)
+            self._total = 0
+            self._since = time.monotonic()
+        if not pending:
+            return 0
+
+        by_count = defaultdict(list)
+        for recipe_id, count in pending.items():
+            by_count[count].append(recipe_id)
+
+        try:
+            with transaction.atomic():
+                for count, recipe_ids in by_count.items():
+                    Recipe.objects.filter(pk__in=recipe_ids).update(views_count=F('views_count') + count)
+        except Exception:
+            logger.exception('Could not flush %d recipe views; keeping them for the next flush', total)
+            with self._lock:
+                if not self._total:
+                    self._since = time.monotonic()
+                for recipe_id, count in pending.items():
+                    self._pending[recipe_id] += count
+                self._total += total
+            return 0
+        return total
+
+
+view_counter = ViewCounterBuffer()
@@ -0,0 +1,85 @@
+"""Query plans for the queries behind each view.
+
+explain_scenarios() requests every benchmark Scenario once with an empty
+cache, collects the distinct SELECTs it ran and asks SQLite for their
+``EXPLAIN QUERY PLAN``. A step is flagged when it reads a whole table
+(``SCAN <table>`` without an index) or sorts or groups in a temporary
+B-tree. The explain_hotpaths command runs it against a seeded throwaway
+database.
+"""
+import re
+
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .benchmark import SCENARIOS, Fixtures
+from .middleware import normalize_sql
+
+FULL_SCAN = 'full scan'
+TEMP_BTREE = 'temp b-tree'
+
+# "SCAN ingredient_recipe" or "SCAN TABLE ingredient_recipe AS r", but not
+# "SCAN ... USING INDEX", "SCAN CONSTANT ROW" or virtual tables
+_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def plan_issues(detail):
+    """What is wrong with one EXPLAIN QUERY PLAN step, if anything"""
+    issues = []
+    match = _FULL_SCAN.match(detail)
+    if match:
+        issues.append(f'{FULL_SCAN} of {match.group(1)}')
+    if 'USE TEMP B-TREE' in detail:
+        issues.append(f'{TEMP_BTREE} ({detail.removeprefix("USE TEMP B-TREE ").lower()})')
+    return issues
+
+
+def explain(sql, using=connection):
+    """``(plan steps, issues)`` for one SELECT"""
+    with using.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        steps = [row[3] for row in cursor.fetchall()]
+    return steps, [issue for step in steps for issue in plan_issues(step)]
+
+
+def explain_request(scenario, fixtures):
+    """Request one scenario and explain each distinct SELECT it ran"""
+    client = Client(raise_request_exception=False)
+    if scenario.login:
+        client.force_login(fixtures.user)
+    if scenario.setup:
+        scenario.setup(client, fixtures)
+    cache.clear()
+    with CaptureQueriesContext(connection) as captured:
+        response = scenario.request(client, fixtures)
+
+    plans, seen = [], set()
+    for query in captured.captured_queries:
+        sql = query['sql']
+        shape = normalize_sql(sql)
+        if shape in seen or not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            continue
+        seen.add(shape)
+        try:
+            steps, issues = explain(sql)
+        except DatabaseError as exc:
+            steps, issues = [], [f'could not explain: {exc}']
+        plans.append({'sql': sql, 'plan': steps, 'issues': issues})
+    return {
+        'path': scenario.path(fixtures),
+        'status': response.status_code,
+        'queries': len(captured.captured_queries),
+        'issues': sum(len(plan['issues']) for plan in plans),
+        'plans': plans,
+    }
+
+
+def explain_scenarios(scenarios=None, fixtures=None, routes=None):
+    """``{scenario name: explained queries}`` for every scenario"""
+    scenarios = scenarios if scenarios is not None else SCENARIOS
+    if routes:
+        scenarios = [scenario for scenario in scenarios if any(route in scenario.route for route in routes)]
+    fixtures = fixtures or Fixtures.load()
+    return {scenario.name: explain_request(scenario, fixtures) for scenario in scenarios}
@@ -0,0 +1,158 @@
+"""Resized WebP and JPEG variants of recipe images.
+
+Every recipe image, whether uploaded to ``recipe_images/`` or one of the
+bundled ``static/images/`` files, gets one WebP and one JPEG copy per
+width in WIDTHS (never wider than the original). Variants are named after
+a hash of the original's content, ``recipe_images/variants/<hash>-<width>.<ext>``,
+so identical uploads share files and a replaced image never reuses stale
+ones. Recipe.image_variants records the hash, the widths built and the
+image they were built from; the recipe_image template tag turns that into
+``srcset`` markup and falls back to the original until variants exist.
+
+Resizing runs in a process pool (IMAGE_VARIANT_WORKERS) once the upload
+has committed, so the request that saved the recipe never waits for it.
+With IMAGE_VARIANT_WORKERS = 0 variants are built inline, which is what
+the tests and the build_image_variants command use.
+
+This module imports no models at load time: pool workers import it to run
+render_variants() without setting Django up.
+"""
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+WIDTHS = (320, 640, 1024)
+FORMATS = (('webp', 'WEBP', {'quality': 80, 'method': 4}),
+           ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}))
+VARIANT_DIR = 'recipe_images/variants'
+UPLOAD_PREFIX = 'recipe_images/'
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def variant_name(digest, width, ext):
+    return f'{VARIANT_DIR}/{digest}-{width}.{ext}'
+
+
+def render_variants(data):
+    """Resize one image; returns ``(digest, (width, height), widths, [(name, bytes), ...])``.
+
+    Runs in pool workers, so it only uses Pillow and the arguments.
+    """
+    from PIL import Image, ImageOps
+
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    size = image.size
+    widths = [width for width in WIDTHS if width < size[0]] or [size[0]]
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        rgba = image.convert('RGBA')
+        flat = Image.new('RGB', rgba.size, (255, 255, 255))
+        flat.paste(rgba, mask=rgba.getchannel('A'))
+    else:
+        rgba, flat = image, image.convert('RGB')
+
+    files = []
+    for width in widths:
+        height = max(1, round(size[1] * width / size[0]))
+        for ext, fmt, options in FORMATS:
+            source = rgba if fmt == 'WEBP' else flat
+            resized = source if width == size[0] else source.resize((width, height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, fmt, **options)
+            files.append((variant_name(digest, width, ext), buffer.getvalue()))
+    return digest, size, widths, files
+
+
+def read_source(image_name):
+    """Bytes of a recipe image, from media storage or the bundled static images"""
+    if image_name.startswith(UPLOAD_PREFIX) and default_storage.exists(image_name):
+        with default_storage.open(image_name, 'rb') as source:
+            return source.read()
+    # Some seeded recipes point at recipe_images/ for files that only ship in static/images/
+    path = finders.find(f"images/{image_name.rsplit('/', 1)[-1]}")
+    if path is None:
+        raise FileNotFoundError(image_name)
+    with open(path, 'rb') as source:
+        return source.read()
+
+
+def store_variants(recipe_id, image_name, rendered):
+    """Save rendered variants and record them on the recipe, if its image is unchanged"""
+    from .cards import bump_card_versions
+    from .models import Recipe
+
+    digest, (width, height), widths, files = rendered
+    for name, content in files:
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(content))
+    variants = {
+        'source': image_name,
+        'hash': digest,
+        'widths': widths,
+        'width': width,
+        'height': height,
+    }
+    updated = Recipe.objects.filter(pk=recipe_id, image=image_name).update(image_variants=variants)
+    if updated:
+        bump_card_versions([recipe_id])
+    return updated
+
+
+def build_variants(recipe_id, image_name):
+    """Build and store the variants of one image in this process"""
+    return store_variants(recipe_id, image_name, render_variants(read_source(image_name)))
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS)
+        return _executor
+
+
+def _stored(recipe_id, image_name, submitter, future):
+    try:
+        store_variants(recipe_id, image_name, future.result())
+    except Exception:
+        logger.exception('Could not build variants of %s for recipe %s', image_name, recipe_id)
+    finally:
+        # Usually called on the pool's result thread, which gets its own connection
+        if threading.current_thread() is not submitter:
+            connection.close()
+
+
+def schedule_variants(recipe_id, image_name):
+    """Build an image's variants in the process pool once the current transaction commits"""
+    def submit():
+        try:
+            if settings.IMAGE_VARIANT_WORKERS <= 0:
+                build_variants(recipe_id, image_name)
+                return
+            future = _get_executor().submit(render_variants, read_source(image_name))
+        except Exception:
+            logger.exception('Could not build variants of %s for recipe %s', image_name, recipe_id)
+            return
+        submitter = threading.current_thread()
+        future.add_done_callback(lambda done: _stored(recipe_id, image_name, submitter, done))
+    transaction.on_commit(submit)
+
+
+def needs_variants(recipe):
+    """Whether the recipe has an image whose variants are missing or out of date"""
+    return bool(recipe.image) and (recipe.image_variants or {}).get('source') != recipe.image.name
@@ -0,0 +1,107 @@
+import json
+from time import perf_counter
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from ingredient.benchmark import BenchmarkRunner, compare, environment
+from ingredient.counters import view_counter
+from ingredient.synthetic import DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = ('Benchmark every view against synthetic datasets in a throwaway test database '
+            'and report latency, queries and memory as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', nargs='+', type=int, default=[1000],
+                            help='Recipe counts to benchmark, e.g. --scales 1000 100000 1000000')
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Synthetic users per dataset (default: 1000)')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Dataset seed (default: 0)')
+        parser.add_argument('--iterations', type=int, default=20,
+                            help='Timed requests per view (default: 20)')
+        parser.add_argument('--warmup', type=int, default=2,
+                            help='Untimed requests per view before timing (default: 2)')
+        parser.add_argument('--routes', nargs='+',
+                            help='Only benchmark routes containing one of these strings')
+        parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+        parser.add_argument('--baseline', help='Compare against results saved by an earlier --output')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p95 slowdown before a view counts as regressed (default: 0.25)')
+        parser.add_argument('--test-db-name',
+                            help='Build the datasets in this SQLite file instead of in memory '
+                                 '(use for large scales)')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Could not read baseline {options["baseline"]}: {exc}')
+
+        runner = BenchmarkRunner(iterations=options['iterations'], warmup=options['warmup'],
+                                 routes=options['routes'])
+        if options['test_db_name']:
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = options['test_db_name']
+
+        results = {**environment(), 'iterations': runner.iterations, 'scales': {}}
+        setup_test_environment(debug=False)
+        started = perf_counter()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        results['migrate_ms'] = round((perf_counter() - started) * 1000, 1)
+        try:
+            # Replica aliases point at the live replica files, not the seeded test database
+            with override_settings(N_PLUS_ONE_MODE='off', DATABASE_REPLICA_ALIASES=[]):
+                for scale in options['scales']:
+                    results['scales'][str(scale)] = self.benchmark_scale(scale, runner, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.print_summary(results)
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = compare(results, baseline, tolerance=options['tolerance'])
+            if regressions:
+                for line in regressions:
+                    self.stderr.write(f'  {line}')
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+            self.stderr.write(self.style.SUCCESS(f'✅ No regressions against {options["baseline"]}'))
+
+    def benchmark_scale(self, scale, runner, options):
+        """Load ``scale`` recipes into the emptied test database and benchmark it"""
+        self.stderr.write(f'⏱️  Benchmarking {scale} recipes...')
+        call_command('flush', interactive=False, verbosity=0)
+        cache.clear()
+        view_counter.clear()
+        started = perf_counter()
+        DatasetGenerator(recipes=scale, users=options['users'], seed=options['seed']).run()
+        generated = perf_counter()
+        views = runner.run()
+        view_counter.clear()
+        return {
+            'generate_ms': round((generated - started) * 1000, 1),
+            'views': views,
+        }
+
+    def print_summary(self, results):
+        self.stdout.write(f'Migrations: {results["migrate_ms"]:.0f}ms')
+        for scale, result in results['scales'].items():
+            self.stdout.write(f'{scale} recipes (generated in {result["generate_ms"]:.0f}ms)')
+            for name, view in result['views'].items():
+                self.stdout.write(f'  {name:<45} {view["status"]:>3}  p50 {view["p50_ms"]:>8.1f}ms  '
+                                  f'p95 {view["p95_ms"]:>8.1f}ms  {view["queries"]:>3} queries  '
+                                  f'{view["peak_memory_kib"]:>8.1f} KiB')
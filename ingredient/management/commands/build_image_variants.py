@@ -0,0 +1,59 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from ingredient.images import needs_variants, read_source, render_variants, store_variants
+from ingredient.models import Recipe
+
+BATCH_SIZE = 32
+
+
+class Command(BaseCommand):
+    help = 'Build the resized WebP/JPEG variants of recipe images, uploaded and static'
+
+    def add_arguments(self, parser):
+        parser.add_argument('recipe_ids', nargs='*', type=int,
+                            help='Only these recipes (default: every recipe with an image)')
+        parser.add_argument('--force', action='store_true',
+                            help='Rebuild variants that are already up to date')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Resizing processes (default: one per CPU; 0 resizes in this process)')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(image__isnull=True).order_by('pk')
+        if options['recipe_ids']:
+            recipes = recipes.filter(pk__in=options['recipe_ids'])
+        todo = [(recipe.pk, recipe.image.name) for recipe in recipes.only('pk', 'image', 'image_variants')
+                if options['force'] or needs_variants(recipe)]
+
+        pool = ProcessPoolExecutor(max_workers=options['workers']) if options['workers'] != 0 else None
+        built = 0
+        try:
+            # Read and resize a batch at a time so only a few originals are in memory
+            for start in range(0, len(todo), BATCH_SIZE):
+                built += self._build(todo[start:start + BATCH_SIZE], pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(f'✅ Built image variants for {built} recipes'))
+
+    def _build(self, batch, pool):
+        jobs = []
+        for recipe_id, image_name in batch:
+            try:
+                data = read_source(image_name)
+            except OSError as error:
+                self.stderr.write(f'Recipe {recipe_id}: cannot read {image_name} ({error})')
+                continue
+            result = pool.submit(render_variants, data) if pool else None
+            jobs.append((recipe_id, image_name, data, result))
+
+        built = 0
+        for recipe_id, image_name, data, result in jobs:
+            try:
+                rendered = result.result() if result else render_variants(data)
+            except Exception as error:
+                self.stderr.write(f'Recipe {recipe_id}: cannot resize {image_name} ({error})')
+                continue
+            built += store_variants(recipe_id, image_name, rendered)
+            self.stdout.write(f'Recipe {recipe_id}: {image_name} -> widths {rendered[2]}')
+        return built
@@ -0,0 +1,75 @@
+import json
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from ingredient.counters import view_counter
+from ingredient.explain import explain_scenarios
+from ingredient.synthetic import DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database, request every view once and run EXPLAIN QUERY PLAN on '
+            'its queries, flagging full table scans and temporary B-tree sorts')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1000,
+                            help='Recipes in the synthetic dataset (default: 1000)')
+        parser.add_argument('--users', type=int, default=200,
+                            help='Synthetic users (default: 200)')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Dataset seed (default: 0)')
+        parser.add_argument('--routes', nargs='+',
+                            help='Only explain routes containing one of these strings')
+        parser.add_argument('--all', action='store_true',
+                            help='Also print queries whose plans look fine')
+        parser.add_argument('--json', action='store_true',
+                            help='Print every plan as JSON')
+        parser.add_argument('--strict', action='store_true',
+                            help='Exit with an error when any plan is flagged')
+        parser.add_argument('--test-db-name',
+                            help='Build the dataset in this SQLite file instead of in memory')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('explain_hotpaths reads SQLite query plans')
+        if options['test_db_name']:
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = options['test_db_name']
+
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # Replica aliases point at the live replica files, not the seeded test database
+            with override_settings(N_PLUS_ONE_MODE='off', DATABASE_REPLICA_ALIASES=[]):
+                self.stderr.write(f'🌱 Seeding {options["scale"]} recipes...')
+                cache.clear()
+                DatasetGenerator(recipes=options['scale'], users=options['users'], seed=options['seed']).run()
+                results = explain_scenarios(routes=options['routes'])
+                view_counter.clear()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.print_report(results, options['all'])
+
+        flagged = sum(result['issues'] for result in results.values())
+        if options['strict'] and flagged:
+            raise CommandError(f'{flagged} flagged plan step(s)')
+
+    def print_report(self, results, show_all):
+        for name, result in results.items():
+            status = self.style.WARNING(f'{result["issues"]} issue(s)') if result['issues'] else 'ok'
+            self.stdout.write(f'{name}  [{result["status"]}, {result["queries"]} queries]  {status}')
+            for plan in result['plans']:
+                if not plan['issues'] and not show_all:
+                    continue
+                self.stdout.write(f'    {plan["sql"][:160]}')
+                for step in plan['plan']:
+                    self.stdout.write(f'      {step}')
+                for issue in plan['issues']:
+                    self.stdout.write(self.style.WARNING(f'      ! {issue}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from ingredient.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized rating count, sum and histogram on every recipe'
+
+    def add_arguments(self, parser):
+        parser.add_argument('recipe_ids', nargs='*', type=int,
+                            help='Only rebuild these recipes (default: all)')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.all()
+        if options['recipe_ids']:
+            recipes = recipes.filter(pk__in=options['recipe_ids'])
+
+        updated = Recipe.rebuild_rating_aggregates(recipes)
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt rating aggregates for {updated} recipes'))
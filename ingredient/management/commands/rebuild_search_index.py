@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from ingredient.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text recipe search index from scratch'
+
+    def handle(self, *args, **options):
+        indexed = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'✅ Indexed {indexed} published recipes for search'))
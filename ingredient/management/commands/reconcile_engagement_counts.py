@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from ingredient.models import Recipe
+
+CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Find and repair recipes whose likes_count/favorites_count drifted from the Like and Favorite tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('recipe_ids', nargs='*', type=int,
+                            help='Only check these recipes (default: all)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drifted recipes without changing them')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.all()
+        if options['recipe_ids']:
+            recipes = recipes.filter(pk__in=options['recipe_ids'])
+
+        actual = {f'actual_{field}': expression
+                  for field, expression in Recipe.engagement_count_expressions().items()}
+        drifted = list(
+            recipes.annotate(**actual)
+            .filter(~Q(likes_count=F('actual_likes_count')) | ~Q(favorites_count=F('actual_favorites_count')))
+            .values_list('pk', 'likes_count', 'actual_likes_count', 'favorites_count', 'actual_favorites_count')
+        )
+        for pk, likes, actual_likes, favorites, actual_favorites in drifted[:20]:
+            self.stdout.write(f'Recipe {pk}: likes {likes} -> {actual_likes}, favorites {favorites} -> {actual_favorites}')
+        if len(drifted) > 20:
+            self.stdout.write(f'... and {len(drifted) - 20} more')
+
+        if options['dry_run']:
+            self.stdout.write(f'{len(drifted)} recipe(s) have drifted counters')
+            return
+        ids = [row[0] for row in drifted]
+        updated = 0
+        for start in range(0, len(ids), CHUNK_SIZE):
+            updated += Recipe.rebuild_engagement_counts(Recipe.objects.filter(pk__in=ids[start:start + CHUNK_SIZE]))
+        self.stdout.write(self.style.SUCCESS(f'✅ Repaired like/favorite counters on {updated} recipes'))
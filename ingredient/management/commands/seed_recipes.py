@@ -1,12 +1,34 @@
-from django.core.management.base import BaseCommand
+import time
+
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
 from ingredient.models import Ingredient, Recipe, RecipeIngredient, RecipeStep
+from ingredient.synthetic import BATCH_SIZE, DatasetGenerator
 
 
 class Command(BaseCommand):
-    help = 'Seed the database with sample East African recipes'
+    help = 'Seed the database with sample East African recipes, or a synthetic dataset with --recipes'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int,
+                            help='Generate this many synthetic recipes instead of the 5 samples')
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Synthetic users to create (default: 1000)')
+        parser.add_argument('--ratings-per-recipe', type=int, default=3,
+                            help='Average ratings per synthetic recipe (default: 3)')
+        parser.add_argument('--ingredients', type=int, default=200,
+                            help='Synthetic ingredients to use (default: 200)')
+        parser.add_argument('--legacy-recipes', type=int,
+                            help='Legacy recipeItem rows to create (default: a tenth of --recipes)')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed; the same seed always produces the same data')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f'Rows per bulk insert and transaction (default: {BATCH_SIZE})')
     
     def handle(self, *args, **options):
+        if options['recipes'] is not None:
+            return self.generate(options)
+        
         self.stdout.write('🌾 Creating sample recipes...')
         
         # Create a demo user if it doesn't exist
@@ -352,3 +374,29 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.SUCCESS('✅ Successfully created 5 sample recipes!'))
         self.stdout.write(self.style.SUCCESS('✅ Sample recipes are now visible at http://localhost:8000/recipes/'))
+    
+    def generate(self, options):
+        """Bulk-load a deterministic synthetic dataset"""
+        if options['recipes'] < 0 or options['users'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--recipes must be >= 0, --users and --batch-size must be >= 1')
+        
+        generator = DatasetGenerator(
+            recipes=options['recipes'],
+            users=options['users'],
+            ratings_per_recipe=options['ratings_per_recipe'],
+            seed=options['seed'],
+            ingredients=options['ingredients'],
+            legacy_recipes=options['legacy_recipes'],
+            batch_size=options['batch_size'],
+            log=lambda message: self.stdout.write(f'  {message}') if options['verbosity'] > 1 else None,
+        )
+        if generator.already_generated():
+            raise CommandError(f'A dataset with --seed {options["seed"]} already exists; use another seed.')
+        
+        self.stdout.write(f'🌾 Generating {options["recipes"]} recipes for {options["users"]} users...')
+        started = time.monotonic()
+        counts = generator.run()
+        for model, count in sorted(counts.items()):
+            self.stdout.write(f'  {model}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Generated synthetic dataset in {time.monotonic() - started:.1f}s'))
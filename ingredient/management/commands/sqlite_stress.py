@@ -0,0 +1,33 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ingredient.sqlite.stress import BASELINE, run_stress
+
+
+class Command(BaseCommand):
+    help = ('Compare read and write throughput of Django\'s stock SQLite settings with the '
+            'configured ones under concurrent readers and writers, on scratch databases '
+            '(DEBUG keeps the rollback journal; set SQLITE_JOURNAL_MODE=WAL to measure WAL)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5.0,
+                            help='How long each configuration runs (default: 5)')
+        parser.add_argument('--readers', type=int, default=4,
+                            help='Reader threads (default: 4)')
+        parser.add_argument('--writers', type=int, default=4,
+                            help='Writer threads (default: 4)')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        configurations = {'baseline': BASELINE, 'configured': settings.DATABASES['default']}
+        results = run_stress(configurations, options['seconds'], options['readers'], options['writers'])
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name, result in results.items():
+            self.stdout.write(f'{name:<12} reads {result["reads_per_second"]:>9.1f}/s '
+                              f'(p95 {result["read_p95_ms"] or 0:>7.2f}ms, {result["read_errors"]} errors)  '
+                              f'writes {result["writes_per_second"]:>8.1f}/s '
+                              f'(p95 {result["write_p95_ms"] or 0:>7.2f}ms, {result["write_errors"]} errors)')
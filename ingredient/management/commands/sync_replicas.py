@@ -0,0 +1,31 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from ingredient.caching import bump_version
+from ingredient.replicas import REPLICA_VERSION, sync_replica
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database into every DATABASE_REPLICAS file with the '
+            'backup API; run it periodically, more often than REPLICA_READ_AFTER_WRITE')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1024,
+                            help='Pages copied per step, so readers are not blocked for long (default: 1024)')
+
+    def handle(self, *args, **options):
+        aliases = settings.DATABASE_REPLICA_ALIASES
+        if not aliases:
+            raise CommandError('No DATABASE_REPLICAS are configured')
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('sync_replicas only copies SQLite databases')
+
+        for alias in aliases:
+            name = connections[alias].settings_dict['NAME']
+            started = perf_counter()
+            sync_replica(name, options['pages'])
+            self.stdout.write(f'{alias}: copied to {name} in {(perf_counter() - started) * 1000:.0f}ms')
+        # Drop ETags and card fragments that were built from the older copies
+        bump_version(REPLICA_VERSION)
@@ -0,0 +1,155 @@
+"""Inverted index over the legacy recipeItem / ingredientItem catalog.
+
+The legacy match API asks "which recipes use all of these ingredients?".
+Instead of loading every recipe and its ingredients, we keep a posting list
+(a sorted array of recipeItem ids) per ingredient name and answer the
+question by intersecting postings, smallest first.
+
+The '#'-delimited ingredients and directions are split once per save and
+the resulting payloads are kept in the cache, so both the match API and
+the legacy search page only query for recipe ids.
+"""
+import threading
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+from .caching import bump_version_on_commit, get_version
+from .models import recipeItem
+
+INDEX_VERSION = 'legacy-ingredient-index'
+# Bumped when any payload changes, for the match API's ETag
+PAYLOAD_VERSION = 'legacy-recipe-payloads'
+PAYLOAD_TIMEOUT = 60 * 60
+
+_index = None
+_lock = threading.Lock()
+
+
+def _intersect(small, large):
+    """Intersect two sorted arrays by binary-searching the larger one"""
+    result = array('q')
+    lo = 0
+    size = len(large)
+    for value in small:
+        lo = bisect_left(large, value, lo)
+        if lo == size:
+            break
+        if large[lo] == value:
+            result.append(value)
+    return result
+
+
+class IngredientIndex:
+    """Maps ingredient names to sorted arrays of recipeItem ids"""
+
+    def __init__(self, postings, recipe_ids, version=None):
+        self.postings = postings
+        self.recipe_ids = recipe_ids
+        self.version = version
+
+    @classmethod
+    def build(cls, version=None):
+        """Build the index with two queries over the through table.
+
+        Always reads the primary: the index outlives a replica sync.
+        """
+        through = recipeItem.list_ingredient.through
+        rows = through.objects.using('default').values_list('ingredientitem__name', 'recipeitem_id')
+
+        grouped = {}
+        for name, recipe_id in rows:
+            grouped.setdefault(name, set()).add(recipe_id)
+        postings = {name: array('q', sorted(ids)) for name, ids in grouped.items()}
+
+        recipe_ids = array('q', recipeItem.objects.using('default').order_by('pk').values_list('pk', flat=True))
+        return cls(postings, recipe_ids, version)
+
+    def match(self, names):
+        """Return sorted ids of recipes that use every ingredient in ``names``"""
+        names = set(names)
+        if not names:
+            return list(self.recipe_ids)
+
+        postings = []
+        for name in names:
+            posting = self.postings.get(name)
+            if not posting:
+                return []
+            postings.append(posting)
+
+        postings.sort(key=len)
+        result = postings[0]
+        for posting in postings[1:]:
+            result = _intersect(result, posting)
+            if not result:
+                break
+        return list(result)
+
+
+def get_ingredient_index():
+    """Return the current index, rebuilding it if another worker changed the catalog"""
+    global _index
+    version = get_version(INDEX_VERSION)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = IngredientIndex.build(version)
+        return _index
+
+
+def invalidate_ingredient_index():
+    """Drop this worker's index and tell the other workers to drop theirs"""
+    global _index
+    _index = None
+    bump_version_on_commit(INDEX_VERSION)
+
+
+def _payload_key(recipe_id):
+    return f'nourish:legacy-recipe:{recipe_id}'
+
+
+def recipe_item_payload(item):
+    """Serialize a legacy recipe in the shape the tokenfield UI expects"""
+    return {'name': item.name,
+            'ingredients': item.ingredients.split('#'),
+            'directions': item.directions.split('#'),
+            'img_url': item.img_url}
+
+
+def recipe_item_payloads(recipe_ids):
+    """Return cached payloads for ``recipe_ids`` in order, loading misses in one query"""
+    keys = {pk: _payload_key(pk) for pk in recipe_ids}
+    cached = cache.get_many(keys.values())
+
+    missing = [pk for pk, key in keys.items() if key not in cached]
+    if missing:
+        # Payloads are cached across replica syncs, so load them from the primary
+        loaded = {keys[pk]: recipe_item_payload(item)
+                  for pk, item in recipeItem.objects.using('default').in_bulk(missing).items()}
+        cache.set_many(loaded, PAYLOAD_TIMEOUT)
+        cached.update(loaded)
+
+    return [cached[keys[pk]] for pk in recipe_ids if keys[pk] in cached]
+
+
+def invalidate_recipe_item_payload(recipe_id):
+    cache.delete(_payload_key(recipe_id))
+    bump_version_on_commit(PAYLOAD_VERSION)
+
+
+def match_recipe_items(names):
+    """Return payloads for recipes that use every ingredient in ``names``"""
+    return recipe_item_payloads(get_ingredient_index().match(names))
+
+
+def search_recipe_items(ingredient):
+    """Return payloads for recipes that use an ingredient with ``ingredient``'s name"""
+    through = recipeItem.list_ingredient.through
+    recipe_ids = (through.objects.filter(ingredientitem__name=ingredient.name)
+                  .order_by('recipeitem_id').values_list('recipeitem_id', flat=True).distinct())
+    return recipe_item_payloads(list(recipe_ids))
@@ -0,0 +1,233 @@
+"""Request instrumentation middleware.
+
+RequestTimingMiddleware measures SQL, template and view time for a sample
+of requests and logs them as a structured line on the ``ingredient.timing``
+logger. It is cheap enough to leave on in production;
+REQUEST_TIMING_SAMPLE_RATE controls how many requests pay for it. Query
+counts and database time say too much to hand to anyone, so only DEBUG and
+staff responses also get them in a ``Server-Timing`` header.
+
+NPlusOneMiddleware is for development and tests. It groups a request's
+queries by normalized SQL and by the view line or template tag that issued
+them, then logs or raises when the same shape repeats too often.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger('ingredient.timing')
+n_plus_one_logger = logging.getLogger('ingredient.queries')
+
+_current_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """Per-request counters, fed by connection.execute_wrapper and template rendering"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - start
+            self.queries += 1
+            self.db_time += elapsed
+            if self.template_depth:
+                self.template_db_time += elapsed
+
+    def timings(self, total):
+        """Milliseconds spent in the database, templates and the rest of the view"""
+        view = total - self.template_time - (self.db_time - self.template_db_time)
+        return {
+            'db': self.db_time * 1000,
+            'tpl': self.template_time * 1000,
+            'view': max(view, 0.0) * 1000,
+            'total': total * 1000,
+        }
+
+
+def _timed_render(render):
+    def timed_render(template, context):
+        stats = _current_stats.get()
+        if stats is None or stats.template_depth:
+            # Included templates are already counted by the outermost render
+            return render(template, context)
+        stats.template_depth += 1
+        start = perf_counter()
+        try:
+            return render(template, context)
+        finally:
+            stats.template_time += perf_counter() - start
+            stats.template_depth -= 1
+
+    timed_render.timed = True
+    return timed_render
+
+
+def instrument_templates():
+    """Wrap Template._render once so renders are timed for sampled requests"""
+    if not getattr(Template._render, 'timed', False):
+        Template._render = _timed_render(Template._render)
+
+
+def _shows_timings(request):
+    if settings.DEBUG:
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+class RequestTimingMiddleware:
+    """Adds a Server-Timing header and a log line with SQL/template/view timings"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_templates()
+
+    def __call__(self, request):
+        rate = getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 1.0)
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        timings = stats.timings(perf_counter() - start)
+
+        if _shows_timings(request):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={timings["db"]:.1f};desc="{stats.queries} queries"',
+                f'tpl;dur={timings["tpl"]:.1f}',
+                f'view;dur={timings["view"]:.1f}',
+                f'total;dur={timings["total"]:.1f}',
+            ])
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.queries,
+            **{f'{name}_ms': round(value, 2) for name, value in timings.items()},
+        }))
+        return response
+
+
+# ============ N+1 DETECTION ============
+
+class NPlusOneError(Exception):
+    """Raised when a request repeats the same query shape too many times"""
+
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+
+
+def normalize_sql(sql):
+    """Collapse literals and IN lists so queries that differ only in values compare equal"""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _STRING.sub('?', sql)
+    return _NUMBER.sub('?', sql)
+
+
+def _call_site():
+    """The template tag or project source line that issued the current query"""
+    root = str(settings.BASE_DIR) + os.sep
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        filename = code.co_filename
+        if code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                return f'{origin.template_name}:{token.lineno}'
+        elif (filename.startswith(root) and filename != __file__
+              and 'site-packages' not in filename):
+            return f'{os.path.relpath(filename, root)}:{frame.f_lineno}'
+        frame = frame.f_back
+    return '<unknown>'
+
+
+class QueryPatternRecorder:
+    """execute_wrapper that counts queries per (normalized SQL, call site)"""
+
+    def __init__(self):
+        self.patterns = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.patterns[(normalize_sql(sql), _call_site())] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        """Patterns seen more than ``threshold`` times, most frequent first"""
+        return [(sql, site, count) for (sql, site), count in self.patterns.most_common()
+                if count > threshold]
+
+
+@contextmanager
+def record_query_patterns():
+    """Record query patterns on every connection for the duration of the block"""
+    recorder = QueryPatternRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+def format_repeated_queries(label, repeated):
+    lines = [f'{label}: possible N+1 queries']
+    for sql, site, count in repeated:
+        lines.append(f'  {count}x at {site}: {sql}')
+    return '\n'.join(lines)
+
+
+class NPlusOneMiddleware:
+    """Logs or raises when a request repeats the same query from the same call site"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = getattr(settings, 'N_PLUS_ONE_MODE', 'off')
+        if mode == 'off':
+            return self.get_response(request)
+        if mode not in ('log', 'raise'):
+            raise ImproperlyConfigured("N_PLUS_ONE_MODE must be 'off', 'log' or 'raise'")
+
+        with record_query_patterns() as recorder:
+            response = self.get_response(request)
+
+        repeated = recorder.repeated(getattr(settings, 'N_PLUS_ONE_THRESHOLD', 5))
+        if repeated:
+            message = format_repeated_queries(f'{request.method} {request.path}', repeated)
+            if mode == 'raise':
+                raise NPlusOneError(message)
+            n_plus_one_logger.warning(message)
+        return response
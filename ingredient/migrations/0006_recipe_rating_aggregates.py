@@ -0,0 +1,68 @@
+# Generated by Django 6.0 on 2026-10-18 16:12
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def populate_rating_aggregates(apps, schema_editor):
+    Recipe = apps.get_model('ingredient', 'Recipe')
+    Rating = apps.get_model('ingredient', 'Rating')
+    ratings = Rating.objects.filter(recipe=models.OuterRef('pk')).order_by().values('recipe')
+
+    def total(expression, **filters):
+        subquery = ratings.filter(**filters).annotate(total=expression).values('total')
+        return Coalesce(models.Subquery(subquery), 0)
+
+    fields = {
+        'rating_count': total(models.Count('id')),
+        'rating_sum': total(models.Sum('score')),
+    }
+    for score in range(1, 6):
+        fields[f'rating_count_{score}'] = total(models.Count('id'), score=score)
+    Recipe.objects.update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredient', '0005_alter_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_count_1',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_count_2',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_count_3',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_count_4',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_count_5',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 17:05
+
+from django.db import migrations
+
+FTS_TABLE = 'ingredient_recipe_fts'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"""
+        CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+            title, description, ingredients, steps,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+    # Title matches count most, then ingredients, description and steps
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 2.0, 4.0, 1.0)')")
+    schema_editor.execute(f"""
+        INSERT INTO {FTS_TABLE}(rowid, title, description, ingredients, steps)
+        SELECT r.id, r.title, r.description,
+            COALESCE((SELECT group_concat(i.name, ' ')
+                      FROM ingredient_recipeingredient ri
+                      JOIN ingredient_ingredient i ON i.id = ri.ingredient_id
+                      WHERE ri.recipe_id = r.id), ''),
+            COALESCE((SELECT group_concat(s.instruction, ' ')
+                      FROM ingredient_recipestep s
+                      WHERE s.recipe_id = r.id), '')
+        FROM ingredient_recipe r
+        WHERE r.is_published
+    """)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredient', '0006_recipe_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
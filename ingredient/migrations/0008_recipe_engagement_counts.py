@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 19:20
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def populate_engagement_counts(apps, schema_editor):
+    Recipe = apps.get_model('ingredient', 'Recipe')
+
+    def total(model_name):
+        model = apps.get_model('ingredient', model_name)
+        rows = model.objects.filter(recipe=models.OuterRef('pk')).order_by().values('recipe')
+        return Coalesce(models.Subquery(rows.annotate(total=models.Count('id')).values('total')), 0)
+
+    Recipe.objects.update(likes_count=total('Like'), favorites_count=total('Favorite'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredient', '0007_recipe_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='likes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_engagement_counts, migrations.RunPython.noop),
+    ]
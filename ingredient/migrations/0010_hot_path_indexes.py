@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-18 20:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredient', '0009_recipe_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['recipe', '-created_at'], name='comment_recipe_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-saved_at', '-id'], name='favorite_user_saved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_at', '-id'], name='recipe_published_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['created_by', '-created_at', '-id'], name='recipe_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['recipe', '-created_at'], name='review_recipe_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglistitem',
+            index=models.Index(fields=['shopping_list', 'is_purchased', '-created_at'], name='shopping_item_list_order_idx'),
+        ),
+        # auth.User cannot declare Meta.indexes from here; login_view looks users up by email
+        migrations.RunSQL(
+            'CREATE INDEX auth_user_email_idx ON auth_user (email)',
+            reverse_sql='DROP INDEX auth_user_email_idx',
+        ),
+    ]
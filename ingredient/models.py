@@ -1,6 +1,11 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Coalesce
+
+from .units import from_base, humanize, quantize, to_base_many
 
 # ============ LEGACY MODELS (Keep for backward compatibility) ============
 class ingredientItem(models.Model):
@@ -69,24 +74,115 @@ class Recipe(models.Model):
   difficulty = models.CharField(max_length=50, choices=DIFFICULTY_CHOICES, default='medium')
   category = models.CharField(max_length=50, choices=CATEGORY_CHOICES, default='other')
   image = models.ImageField(upload_to='recipe_images/', blank=True, null=True)
+  # Resized copies of the image, built by images.py
+  image_variants = models.JSONField(default=dict, blank=True, editable=False)
   created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recipes', null=True, blank=True)
   created_at = models.DateTimeField(auto_now_add=True)
   updated_at = models.DateTimeField(auto_now=True)
   is_published = models.BooleanField(default=True)
   views_count = models.IntegerField(default=0)
   
+  # Rating aggregates, maintained from Rating saves/deletes (see signals.py)
+  rating_count = models.IntegerField(default=0)
+  rating_sum = models.IntegerField(default=0)
+  rating_count_1 = models.IntegerField(default=0)
+  rating_count_2 = models.IntegerField(default=0)
+  rating_count_3 = models.IntegerField(default=0)
+  rating_count_4 = models.IntegerField(default=0)
+  rating_count_5 = models.IntegerField(default=0)
+  
+  # Engagement counters, maintained from Like/Favorite inserts and deletes (see signals.py)
+  likes_count = models.IntegerField(default=0)
+  favorites_count = models.IntegerField(default=0)
+  
   def __str__(self):
     return self.title
   
   def average_rating(self):
-    """Calculate average rating from ratings"""
-    ratings = self.ratings.all()
-    if ratings.count() == 0:
+    """Average score from the stored rating aggregates"""
+    if self.rating_count == 0:
       return 0
-    return sum([r.score for r in ratings]) / ratings.count()
+    return self.rating_sum / self.rating_count
+  
+  def rating_histogram(self):
+    """Number of 1- to 5-star ratings, in that order"""
+    return [getattr(self, f'rating_count_{score}') for score in range(1, 6)]
+  
+  @classmethod
+  def adjust_rating_aggregates(cls, recipe_id, added=None, removed=None):
+    """Atomically add and/or remove one score from a recipe's aggregates"""
+    changes = {}
+    if added is not None:
+      changes['rating_count'] = 1
+      changes['rating_sum'] = added
+      changes[f'rating_count_{added}'] = 1
+    if removed is not None:
+      changes['rating_count'] = changes.get('rating_count', 0) - 1
+      changes['rating_sum'] = changes.get('rating_sum', 0) - removed
+      bucket = f'rating_count_{removed}'
+      changes[bucket] = changes.get(bucket, 0) - 1
+    changes = {field: models.F(field) + delta for field, delta in changes.items() if delta}
+    if changes:
+      cls.objects.filter(pk=recipe_id).update(**changes)
+  
+  @classmethod
+  def rebuild_rating_aggregates(cls, queryset=None):
+    """Recompute rating aggregates from the Rating table in a single UPDATE"""
+    ratings = Rating.objects.filter(recipe=models.OuterRef('pk')).order_by().values('recipe')
+    
+    def total(expression, **filters):
+      subquery = ratings.filter(**filters).annotate(total=expression).values('total')
+      return Coalesce(models.Subquery(subquery), 0)
+    
+    fields = {
+      'rating_count': total(models.Count('id')),
+      'rating_sum': total(models.Sum('score')),
+    }
+    for score in range(1, 6):
+      fields[f'rating_count_{score}'] = total(models.Count('id'), score=score)
+    
+    if queryset is None:
+      queryset = cls.objects.all()
+    return queryset.update(**fields)
+  
+  @classmethod
+  def adjust_engagement_counts(cls, recipe_id, likes=0, favorites=0):
+    """Atomically change a recipe's like/favorite counters, never below zero"""
+    for field, delta in (('likes_count', likes), ('favorites_count', favorites)):
+      if delta:
+        recipes = cls.objects.filter(pk=recipe_id)
+        if delta < 0:
+          recipes = recipes.filter(**{f'{field}__gte': -delta})
+        recipes.update(**{field: models.F(field) + delta})
+  
+  @staticmethod
+  def related_count(model):
+    """How many ``model`` rows point at the outer recipe, as a correlated subquery"""
+    rows = model.objects.filter(recipe=models.OuterRef('pk')).order_by().values('recipe')
+    return Coalesce(models.Subquery(rows.annotate(total=models.Count('id')).values('total')), 0)
+  
+  @classmethod
+  def engagement_count_expressions(cls):
+    """The true like and favorite counts, as subqueries keyed on the outer recipe"""
+    return {'likes_count': cls.related_count(Like), 'favorites_count': cls.related_count(Favorite)}
+  
+  @classmethod
+  def rebuild_engagement_counts(cls, queryset=None):
+    """Recompute like and favorite counters from their tables in a single UPDATE"""
+    if queryset is None:
+      queryset = cls.objects.all()
+    return queryset.update(**cls.engagement_count_expressions())
   
   class Meta:
     ordering = ['-created_at']
+    # Keyset pagination sorts on (created_at, id); see pagination.py. SQLite
+    # filters booleans as a bare "is_published" term, which only a partial
+    # index can use, so published recipes get one of their own.
+    indexes = [
+      models.Index(fields=['-created_at', '-id'], condition=models.Q(is_published=True),
+                   name='recipe_published_created_idx'),
+      models.Index(fields=['created_by', '-created_at', '-id'], name='recipe_author_created_idx'),
+    ]
 
 
 class RecipeIngredient(models.Model):
@@ -145,6 +241,7 @@ class Favorite(models.Model):
   class Meta:
     unique_together = ('user', 'recipe')
     ordering = ['-saved_at']
+    indexes = [models.Index(fields=['user', '-saved_at', '-id'], name='favorite_user_saved_idx')]
 
 
 class Rating(models.Model):
@@ -158,6 +255,13 @@ class Rating(models.Model):
   created_at = models.DateTimeField(auto_now_add=True)
   updated_at = models.DateTimeField(auto_now=True)
   
+  @classmethod
+  def from_db(cls, db, field_names, values):
+    instance = super().from_db(db, field_names, values)
+    # Remember the stored score so saves can update Recipe aggregates by delta
+    instance._stored_score = instance.__dict__.get('score')
+    return instance
+  
   def __str__(self):
     return f"{self.user.username} rated {self.recipe.title} {self.score} stars"
   
@@ -181,6 +285,7 @@ class Review(models.Model):
   
   class Meta:
     ordering = ['-created_at']
+    indexes = [models.Index(fields=['recipe', '-created_at'], name='review_recipe_created_idx')]
 
 
 class Comment(models.Model):
@@ -196,6 +301,7 @@ class Comment(models.Model):
   
   class Meta:
     ordering = ['-created_at']
+    indexes = [models.Index(fields=['recipe', '-created_at'], name='comment_recipe_created_idx')]
 
 
 class Like(models.Model):
@@ -220,6 +326,54 @@ class ShoppingList(models.Model):
   
   def __str__(self):
     return f"Shopping list for {self.user.username}"
+  
+  def add_recipes(self, recipe_ids):
+    """Add the ingredients of several recipes in one transaction.
+    
+    Lines for the same ingredient are summed whenever their units convert
+    into each other (see units.py), and merged into an unpurchased item
+    already on the list instead of being duplicated. Mixed units are
+    written in grams/kg or ml/l. Returns the number of lines added or updated.
+    """
+    rows = list(RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+                .order_by('recipe_id', 'pk').values_list('recipe_id', 'ingredient__name', 'amount', 'unit'))
+    if not rows:
+      return 0
+    
+    with transaction.atomic():
+      existing = list(self.items.select_for_update().filter(
+        is_purchased=False, ingredient_name__in={name for _, name, _, _ in rows}))
+      # (name, base unit) -> [total in base units, units seen, item to update, source recipe, new lines]
+      lines = {}
+      quantities = to_base_many([(item.amount, item.unit) for item in existing]
+                                + [(amount, unit) for _, _, amount, unit in rows])
+      for item, (amount, base) in zip(existing, quantities):
+        if (item.ingredient_name, base) not in lines:
+          lines[item.ingredient_name, base] = [amount, {item.unit}, item, None, 0]
+      for (recipe_id, name, _, unit), (amount, base) in zip(rows, quantities[len(existing):]):
+        line = lines.setdefault((name, base), [Decimal(0), set(), None, recipe_id, 0])
+        line[0] += amount
+        line[1].add(unit)
+        line[4] += 1
+      
+      merged, created = [], []
+      for (name, base), (total, units, item, recipe_id, added) in lines.items():
+        if not added:
+          continue
+        if len(units) == 1:
+          unit = units.pop()
+          amount = from_base(total, unit)
+        else:
+          amount, unit = humanize(total, base)
+        if item is not None:
+          item.amount, item.unit = quantize(amount), unit
+          merged.append(item)
+        else:
+          created.append(ShoppingListItem(shopping_list=self, ingredient_name=name, amount=quantize(amount),
+                                          unit=unit, from_recipe_id=recipe_id))
+      ShoppingListItem.objects.bulk_update(merged, ['amount', 'unit'])
+      ShoppingListItem.objects.bulk_create(created)
+    return len(merged) + len(created)
 
 
 class ShoppingListItem(models.Model):
@@ -237,6 +391,9 @@ class ShoppingListItem(models.Model):
   
   class Meta:
     ordering = ['is_purchased', '-created_at']
+    indexes = [
+      models.Index(fields=['shopping_list', 'is_purchased', '-created_at'], name='shopping_item_list_order_idx'),
+    ]
 
 
 class IngredientPrice(models.Model):
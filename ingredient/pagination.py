@@ -0,0 +1,112 @@
+"""Keyset (cursor) pagination for recipe lists.
+
+Pages are ordered newest first on ``(-<field>, -id)``. A cursor records the
+sort key of the last (or first) row of a page, so fetching the next page is
+a ``WHERE (field, id) < (value, pk) ... LIMIT n`` lookup whose cost does not
+depend on how deep into the list the visitor is, unlike OFFSET.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import Http404
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 60
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(value, pk, direction):
+    """Pack a sort key (a datetime or a number) into an opaque, URL-safe token"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, pk, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Unpack a token from ``encode_cursor``, raising Http404 if it is malformed"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        value, pk, direction = json.loads(base64.urlsafe_b64decode(padded))
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        elif not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise ValueError(value)
+        if direction not in (NEXT, PREVIOUS) or not isinstance(pk, int):
+            raise ValueError(direction)
+    except (binascii.Error, TypeError, ValueError):
+        raise Http404('Invalid page cursor')
+    return value, pk, direction
+
+
+def get_page_size(request):
+    """Read ``page_size`` from the query string, capped at MAX_PAGE_SIZE"""
+    try:
+        size = int(request.GET.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+class KeysetPage:
+    """One page of results plus the cursors for its neighbours"""
+
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def paginate(queryset, request, field='created_at'):
+    """Return the KeysetPage of ``queryset`` selected by the request's cursor"""
+    size = get_page_size(request)
+    token = request.GET.get('cursor')
+    direction = NEXT
+    if token:
+        value, pk, direction = decode_cursor(token)
+        if not isinstance(value, datetime):
+            raise Http404('Invalid page cursor')
+
+    if direction == NEXT:
+        queryset = queryset.order_by(f'-{field}', '-pk')
+        if token:
+            queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk}))
+    else:
+        queryset = queryset.order_by(field, 'pk')
+        queryset = queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk}))
+
+    items = list(queryset[:size + 1])
+    has_more = len(items) > size
+    items = items[:size]
+
+    if direction == NEXT:
+        has_next, has_previous = has_more, bool(token)
+    else:
+        items.reverse()
+        has_next, has_previous = True, has_more
+
+    page = KeysetPage(items)
+    if items and has_next:
+        page.next_cursor = encode_cursor(getattr(items[-1], field), items[-1].pk, NEXT)
+    if items and has_previous:
+        page.previous_cursor = encode_cursor(getattr(items[0], field), items[0].pk, PREVIOUS)
+    return page
@@ -0,0 +1,206 @@
+"""Rank recipes by how much of a pantry they use.
+
+A recipe's coverage is the fraction of its ingredients the user already
+has. PantryIndex stores the recipe x ingredient matrix column-wise: one
+bitset (a Python int) per ingredient, with bit i set when the i-th
+published recipe uses it, plus one bitset per ingredient count.
+
+To score a pantry, the bitsets of its ingredients are added together as a
+bit-sliced counter, giving every recipe's number of matches in a handful
+of big-integer operations. Recipes are then read out coverage level by
+coverage level (matches == h and ingredients == t, best h/t first) until
+the requested number is found. The cost depends on the pantry size and the
+number of distinct recipe sizes, not on looping over the catalog in Python.
+"""
+import threading
+from fractions import Fraction
+
+from django.urls import reverse
+
+from .autocomplete import normalize
+from .caching import bump_version_on_commit, get_version
+from .models import Ingredient, Recipe, RecipeIngredient
+
+PANTRY_VERSION = 'pantry-index'
+DEFAULT_LIMIT = 12
+MAX_LIMIT = 50
+MAX_PANTRY = 50
+
+_index = None
+_lock = threading.Lock()
+
+
+def _bitset(positions, size):
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _positions(bitset, limit):
+    """Positions of the lowest ``limit`` set bits"""
+    found = []
+    while bitset and len(found) < limit:
+        low = bitset & -bitset
+        found.append(low.bit_length() - 1)
+        bitset ^= low
+    return found
+
+
+class PantryIndex:
+    """Column bitsets over published recipes, keyed by ingredient id"""
+
+    def __init__(self, recipe_ids, columns, by_size, names, version=None):
+        self.recipe_ids = recipe_ids
+        self.columns = columns
+        self.by_size = by_size
+        self.names = names
+        self.version = version
+        self.universe = (1 << len(recipe_ids)) - 1
+
+    @classmethod
+    def build(cls, version=None):
+        """Build the index with two queries"""
+        rows = (RecipeIngredient.objects.filter(recipe__is_published=True)
+                .order_by('recipe_id').values_list('recipe_id', 'ingredient_id').distinct())
+        recipe_ids = []
+        position = {}
+        columns = {}
+        sizes = {}
+        for recipe_id, ingredient_id in rows:
+            index = position.get(recipe_id)
+            if index is None:
+                index = position[recipe_id] = len(recipe_ids)
+                recipe_ids.append(recipe_id)
+            columns.setdefault(ingredient_id, []).append(index)
+            sizes[index] = sizes.get(index, 0) + 1
+
+        by_size = {}
+        for index, size in sizes.items():
+            by_size.setdefault(size, []).append(index)
+
+        count = len(recipe_ids)
+        names = {}
+        for pk, name in Ingredient.objects.filter(pk__in=columns).values_list('pk', 'name'):
+            names.setdefault(normalize(name), pk)
+        return cls(
+            recipe_ids,
+            {pk: _bitset(indexes, count) for pk, indexes in columns.items()},
+            {size: _bitset(indexes, count) for size, indexes in by_size.items()},
+            names,
+            version,
+        )
+
+    def resolve(self, names):
+        """Map pantry names to ingredient ids, also trying simple plural forms"""
+        found, unknown = set(), []
+        for name in names:
+            key = normalize(name)
+            if not key:
+                continue
+            for candidate in (key, key + 's', key + 'es', key[:-1] if key.endswith('s') else None):
+                if candidate in self.names:
+                    found.add(self.names[candidate])
+                    break
+            else:
+                unknown.append(name)
+        return found, unknown
+
+    def match_counts(self, ingredient_ids):
+        """Bit slices of each recipe's number of pantry ingredients (slice i holds bit i)"""
+        slices = []
+        for ingredient_id in ingredient_ids:
+            carry = self.columns.get(ingredient_id, 0)
+            for i in range(len(slices)):
+                if not carry:
+                    break
+                slices[i], carry = slices[i] ^ carry, slices[i] & carry
+            if carry:
+                slices.append(carry)
+        return slices
+
+    def rank(self, ingredient_ids, limit=DEFAULT_LIMIT):
+        """Return ``(total, [(recipe_id, matches, size), ...])``, best coverage first.
+
+        ``total`` counts recipes that use at least one pantry ingredient. Ties
+        in coverage go to the recipe using more pantry ingredients, then to
+        the older recipe.
+        """
+        slices = self.match_counts(ingredient_ids)
+        if not slices:
+            return 0, []
+        any_match = 0
+        for bits in slices:
+            any_match |= bits
+
+        exactly = {}
+        for matches in range(1, (1 << len(slices))):
+            mask = self.universe
+            for i, bits in enumerate(slices):
+                mask &= bits if matches >> i & 1 else self.universe ^ bits
+            if mask:
+                exactly[matches] = mask
+
+        levels = sorted(((matches, size) for matches in exactly for size in self.by_size if matches <= size),
+                        key=lambda level: (-Fraction(*level), -level[0]))
+        ranked = []
+        for matches, size in levels:
+            found = _positions(exactly[matches] & self.by_size[size], limit - len(ranked))
+            ranked.extend((self.recipe_ids[index], matches, size) for index in found)
+            if len(ranked) >= limit:
+                break
+        return any_match.bit_count(), ranked
+
+
+def get_pantry_index():
+    """Return the current index, rebuilding it if another worker changed a recipe"""
+    global _index
+    version = get_version(PANTRY_VERSION)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = PantryIndex.build(version)
+        return _index
+
+
+def invalidate_pantry_index():
+    """Drop this worker's index and tell the other workers to drop theirs"""
+    global _index
+    _index = None
+    bump_version_on_commit(PANTRY_VERSION)
+
+
+def match_pantry(names, limit=DEFAULT_LIMIT):
+    """Rank published recipes by pantry coverage, listing what each is missing"""
+    index = get_pantry_index()
+    pantry, unknown = index.resolve(names[:MAX_PANTRY])
+    total, ranked = index.rank(pantry, limit)
+
+    recipe_ids = [recipe_id for recipe_id, _, _ in ranked]
+    recipes = Recipe.objects.in_bulk(recipe_ids)
+    missing = {recipe_id: [] for recipe_id in recipe_ids}
+    rows = (RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+            .exclude(ingredient_id__in=pantry).order_by('recipe_id', 'pk')
+            .values_list('recipe_id', 'ingredient__name'))
+    for recipe_id, name in rows:
+        if name not in missing[recipe_id]:
+            missing[recipe_id].append(name)
+
+    results = []
+    for recipe_id, matches, size in ranked:
+        recipe = recipes.get(recipe_id)
+        if recipe is None:
+            continue
+        results.append({
+            'id': recipe.pk,
+            'title': recipe.title,
+            'url': reverse('recipe_detail', args=[recipe.pk]),
+            'coverage': round(matches / size, 3),
+            'have': matches,
+            'needed': size,
+            'missing': missing[recipe_id],
+        })
+    return {'results': results, 'total': total, 'unknown': unknown}
@@ -0,0 +1,124 @@
+"""Read replicas for the read-only views.
+
+DATABASE_REPLICAS lists read-only copies of the database, which settings.py
+adds to DATABASES as ``replica_0``, ``replica_1``, ... The sync_replicas
+command refreshes them from the primary with SQLite's backup API.
+
+Views wrapped in read_from_replica() run their GET and HEAD queries against
+one randomly picked replica, so a page is read from a single copy. Every
+other view and every write uses ``default``. ReplicaMiddleware notices
+when a request writes and sets PRIMARY_UNTIL in the session. For
+REPLICA_READ_AFTER_WRITE seconds after that, the browser reads from the
+primary, so people see their own likes, reviews and recipes before the
+replicas catch up.
+
+Cached data is filled from whichever database a request read. The ETags
+and card fragments that are keyed by versions also include REPLICA_VERSION,
+which sync_replicas bumps. Caches that are not keyed by it (the ingredient
+index, legacy payloads, the autocomplete, the price matrix and the site
+totals) are always built from ``default``. So nothing read from an older
+copy outlives the next sync.
+"""
+import contextvars
+import random
+import sqlite3
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY_UNTIL = 'replicas:primary-until'
+REPLICA_VERSION = 'replica-sync'
+# Always read from the primary: sessions and request.user must see logins,
+# logouts, new accounts and password changes at once
+PRIMARY_APPS = {'auth', 'sessions', 'contenttypes'}
+
+_state = contextvars.ContextVar('replica_state', default=None)
+
+
+class ReplicaState:
+    """What the current request may read from, and whether it wrote"""
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICA_ALIASES', ())
+
+
+class ReplicaRouter:
+    """Sends reads to a replica inside read_from_replica(), everything else to ``default``"""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or model._meta.app_label in PRIMARY_APPS:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas are copies of the primary, schema included
+        if db in replica_aliases():
+            return False
+        return None
+
+
+def sync_replica(name, pages=1024):
+    """Copy the primary into the SQLite file ``name``, ``pages`` pages at a time"""
+    primary = connections['default']
+    primary.ensure_connection()
+    with primary.wrap_database_errors:
+        target = sqlite3.connect(name)
+        try:
+            primary.connection.backup(target, pages=pages)
+        finally:
+            target.close()
+
+
+def read_from_replica(view):
+    """Run a view's GET/HEAD queries on a replica unless the browser wrote recently"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _state.get()
+        aliases = replica_aliases()
+        if (state is None or not aliases or request.method not in ('GET', 'HEAD')
+                or request.session.get(PRIMARY_UNTIL, 0) > time.time()):
+            return view(request, *args, **kwargs)
+        state.replica = random.choice(aliases)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.replica = None
+    return wrapper
+
+
+class ReplicaMiddleware:
+    """Keeps a browser on the primary for a while after one of its requests wrote"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = ReplicaState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and replica_aliases():
+            request.session[PRIMARY_UNTIL] = time.time() + settings.REPLICA_READ_AFTER_WRITE
+        return response
@@ -0,0 +1,138 @@
+"""Full-text recipe search backed by an SQLite FTS5 table.
+
+``ingredient_recipe_fts`` holds one row per published recipe, keyed by the
+recipe id, with its title, description, ingredient names and step
+instructions. Signals in signals.py re-index a recipe whenever it or one of
+its steps or ingredients changes; bulk loads call rebuild_search_index().
+
+Results are ranked by BM25, weighting the title above the description,
+ingredients and steps (the weights are stored in the table's ``rank``
+option by migration 0007). Pages are keyset-paginated on ``(rank, rowid)``,
+so each page is one index lookup plus one ``in_bulk`` for the recipes.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.http import Http404
+
+from .models import Ingredient, Recipe, RecipeIngredient, RecipeStep
+from .pagination import NEXT, PREVIOUS, KeysetPage, decode_cursor, encode_cursor, get_page_size, paginate
+
+FTS_TABLE = 'ingredient_recipe_fts'
+MAX_TERMS = 12
+CHUNK_SIZE = 500
+
+_TERM = re.compile(r'\w+')
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix.
+
+    Words are quoted so FTS5 operators and punctuation typed by users cannot
+    produce syntax errors. Returns None if the text has no words.
+    """
+    terms = _TERM.findall(text.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"' for term in terms) + '*'
+
+
+def _index_sql(where=''):
+    return f"""
+        INSERT INTO {FTS_TABLE}(rowid, title, description, ingredients, steps)
+        SELECT r.id, r.title, r.description,
+            COALESCE((SELECT group_concat(i.name, ' ')
+                      FROM {RecipeIngredient._meta.db_table} ri
+                      JOIN {Ingredient._meta.db_table} i ON i.id = ri.ingredient_id
+                      WHERE ri.recipe_id = r.id), ''),
+            COALESCE((SELECT group_concat(s.instruction, ' ')
+                      FROM {RecipeStep._meta.db_table} s
+                      WHERE s.recipe_id = r.id), '')
+        FROM {Recipe._meta.db_table} r
+        WHERE r.is_published {where}
+    """
+
+
+def reindex_recipes(recipe_ids):
+    """Refresh the index rows of these recipes, dropping unpublished or deleted ones"""
+    if not fts_enabled():
+        return
+    recipe_ids = list(recipe_ids)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(recipe_ids), CHUNK_SIZE):
+            chunk = recipe_ids[start:start + CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', chunk)
+            cursor.execute(_index_sql(f'AND r.id IN ({placeholders})'), chunk)
+
+
+def rebuild_search_index():
+    """Re-index every published recipe, returning how many were indexed"""
+    if not fts_enabled():
+        return 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(_index_sql())
+        indexed = cursor.rowcount
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return indexed
+
+
+def _fallback_page(text, request):
+    """Substring search for databases without FTS5"""
+    recipes = Recipe.objects.filter(is_published=True)
+    for term in _TERM.findall(text)[:MAX_TERMS]:
+        recipes = recipes.filter(
+            Q(title__icontains=term) | Q(description__icontains=term)
+            | Q(ingredients__ingredient__name__icontains=term) | Q(steps__instruction__icontains=term)
+        )
+    return paginate(recipes.distinct(), request)
+
+
+def search_page(text, request):
+    """Return the KeysetPage of recipes matching ``text`` selected by the request's cursor"""
+    if not fts_enabled():
+        return _fallback_page(text, request)
+    match = build_match_query(text)
+    if match is None:
+        return KeysetPage([])
+
+    size = get_page_size(request)
+    token = request.GET.get('cursor')
+    direction = NEXT
+    sql = f'SELECT rowid, rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+    params = [match]
+    if token:
+        rank, pk, direction = decode_cursor(token)
+        if not isinstance(rank, float):
+            raise Http404('Invalid page cursor')
+        op = '>' if direction == NEXT else '<'
+        sql += f' AND (rank {op} %s OR (rank = %s AND rowid {op} %s))'
+        params += [rank, rank, pk]
+    order = 'ASC' if direction == NEXT else 'DESC'
+    sql += f' ORDER BY rank {order}, rowid {order} LIMIT %s'
+    params.append(size + 1)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if direction == NEXT:
+        has_next, has_previous = has_more, bool(token)
+    else:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+
+    recipes = Recipe.objects.in_bulk([pk for pk, _ in rows])
+    page = KeysetPage([recipes[pk] for pk, _ in rows if pk in recipes])
+    if rows and has_next:
+        page.next_cursor = encode_cursor(rows[-1][1], rows[-1][0], NEXT)
+    if rows and has_previous:
+        page.previous_cursor = encode_cursor(rows[0][1], rows[0][0], PREVIOUS)
+    return page
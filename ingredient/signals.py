@@ -0,0 +1,262 @@
+from django.contrib.auth.models import User
+from django.core.signals import request_finished, request_started
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .autocomplete import add_ingredient_name, invalidate_completer
+from .cards import bump_card_versions
+from .conditional import bump_recipe_pages
+from .costing import invalidate_price_matrix
+from .counters import view_counter
+from .images import needs_variants, schedule_variants
+from .matching import invalidate_ingredient_index, invalidate_recipe_item_payload
+from .pantry import invalidate_pantry_index
+from .models import (Comment, Favorite, Ingredient, IngredientPrice, Like, Rating, Recipe, RecipeIngredient,
+                     RecipeStep, Review, ingredientItem, recipeItem)
+from .search import reindex_recipes
+from .stats import defer_rebuilds, mark_stats_stale, rebuild_scheduled
+from .user_state import FAVORITES, LIKES, RATINGS, invalidate_user_state
+
+
+# ============ LEGACY INGREDIENT INDEX ============
+
+@receiver(m2m_changed, sender=recipeItem.list_ingredient.through)
+def legacy_ingredients_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_ingredient_index()
+
+
+@receiver(post_save, sender=recipeItem)
+def legacy_recipe_saved(sender, instance, created, **kwargs):
+    invalidate_recipe_item_payload(instance.pk)
+    # Only new recipes change the index; edits to the text fields do not
+    if created:
+        invalidate_ingredient_index()
+
+
+@receiver(post_delete, sender=recipeItem)
+def legacy_recipe_deleted(sender, instance, **kwargs):
+    invalidate_recipe_item_payload(instance.pk)
+    invalidate_ingredient_index()
+
+
+@receiver(post_save, sender=ingredientItem)
+@receiver(post_delete, sender=ingredientItem)
+def legacy_catalog_changed(sender, **kwargs):
+    invalidate_ingredient_index()
+
+
+# ============ AUTOCOMPLETE ============
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=ingredientItem)
+def ingredient_name_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        add_ingredient_name(instance.name, instance.pk if sender is ingredientItem else None)
+    else:
+        invalidate_completer()
+
+
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=ingredientItem)
+def ingredient_name_deleted(sender, **kwargs):
+    invalidate_completer()
+
+
+# ============ RATING AGGREGATES ============
+
+@receiver(post_save, sender=Rating)
+def rating_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_stored_score', None)
+    if created:
+        Recipe.adjust_rating_aggregates(instance.recipe_id, added=instance.score)
+    elif previous is None:
+        # Saved without being loaded first, so the old score is unknown
+        Recipe.rebuild_rating_aggregates(Recipe.objects.filter(pk=instance.recipe_id))
+    elif previous != instance.score:
+        Recipe.adjust_rating_aggregates(instance.recipe_id, added=instance.score, removed=previous)
+    instance._stored_score = instance.score
+
+
+@receiver(post_delete, sender=Rating)
+def rating_deleted(sender, instance, **kwargs):
+    score = getattr(instance, '_stored_score', instance.score)
+    Recipe.adjust_rating_aggregates(instance.recipe_id, removed=score)
+
+
+# ============ IMAGE VARIANTS ============
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, raw=False, **kwargs):
+    if not raw and needs_variants(instance):
+        schedule_variants(instance.pk, instance.image.name)
+
+
+# ============ ENGAGEMENT COUNTERS ============
+
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Favorite)
+def engagement_added(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        field = 'likes' if sender is Like else 'favorites'
+        Recipe.adjust_engagement_counts(instance.recipe_id, **{field: 1})
+
+
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Favorite)
+def engagement_removed(sender, instance, **kwargs):
+    field = 'likes' if sender is Like else 'favorites'
+    Recipe.adjust_engagement_counts(instance.recipe_id, **{field: -1})
+
+
+# ============ SEARCH INDEX ============
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex_recipes([instance.pk])
+        invalidate_pantry_index()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=RecipeStep)
+@receiver(post_delete, sender=RecipeStep)
+def recipe_part_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex_recipes([instance.recipe_id])
+        if sender is RecipeIngredient:
+            invalidate_pantry_index()
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        reindex_recipes(RecipeIngredient.objects.filter(ingredient=instance)
+                        .values_list('recipe_id', flat=True).distinct())
+        invalidate_pantry_index()
+
+
+# ============ PRICE MATRIX ============
+
+@receiver(post_save, sender=IngredientPrice)
+@receiver(post_delete, sender=IngredientPrice)
+@receiver(post_delete, sender=Ingredient)
+def prices_changed(sender, raw=False, **kwargs):
+    if not raw:
+        invalidate_price_matrix()
+
+
+@receiver(post_save, sender=Ingredient)
+def priced_ingredient_renamed(sender, instance, created, raw=False, **kwargs):
+    # Shopping list items are priced by name
+    if not created and not raw:
+        invalidate_price_matrix()
+
+
+# ============ RECIPE CARDS ============
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_card_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_card_versions([instance.pk])
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_card_part_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_card_versions([instance.recipe_id])
+
+
+@receiver(post_save, sender=User)
+def recipe_author_changed(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Community cards show the author's name; logins only touch last_login
+    if created or raw or (update_fields and set(update_fields) <= {'last_login', 'password'}):
+        return
+    bump_card_versions(Recipe.objects.filter(created_by=instance).values_list('pk', flat=True))
+
+
+# ============ CONDITIONAL GET ============
+# Recipe, rating, review and ingredient changes reach the pages through
+# bump_card_versions; these are the parts only the detail page shows.
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=RecipeStep)
+@receiver(post_delete, sender=RecipeStep)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def recipe_page_part_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_recipe_pages([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def recipe_page_ingredient_renamed(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        bump_recipe_pages(RecipeIngredient.objects.filter(ingredient=instance)
+                          .values_list('recipe_id', flat=True).distinct())
+
+
+# ============ SITE STATS ============
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_count_changed(sender, instance, created=True, raw=False, **kwargs):
+    if created and not raw:
+        mark_stats_stale()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_count_changed(sender, instance, raw=False, **kwargs):
+    # Edits can publish or unpublish a recipe
+    if not raw:
+        mark_stats_stale()
+
+
+@receiver(request_started)
+def defer_site_stats_rebuilds(sender, **kwargs):
+    defer_rebuilds()
+
+
+@receiver(request_finished)
+def rebuild_stale_site_stats(sender, **kwargs):
+    # The request that found the stats stale recounts them once its response is sent
+    rebuild_scheduled()
+
+
+# ============ PER-USER RECIPE STATE ============
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def user_state_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        relation = {Favorite: FAVORITES, Like: LIKES, Rating: RATINGS}[sender]
+        invalidate_user_state(instance.user_id, relation)
+
+
+# ============ VIEW COUNTS ============
+
+@receiver(request_finished)
+def flush_view_counts(sender, **kwargs):
+    # Runs after the response is sent, keeping recipe_detail read-only
+    if view_counter.due():
+        view_counter.flush()
@@ -0,0 +1,87 @@
+"""SQLite backend tuned for several workers sharing one database file.
+
+On top of Django's sqlite3 backend it:
+
+- runs PRAGMAs on every new connection (DEFAULT_PRAGMAS, overridden by
+  ``OPTIONS['pragmas']``): WAL so readers never wait for a writer,
+  ``synchronous=NORMAL`` (safe with WAL), a busy timeout, and a larger page
+  cache and memory map;
+- retries a statement that fails with "database is locked" when it runs
+  outside a transaction, with jittered exponential backoff
+  (``OPTIONS['lock_retries']``, ``OPTIONS['lock_retry_delay']`` in seconds).
+  That covers autocommit writes and the ``BEGIN`` that opens every atomic
+  block. Statements inside a transaction are never retried: the earlier
+  statements of the transaction would be lost.
+
+Use it with ``OPTIONS['transaction_mode'] = 'IMMEDIATE'``, so a transaction
+takes the write lock when it begins, where waiting and retrying are safe,
+instead of failing halfway through when a read lock cannot be upgraded.
+"""
+import random
+import time
+
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+DEFAULT_LOCK_RETRIES = 5
+DEFAULT_LOCK_RETRY_DELAY = 0.05
+MAX_LOCK_RETRY_DELAY = 2.0
+
+
+def is_lock_error(exc):
+    return isinstance(exc, base.Database.OperationalError) and 'locked' in str(exc)
+
+
+def retry_locked(func, *args, retries=DEFAULT_LOCK_RETRIES, delay=DEFAULT_LOCK_RETRY_DELAY):
+    """Call ``func(*args)``, retrying lock errors after a random share of an exponential delay"""
+    for attempt in range(retries + 1):
+        try:
+            return func(*args)
+        except base.Database.OperationalError as exc:
+            if attempt == retries or not is_lock_error(exc):
+                raise
+        time.sleep(random.uniform(0, min(MAX_LOCK_RETRY_DELAY, delay * 2 ** attempt)))
+
+
+class RetryingCursorWrapper(base.SQLiteCursorWrapper):
+    retries = DEFAULT_LOCK_RETRIES
+    delay = DEFAULT_LOCK_RETRY_DELAY
+
+    def execute(self, query, params=None):
+        execute = super().execute
+        if self.connection.in_transaction:
+            return execute(query, params)
+        return retry_locked(execute, query, params, retries=self.retries, delay=self.delay)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+        self.lock_retries = options.get('lock_retries', DEFAULT_LOCK_RETRIES)
+        self.lock_retry_delay = options.get('lock_retry_delay', DEFAULT_LOCK_RETRY_DELAY)
+        kwargs = super().get_connection_params()
+        for name in ('pragmas', 'lock_retries', 'lock_retry_delay'):
+            kwargs.pop(name, None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            # journal_mode needs a lock on a file that another worker may be writing
+            retry_locked(conn.execute, f'PRAGMA {name} = {value}',
+                         retries=self.lock_retries, delay=self.lock_retry_delay)
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=RetryingCursorWrapper)
+        cursor.retries, cursor.delay = self.lock_retries, self.lock_retry_delay
+        return cursor
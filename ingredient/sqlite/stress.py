@@ -0,0 +1,114 @@
+"""Concurrency stress test for SQLite database settings.
+
+run_stress() runs reader and writer threads against a scratch database
+file, once per configuration, and reports throughput and errors for each.
+Readers run the kind of query the list pages run. Writers do what a like
+toggle does: read whether the like exists, then insert or delete it and
+adjust the recipe's counter, all in one transaction. Threads stand in for
+worker processes: sqlite3 releases the GIL while it waits for a lock.
+"""
+import os
+import random
+import tempfile
+import threading
+from time import perf_counter
+
+from django.db import DatabaseError, connections, transaction
+
+from ..benchmark import percentile
+
+RECIPES = 200
+
+# Django's own backend with its defaults: rollback journal, deferred transactions
+BASELINE = {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}}
+
+
+def _create_schema(cursor):
+    cursor.execute('CREATE TABLE stress_recipe (id INTEGER PRIMARY KEY, likes_count INTEGER NOT NULL)')
+    cursor.execute('CREATE TABLE stress_like (id INTEGER PRIMARY KEY, recipe_id INTEGER NOT NULL, '
+                   'user_id INTEGER NOT NULL, UNIQUE (recipe_id, user_id))')
+    cursor.executemany('INSERT INTO stress_recipe (id, likes_count) VALUES (%s, 0)',
+                       [(pk,) for pk in range(1, RECIPES + 1)])
+
+
+def _read(alias, rng):
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT id, likes_count FROM stress_recipe ORDER BY likes_count DESC, id LIMIT 24')
+        cursor.fetchall()
+        cursor.execute('SELECT COUNT(*) FROM stress_like WHERE recipe_id = %s', [rng.randint(1, RECIPES)])
+        cursor.fetchone()
+
+
+def _write(alias, rng, user_id):
+    recipe_id = rng.randint(1, RECIPES)
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        cursor.execute('SELECT id FROM stress_like WHERE recipe_id = %s AND user_id = %s', [recipe_id, user_id])
+        if cursor.fetchone():
+            cursor.execute('DELETE FROM stress_like WHERE recipe_id = %s AND user_id = %s', [recipe_id, user_id])
+            change = -1
+        else:
+            cursor.execute('INSERT INTO stress_like (recipe_id, user_id) VALUES (%s, %s)', [recipe_id, user_id])
+            change = 1
+        cursor.execute('UPDATE stress_recipe SET likes_count = likes_count + %s WHERE id = %s', [change, recipe_id])
+
+
+def _worker(alias, operation, seconds, start, results, seed):
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    start.wait()
+    deadline = perf_counter() + seconds
+    try:
+        while perf_counter() < deadline:
+            began = perf_counter()
+            try:
+                if operation == 'read':
+                    _read(alias, rng)
+                else:
+                    _write(alias, rng, seed)
+            except DatabaseError:
+                errors += 1
+            else:
+                latencies.append((perf_counter() - began) * 1000)
+    finally:
+        connections[alias].close()
+    results.append((operation, latencies, errors))
+
+
+def _summary(results, operation, seconds):
+    latencies = [ms for op, values, _ in results if op == operation for ms in values]
+    return {
+        f'{operation}s': len(latencies),
+        f'{operation}s_per_second': round(len(latencies) / seconds, 1),
+        f'{operation}_errors': sum(errors for op, _, errors in results if op == operation),
+        f'{operation}_p95_ms': round(percentile(latencies, 95), 2) if latencies else None,
+    }
+
+
+def stress(database, seconds=5.0, readers=4, writers=4):
+    """Run the workload against a fresh database file configured by ``database``"""
+    alias = f'stress-{id(database)}'
+    with tempfile.TemporaryDirectory() as directory:
+        settings = {**database, 'NAME': os.path.join(directory, 'stress.sqlite3')}
+        connections.settings[alias] = connections.configure_settings({'default': {}, alias: settings})[alias]
+        try:
+            with connections[alias].cursor() as cursor:
+                _create_schema(cursor)
+            connections[alias].close()
+
+            start, results = threading.Barrier(readers + writers), []
+            threads = [threading.Thread(target=_worker, args=(alias, 'read', seconds, start, results, n))
+                       for n in range(readers)]
+            threads += [threading.Thread(target=_worker, args=(alias, 'write', seconds, start, results, n))
+                        for n in range(writers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            del connections.settings[alias]
+    return {**_summary(results, 'read', seconds), **_summary(results, 'write', seconds)}
+
+
+def run_stress(configurations, seconds=5.0, readers=4, writers=4):
+    """``{name: results}`` for each ``{name: DATABASES entry}`` in turn"""
+    return {name: stress(database, seconds, readers, writers) for name, database in configurations.items()}
@@ -0,0 +1,122 @@
+"""Site-wide totals for the community page.
+
+The totals (published recipes, users, ratings and reviews) are cached as
+one entry that never expires but carries a soft deadline,
+COMMUNITY_STATS_TTL seconds after it was counted. Past the deadline the
+entry is stale: requests keep serving it, and the first request to win
+the rebuild lock (``cache.add``) counts the tables again after its response
+has been sent (see signals.py). So only one worker recounts at a time, and
+no request waits for the count. Callers outside a request (commands, the
+shell) have no response to wait for, so a winner there recounts at once.
+
+``cache.add`` is atomic on Redis. The file cache checks and writes in two
+steps, so two workers may occasionally both recount; that costs one extra
+count and nothing else.
+
+Only a cold cache, with nothing to serve, counts on the request path. The
+lock winner counts while the others wait briefly for its result. Signals
+mark the entry stale when recipes or users are added or removed; ratings
+and reviews wait for the deadline. STATS_VERSION is bumped whenever the
+totals change, for the community page's ETag.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+
+from .caching import bump_version
+from .models import Rating, Recipe, Review
+
+STATS_KEY = 'nourish:site-stats'
+LOCK_KEY = 'nourish:site-stats:rebuilding'
+STATS_VERSION = 'site-stats'
+# A rebuild that takes longer than this (or dies) lets another worker try
+LOCK_TIMEOUT = 60
+COLD_WAIT = 2.0
+
+logger = logging.getLogger(__name__)
+
+# Per thread: whether a request is running and whether it won a rebuild
+_scheduled = threading.local()
+
+
+def count_totals():
+    # Always the primary: the totals outlive a replica sync
+    return {
+        'recipes': Recipe.objects.using('default').filter(is_published=True).count(),
+        'users': User.objects.using('default').count(),
+        'ratings': Rating.objects.using('default').count(),
+        'reviews': Review.objects.using('default').count(),
+    }
+
+
+def _store(totals):
+    previous = cache.get(STATS_KEY)
+    cache.set(STATS_KEY, {'totals': totals, 'fresh_until': time.time() + settings.COMMUNITY_STATS_TTL},
+              timeout=None)
+    if previous is None or previous['totals'] != totals:
+        bump_version(STATS_VERSION)
+
+
+def rebuild_site_stats():
+    """Count the totals now and release the rebuild lock"""
+    try:
+        totals = count_totals()
+        _store(totals)
+        return totals
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def get_site_stats():
+    """The totals, possibly stale; schedules a rebuild when they are past their deadline"""
+    entry = cache.get(STATS_KEY)
+    if entry is not None:
+        if entry['fresh_until'] <= time.time() and cache.add(LOCK_KEY, True, LOCK_TIMEOUT):
+            if not getattr(_scheduled, 'in_request', False):
+                # No request_finished will come to run a scheduled rebuild
+                return rebuild_site_stats()
+            _scheduled.rebuild = True
+        return entry['totals']
+
+    if cache.add(LOCK_KEY, True, LOCK_TIMEOUT):
+        return rebuild_site_stats()
+    deadline = time.monotonic() + COLD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(STATS_KEY)
+        if entry is not None:
+            return entry['totals']
+    # The rebuilding worker is stuck; count without storing
+    return count_totals()
+
+
+def defer_rebuilds():
+    """Let get_site_stats() defer rebuilds until this thread's response is sent"""
+    _scheduled.in_request = True
+    _scheduled.rebuild = False
+
+
+def rebuild_scheduled():
+    """Run the rebuild this thread's request won, if any; call after the response"""
+    _scheduled.in_request = False
+    if not getattr(_scheduled, 'rebuild', False):
+        return
+    _scheduled.rebuild = False
+    try:
+        rebuild_site_stats()
+    except Exception:
+        logger.exception('Could not rebuild the site stats')
+
+
+def mark_stats_stale():
+    """Once the transaction commits, let the next request trigger a rebuild"""
+    def mark():
+        entry = cache.get(STATS_KEY)
+        if entry is not None:
+            cache.set(STATS_KEY, {**entry, 'fresh_until': 0}, timeout=None)
+    transaction.on_commit(mark)
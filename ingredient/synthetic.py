@@ -0,0 +1,280 @@
+"""Deterministic synthetic data for load testing.
+
+DatasetGenerator fills every model with realistic-looking rows at any
+scale. All randomness comes from one seeded ``random.Random``, so the same
+arguments always produce the same dataset. Rows are written with chunked
+``bulk_create`` calls, one transaction per chunk of recipes.
+
+bulk_create does not send signals, so denormalized columns such as the
+rating aggregates are filled in directly, and in-process caches and the
+search index are rebuilt once at the end.
+"""
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .autocomplete import invalidate_completer
+from .conditional import bump_catalog
+from .costing import invalidate_price_matrix
+from .matching import invalidate_ingredient_index
+from .pantry import invalidate_pantry_index
+from .search import rebuild_search_index
+from .stats import mark_stats_stale
+from .models import (
+    Comment, Favorite, Ingredient, IngredientPrice, Like, Rating, Recipe, RecipeIngredient,
+    RecipeStep, Review, ShoppingList, ShoppingListItem, ingredientItem, recipeItem,
+)
+
+BATCH_SIZE = 2000
+
+BASE_INGREDIENTS = [
+    ('Ugali Flour', 'grain'), ('Sukuma Wiki', 'vegetable'), ('Tomatoes', 'vegetable'),
+    ('Onions', 'vegetable'), ('Garlic', 'vegetable'), ('Ginger', 'vegetable'), ('Oil', 'oil'),
+    ('Salt', 'spice'), ('Black Pepper', 'spice'), ('Cumin', 'spice'), ('Turmeric', 'spice'),
+    ('Pilau Rice', 'grain'), ('Beans', 'protein'), ('Lentils', 'protein'),
+    ('Chapati Flour', 'grain'), ('Eggs', 'protein'), ('Milk', 'dairy'), ('Coconut Milk', 'dairy'),
+    ('Beef', 'protein'), ('Chicken', 'protein'), ('Nyama Choma Spice', 'spice'),
+    ('Coriander', 'spice'), ('Chillies', 'vegetable'), ('Bell Peppers', 'vegetable'),
+    ('Carrots', 'vegetable'), ('Potatoes', 'vegetable'), ('Avocados', 'fruit'),
+    ('Bananas', 'fruit'), ('Maize', 'grain'), ('Tilapia', 'protein'), ('Goat Meat', 'protein'),
+    ('Cabbage', 'vegetable'), ('Spinach', 'vegetable'), ('Green Grams', 'protein'),
+    ('Sweet Potatoes', 'vegetable'), ('Cassava', 'vegetable'), ('Mangoes', 'fruit'),
+    ('Pineapple', 'fruit'), ('Cardamom', 'spice'), ('Cinnamon', 'spice'), ('Butter', 'dairy'),
+    ('Sugar', 'other'), ('Wheat Flour', 'grain'), ('Sorghum', 'grain'), ('Millet', 'grain'),
+]
+
+ADJECTIVES = [
+    'Classic', 'Spicy', 'Creamy', 'Smoky', 'Coastal', 'Garlic', 'Herbed', 'Crispy',
+    'Slow-cooked', 'Grilled', "Grandma's", 'Quick', 'Hearty', 'Tangy', 'Street-style',
+]
+DISHES = [
+    'Pilau', 'Ugali', 'Sukuma Wiki', 'Chapati', 'Nyama Choma', 'Githeri', 'Mandazi', 'Samosa',
+    'Mukimo', 'Matoke', 'Bhajia', 'Kachumbari', 'Biryani', 'Wali wa Nazi', 'Maharagwe',
+    'Mchuzi wa Samaki', 'Kuku Paka', 'Mutura', 'Chips Mayai', 'Ndengu',
+]
+STEP_TEMPLATES = [
+    'Wash and prepare the {ingredient}.',
+    'Heat oil in a heavy-bottomed pot over medium heat.',
+    'Add the {ingredient} and stir for {minutes} minutes.',
+    'Season with salt and pepper to taste.',
+    'Cover and simmer for {minutes} minutes, stirring occasionally.',
+    'Mix the {ingredient} in a large bowl until combined.',
+    'Grill or fry until golden on both sides.',
+    'Serve hot with ugali, rice or chapati.',
+]
+REVIEW_TEXTS = [
+    ('Family favourite', 'Everyone asked for seconds.'),
+    ('Easy weeknight meal', 'Quick to make and very tasty.'),
+    ('Needs more spice', 'Good base, but I doubled the chillies.'),
+    ('Just like home', 'Reminds me of how my mother cooks it.'),
+    ('Okay', 'A bit bland for my taste.'),
+]
+COMMENT_TEXTS = [
+    'Can I use brown rice instead?', 'Made this last night, delicious!', 'How long does it keep?',
+    'Added some coconut milk, worked great.', 'Thanks for sharing!', 'Perfect for meal prep.',
+]
+SCORE_WEIGHTS = [5, 8, 20, 35, 32]
+UNITS = [unit for unit, _ in RecipeIngredient.UNIT_CHOICES]
+MARKETS = [market for market, _ in IngredientPrice.MARKET_CHOICES]
+
+
+class DatasetGenerator:
+    """Generates a reproducible dataset covering every model in ingredient.models"""
+
+    def __init__(self, recipes, users, ratings_per_recipe=3, seed=0, ingredients=200,
+                 legacy_recipes=None, batch_size=BATCH_SIZE, log=None):
+        self.recipes = recipes
+        self.users = users
+        self.ratings_per_recipe = min(ratings_per_recipe, users)
+        self.seed = seed
+        self.ingredients = ingredients
+        self.legacy_recipes = recipes // 10 if legacy_recipes is None else legacy_recipes
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.rng = random.Random(seed)
+        self.counts = {}
+        self.username_prefix = f'synthetic{seed}_'
+
+    def _bulk_create(self, model, objects, **kwargs):
+        created = model.objects.bulk_create(objects, batch_size=self.batch_size, **kwargs)
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(objects)
+        return created
+
+    def already_generated(self):
+        return User.objects.filter(username=f'{self.username_prefix}0').exists()
+
+    def run(self):
+        """Create the whole dataset and return row counts per model"""
+        self.create_users()
+        self.create_ingredients()
+        self.create_prices()
+        self.create_recipes()
+        self.create_shopping_lists()
+        self.create_legacy_catalog()
+        invalidate_ingredient_index()
+        invalidate_completer()
+        invalidate_pantry_index()
+        invalidate_price_matrix()
+        bump_catalog()
+        mark_stats_stale()
+        rebuild_search_index()
+        return self.counts
+
+    def create_users(self):
+        password = make_password('demo123')
+        with transaction.atomic():
+            users = self._bulk_create(User, [
+                User(username=f'{self.username_prefix}{i}', email=f'{self.username_prefix}{i}@nourish.local',
+                     first_name=self.rng.choice(['Amina', 'Brian', 'Wanjiku', 'Otieno', 'Njeri', 'Kiprop']),
+                     last_name=self.rng.choice(['Mwangi', 'Odhiambo', 'Kamau', 'Chebet', 'Wafula', 'Achieng']),
+                     password=password)
+                for i in range(self.users)
+            ])
+        self.user_ids = [user.pk for user in users]
+        self.log(f'Created {len(self.user_ids)} users')
+
+    def create_ingredients(self):
+        wanted = {}
+        for i in range(self.ingredients):
+            name, category = BASE_INGREDIENTS[i % len(BASE_INGREDIENTS)]
+            if i >= len(BASE_INGREDIENTS):
+                name = f'{name} ({self.seed}-{i // len(BASE_INGREDIENTS)})'
+            wanted[name] = category
+        existing = set(Ingredient.objects.filter(name__in=wanted).values_list('name', flat=True))
+        with transaction.atomic():
+            self._bulk_create(Ingredient, [
+                Ingredient(name=name, category=category)
+                for name, category in wanted.items() if name not in existing
+            ])
+        self.ingredient_rows = list(Ingredient.objects.filter(name__in=wanted)
+                                    .order_by('name').values_list('pk', 'name'))
+        self.log(f'Using {len(self.ingredient_rows)} ingredients')
+
+    def create_prices(self):
+        objects = [
+            IngredientPrice(ingredient_id=pk, unit=unit, market=market,
+                            price_kes=Decimal(self.rng.randint(2000, 150000)) / 100)
+            for pk, _ in self.ingredient_rows
+            for unit in ('kg', 'piece')
+            for market in MARKETS
+        ]
+        with transaction.atomic():
+            self._bulk_create(IngredientPrice, objects, ignore_conflicts=True)
+
+    def _sample_users(self, count):
+        return self.rng.sample(self.user_ids, min(count, len(self.user_ids)))
+
+    def _recipe(self, scores):
+        rng = self.rng
+        histogram = [scores.count(score) for score in range(1, 6)]
+        return Recipe(
+            title=f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)}',
+            description=f'A {rng.choice(["simple", "rich", "family", "festive"])} take on an East African favourite.',
+            prep_time=rng.choice([5, 10, 15, 20, 30, 45]),
+            cook_time=rng.choice([10, 20, 30, 45, 60, 90, 120]),
+            servings=rng.randint(1, 8),
+            difficulty=rng.choice(['easy', 'easy', 'medium', 'medium', 'hard']),
+            category=rng.choice([category for category, _ in Recipe.CATEGORY_CHOICES]),
+            created_by_id=rng.choice(self.user_ids),
+            is_published=rng.random() < 0.95,
+            views_count=int(rng.paretovariate(1.2) * 10),
+            rating_count=len(scores),
+            rating_sum=sum(scores),
+            **{f'rating_count_{score}': histogram[score - 1] for score in range(1, 6)},
+        )
+
+    def create_recipes(self):
+        rng = self.rng
+        self.recipe_ids = []
+        for start in range(0, self.recipes, self.batch_size):
+            size = min(self.batch_size, self.recipes - start)
+            raters = [self._sample_users(rng.randint(0, 2 * self.ratings_per_recipe)) for _ in range(size)]
+            scores = [rng.choices(range(1, 6), SCORE_WEIGHTS, k=len(users)) for users in raters]
+
+            with transaction.atomic():
+                recipes = self._bulk_create(Recipe, [self._recipe(s) for s in scores])
+                ingredients, steps, ratings, reviews, comments, likes, favorites = [], [], [], [], [], [], []
+                for recipe, users, recipe_scores in zip(recipes, raters, scores):
+                    chosen = rng.sample(self.ingredient_rows, min(rng.randint(4, 10), len(self.ingredient_rows)))
+                    for ingredient_id, _ in chosen:
+                        ingredients.append(RecipeIngredient(
+                            recipe_id=recipe.pk, ingredient_id=ingredient_id, unit=rng.choice(UNITS),
+                            amount=Decimal(rng.randint(1, 40)) / 4))
+                    for order in range(1, rng.randint(3, 8) + 1):
+                        steps.append(RecipeStep(recipe_id=recipe.pk, order=order, instruction=rng.choice(STEP_TEMPLATES).format(
+                            ingredient=rng.choice(chosen)[1].lower(), minutes=rng.randint(2, 30))))
+                    for user_id, score in zip(users, recipe_scores):
+                        ratings.append(Rating(recipe_id=recipe.pk, user_id=user_id, score=score))
+                        if rng.random() < 0.3:
+                            title, text = rng.choice(REVIEW_TEXTS)
+                            reviews.append(Review(recipe_id=recipe.pk, user_id=user_id, title=title, text=text))
+                    for user_id in self._sample_users(rng.randint(0, 3)):
+                        comments.append(Comment(recipe_id=recipe.pk, user_id=user_id, text=rng.choice(COMMENT_TEXTS)))
+                    for user_id in self._sample_users(rng.randint(0, 2 * self.ratings_per_recipe)):
+                        likes.append(Like(recipe_id=recipe.pk, user_id=user_id))
+                    for user_id in self._sample_users(rng.randint(0, self.ratings_per_recipe)):
+                        favorites.append(Favorite(recipe_id=recipe.pk, user_id=user_id))
+
+                for model, objects in ((RecipeIngredient, ingredients), (RecipeStep, steps), (Rating, ratings),
+                                       (Review, reviews), (Comment, comments), (Like, likes),
+                                       (Favorite, favorites)):
+                    self._bulk_create(model, objects)
+                # bulk_create sends no signals, so set the like/favorite counters here
+                Recipe.rebuild_engagement_counts(Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes]))
+            self.recipe_ids.extend(recipe.pk for recipe in recipes)
+            self.log(f'Created {start + size}/{self.recipes} recipes')
+
+    def create_shopping_lists(self):
+        rng = self.rng
+        owners = self._sample_users(max(1, len(self.user_ids) // 5)) if self.user_ids else []
+        for start in range(0, len(owners), self.batch_size):
+            with transaction.atomic():
+                lists = self._bulk_create(ShoppingList, [
+                    ShoppingList(user_id=user_id) for user_id in owners[start:start + self.batch_size]
+                ])
+                items = []
+                for shopping_list in lists:
+                    for _ in range(rng.randint(3, 12)):
+                        items.append(ShoppingListItem(
+                            shopping_list_id=shopping_list.pk, ingredient_name=rng.choice(self.ingredient_rows)[1],
+                            amount=Decimal(rng.randint(1, 20)) / 2, unit=rng.choice(UNITS),
+                            is_purchased=rng.random() < 0.3,
+                            from_recipe_id=rng.choice(self.recipe_ids) if self.recipe_ids else None))
+                self._bulk_create(ShoppingListItem, items)
+
+    def create_legacy_catalog(self):
+        if not self.legacy_recipes:
+            return
+        rng = self.rng
+        wanted = {name.lower(): category for name, category in BASE_INGREDIENTS}
+        # The match API and autocomplete key on names, so reuse the ones already there
+        existing = {}
+        for item in ingredientItem.objects.filter(name__in=wanted).order_by('pk'):
+            existing.setdefault(item.name, item)
+        with transaction.atomic():
+            created = self._bulk_create(ingredientItem, [
+                ingredientItem(name=name, property=category, img_url='')
+                for name, category in wanted.items() if name not in existing
+            ])
+        existing.update((item.name, item) for item in created)
+        items = [existing[name] for name in wanted]
+        through = recipeItem.list_ingredient.through
+        for start in range(0, self.legacy_recipes, self.batch_size):
+            size = min(self.batch_size, self.legacy_recipes - start)
+            with transaction.atomic():
+                plans = [rng.sample(items, rng.randint(2, 6)) for _ in range(size)]
+                recipes = self._bulk_create(recipeItem, [
+                    recipeItem(name=f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)}',
+                               ingredients='#'.join(item.name for item in plan),
+                               directions='#'.join(rng.sample(STEP_TEMPLATES, 3)).format(
+                                   ingredient=plan[0].name, minutes=rng.randint(2, 30)),
+                               img_url='')
+                    for plan in plans
+                ])
+                self._bulk_create(through, [
+                    through(recipeitem_id=recipe.pk, ingredientitem_id=item.pk)
+                    for recipe, plan in zip(recipes, plans) for item in plan
+                ])
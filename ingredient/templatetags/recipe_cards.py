@@ -0,0 +1,28 @@
+import json
+
+from django import template
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from ..cards import render_cards
+from ..user_state import recipe_state
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def recipe_cards(context, recipes, template_name):
+    """Render cached cards: {% recipe_cards recipes 'partials/cards/recipe.html' %}"""
+    return render_cards(recipes, template_name, context.get('user'))
+
+
+@register.simple_tag(takes_context=True)
+def recipe_state_json(context, recipes):
+    """The user's favorite/like/rating state for these recipes, for recipe_state.js to apply"""
+    user = context.get('user')
+    if user is None or not user.is_authenticated:
+        return ''
+    state = recipe_state(user, [recipe.pk for recipe in recipes])
+    # Keys and values are ids, booleans and scores, so the JSON holds no markup
+    return format_html('<script type="application/json" class="recipe-state">{}</script>',
+                       mark_safe(json.dumps({str(pk): value for pk, value in state.items()})))
@@ -0,0 +1,42 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from ..images import UPLOAD_PREFIX, variant_name
+
+register = template.Library()
+
+
+def _original_url(recipe):
+    name = recipe.image.name
+    return recipe.image.url if name.startswith(UPLOAD_PREFIX) else static(f'images/{name}')
+
+
+def _srcset(variants, ext):
+    return ', '.join(f"{default_storage.url(variant_name(variants['hash'], width, ext))} {width}w"
+                     for width in variants['widths'])
+
+
+@register.simple_tag
+def recipe_image(recipe, css_class='', style='', sizes='100vw', lazy=True):
+    """Responsive <picture> for a recipe image: {% recipe_image recipe 'card-img-top' sizes='33vw' %}
+
+    Uses the WebP/JPEG variants from images.py once they are built for the
+    current image, and the original file until then.
+    """
+    loading = 'lazy' if lazy else 'eager'
+    variants = recipe.image_variants or {}
+    if variants.get('source') != recipe.image.name:
+        return format_html('<img src="{}" class="{}" alt="{}" style="{}" loading="{}" decoding="async">',
+                           _original_url(recipe), css_class, recipe.title, style, loading)
+
+    fallback = min((width for width in variants['widths'] if width >= 640), default=variants['widths'][-1])
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" class="{}" alt="{}" style="{}"'
+        ' loading="{}" decoding="async"></picture>',
+        _srcset(variants, 'webp'), sizes,
+        default_storage.url(variant_name(variants['hash'], fallback, 'jpg')), _srcset(variants, 'jpg'), sizes,
+        variants['width'], variants['height'], css_class, recipe.title, style, loading,
+    )
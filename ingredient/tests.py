@@ -1,3 +1,1200 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from contextlib import closing
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from . import stats
+from .autocomplete import get_completer, invalidate_completer
+from .benchmark import SCENARIOS, BenchmarkRunner, compare, project_routes
+from .cards import bump_card_versions, render_cards
+from .costing import get_price_matrix, invalidate_price_matrix
+from .counters import ViewCounterBuffer, view_counter
+from .explain import explain, plan_issues
+from .images import render_variants
+from .matching import get_ingredient_index, invalidate_ingredient_index
+from .middleware import record_query_patterns
+from .models import (Comment, Favorite, Ingredient, IngredientPrice, Like, Rating, Recipe,
+                     RecipeIngredient, RecipeStep, Review, ShoppingList, ShoppingListItem, ingredientItem,
+                     recipeItem)
+from .pagination import MAX_PAGE_SIZE, get_page_size
+from .pantry import PantryIndex, invalidate_pantry_index
+from .replicas import PRIMARY_UNTIL, ReplicaRouter, sync_replica
+from .search import build_match_query, rebuild_search_index
+from .sqlite.base import DatabaseWrapper, retry_locked
+from .sqlite.stress import stress
+from .synthetic import DatasetGenerator
+from .units import UnitConversionError, convert, convert_many, scale_many
+
+
+class LegacyMatchRecipeTests(TestCase):
+    """Tests for the legacy match API and ingredient search page"""
+
+    def setUp(self):
+        invalidate_ingredient_index()
+        self.egg = ingredientItem.objects.create(name='egg', property='', img_url='')
+        self.tomato = ingredientItem.objects.create(name='tomato', property='', img_url='')
+        self.potato = ingredientItem.objects.create(name='potato', property='', img_url='')
+
+        self.omelette = recipeItem.objects.create(
+            name='Omelette', ingredients='2 eggs#1 tomato', directions='Beat#Fry', img_url='o.png')
+        self.omelette.list_ingredient.add(self.egg, self.tomato)
+        self.chips = recipeItem.objects.create(
+            name='Chips', ingredients='3 potatoes', directions='Cut#Fry', img_url='c.png')
+        self.chips.list_ingredient.add(self.potato)
+
+    def match(self, names):
+        response = self.client.post('/api/match_recipe/', json.dumps({'listIngredient': names}),
+                                    content_type='application/json')
+        return json.loads(response.content)
+
+    def test_returns_recipes_containing_all_ingredients(self):
+        self.assertEqual(self.match(['egg', 'tomato']), [{
+            'name': 'Omelette',
+            'ingredients': ['2 eggs', '1 tomato'],
+            'directions': ['Beat', 'Fry'],
+            'img_url': 'o.png',
+        }])
+        self.assertEqual(self.match(['egg', 'potato']), [])
+        self.assertEqual(self.match(['unknown']), [])
+
+    def test_empty_payload_matches_every_recipe(self):
+        self.assertEqual([r['name'] for r in self.match([])], ['Omelette', 'Chips'])
+
+    def test_index_refreshes_when_ingredients_change(self):
+        self.assertEqual(self.match(['potato', 'egg']), [])
+        self.chips.list_ingredient.add(self.egg)
+        self.assertEqual([r['name'] for r in self.match(['potato', 'egg'])], ['Chips'])
+
+    def test_query_count_does_not_grow_with_catalog(self):
+        get_ingredient_index()
+        with self.assertNumQueries(1):
+            self.match(['egg'])
+
+    def test_search_view_lists_recipes_for_ingredient(self):
+        response = self.client.get(f'/search/{self.egg.id}/')
+        self.assertEqual([r['name'] for r in response.context['list_recipes']], ['Omelette'])
+
+    def test_search_view_uses_constant_queries(self):
+        for i in range(5):
+            recipeItem.objects.create(name=f'Egg dish {i}', ingredients='egg',
+                                      directions='Cook', img_url='').list_ingredient.add(self.egg)
+        with self.assertNumQueries(3):
+            self.client.get(f'/search/{self.egg.id}/')
+        with self.assertNumQueries(2):
+            self.client.get(f'/search/{self.egg.id}/')
+
+    def test_cached_payload_is_refreshed_on_save(self):
+        self.match(['egg'])
+        self.omelette.directions = 'Whisk#Fry'
+        self.omelette.save()
+        self.assertEqual(self.match(['egg'])[0]['directions'], ['Whisk', 'Fry'])
+
+
+class RatingAggregateTests(TestCase):
+    """Tests for the denormalized rating aggregates on Recipe"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('rater', password='Pass123!')
+        self.other = User.objects.create_user('other', password='Pass123!')
+        self.recipe = Recipe.objects.create(title='Pilau')
+        self.client.login(username='rater', password='Pass123!')
+
+    def rate(self, score):
+        self.client.post(f'/recipe/{self.recipe.id}/rating/', {'score': score})
+        self.recipe.refresh_from_db()
+
+    def test_rating_updates_aggregates(self):
+        self.rate(4)
+        Rating.objects.create(recipe=self.recipe, user=self.other, score=2)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.rating_count, 2)
+        self.assertEqual(self.recipe.average_rating(), 3)
+        self.assertEqual(self.recipe.rating_histogram(), [0, 1, 0, 1, 0])
+
+        self.rate(5)
+        self.assertEqual(self.recipe.rating_count, 2)
+        self.assertEqual(self.recipe.rating_sum, 7)
+        self.assertEqual(self.recipe.rating_histogram(), [0, 1, 0, 0, 1])
+
+    def test_deleting_rating_updates_aggregates(self):
+        self.rate(3)
+        Rating.objects.get(user=self.user).delete()
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.rating_count, self.recipe.rating_sum), (0, 0))
+        self.assertEqual(self.recipe.rating_histogram(), [0, 0, 0, 0, 0])
+
+    def test_out_of_range_score_is_rejected(self):
+        self.rate(9)
+        self.assertFalse(Rating.objects.exists())
+        self.assertEqual(self.recipe.rating_count, 0)
+
+    def test_rebuild_command_repairs_drift(self):
+        self.rate(5)
+        Recipe.objects.update(rating_count=0, rating_sum=0, rating_count_5=0)
+        call_command('rebuild_rating_aggregates', stdout=StringIO())
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.rating_count, self.recipe.rating_sum), (1, 5))
+        self.assertEqual(self.recipe.rating_histogram(), [0, 0, 0, 0, 1])
+
+
+class KeysetPaginationTests(TestCase):
+    """Tests for cursor pagination on the recipe list pages"""
+
+    def setUp(self):
+        self.recipes = [Recipe.objects.create(title=f'Recipe {i}') for i in range(5)]
+        # Two recipes share a timestamp so the id tie-breaker is exercised
+        Recipe.objects.filter(pk=self.recipes[2].pk).update(created_at=self.recipes[1].created_at)
+
+    def page(self, url, **params):
+        response = self.client.get(url, {'format': 'json', 'page_size': 2, **params})
+        return json.loads(response.content)
+
+    def titles(self, data):
+        return [title for title in sorted(r.title for r in self.recipes) if f'>{title}<' in data['html']]
+
+    def test_walks_forward_and_back_without_gaps(self):
+        seen = []
+        data = self.page('/recipes/')
+        self.assertIsNone(data['previous'])
+        pages = [data]
+        while data['next']:
+            data = self.page('/recipes/', cursor=data['next'])
+            pages.append(data)
+        for data in pages:
+            seen.extend(self.titles(data))
+        self.assertEqual(sorted(seen), sorted(r.title for r in self.recipes))
+        self.assertEqual(len(pages), 3)
+
+        previous = self.page('/recipes/', cursor=pages[-1]['previous'])
+        self.assertEqual(self.titles(previous), self.titles(pages[1]))
+
+    def test_page_size_is_capped(self):
+        request = RequestFactory().get('/recipes/', {'page_size': 10000})
+        self.assertEqual(get_page_size(request), MAX_PAGE_SIZE)
+
+    def test_html_pages_render_first_page_and_nav(self):
+        for url in ('/recipes/', '/community/'):
+            response = self.client.get(url, {'page_size': 2})
+            self.assertEqual(len(response.context['recipes']), 2)
+            self.assertContains(response, 'load-more')
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get('/recipes/', {'cursor': 'not-a-cursor'}).status_code, 404)
+
+    def test_favorites_paginate_on_saved_at(self):
+        user = User.objects.create_user('fan', password='Pass123!')
+        for recipe in self.recipes:
+            Favorite.objects.create(user=user, recipe=recipe)
+        self.client.login(username='fan', password='Pass123!')
+        data = self.page('/favorites/')
+        self.assertEqual(len(self.titles(data)), 2)
+        self.assertIsNotNone(data['next'])
+
+
+class ViewCounterTests(TestCase):
+    """Tests for the write-behind recipe view counter"""
+
+    def setUp(self):
+        view_counter.clear()
+        self.recipe = Recipe.objects.create(title='Chapati')
+
+    def tearDown(self):
+        view_counter.clear()
+
+    def test_detail_page_does_not_write_view_count(self):
+        self.client.get(f'/recipe/{self.recipe.id}/')
+        response = self.client.get(f'/recipe/{self.recipe.id}/')
+        self.assertEqual(response.context['recipe'].views_count, 2)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.views_count, 0)
+
+        self.assertEqual(view_counter.flush(), 2)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.views_count, 2)
+
+    def test_flushes_once_threshold_is_reached(self):
+        other = Recipe.objects.create(title='Ugali')
+        buffer = ViewCounterBuffer(interval=3600, threshold=3)
+        buffer.increment(self.recipe.id)
+        buffer.increment(other.id)
+        self.assertFalse(buffer.due())
+        buffer.increment(self.recipe.id)
+        self.assertTrue(buffer.due())
+
+        # One UPDATE per distinct pending count, wrapped in a savepoint
+        with self.assertNumQueries(4):
+            buffer.flush()
+        self.assertEqual(list(Recipe.objects.order_by('pk').values_list('views_count', flat=True)), [2, 1])
+
+    def test_age_counts_from_the_first_pending_view(self):
+        buffer = ViewCounterBuffer(interval=5, threshold=100)
+        with mock.patch('ingredient.counters.time.monotonic') as monotonic:
+            # Quiet for a minute since the buffer was created
+            monotonic.return_value = buffer._since + 60
+            buffer.increment(self.recipe.id)
+            self.assertFalse(buffer.due())
+            monotonic.return_value += 5
+            self.assertTrue(buffer.due())
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=3600)
+class RecipeDetailQueryTests(TestCase):
+    """Tests for the fixed query budget of the recipe detail page"""
+
+    def setUp(self):
+        view_counter.clear()
+        self.user = User.objects.create_user('cook', password='Pass123!')
+        self.recipe = Recipe.objects.create(title='Beans & Lentils Stew', created_by=self.user)
+        for i in range(3):
+            RecipeIngredient.objects.create(recipe=self.recipe, amount=1, unit='cup',
+                                            ingredient=Ingredient.objects.create(name=f'Ingredient {i}'))
+            RecipeStep.objects.create(recipe=self.recipe, order=i, instruction=f'Step {i}')
+            commenter = User.objects.create_user(f'guest{i}')
+            Review.objects.create(recipe=self.recipe, user=commenter, title='Tasty', text='Yes')
+            Comment.objects.create(recipe=self.recipe, user=commenter, text='Nice')
+            Like.objects.create(recipe=self.recipe, user=commenter)
+        # Every request shares the price matrix; building a cold one costs one more query
+        invalidate_price_matrix()
+        get_price_matrix()
+
+    def tearDown(self):
+        view_counter.clear()
+
+    def test_anonymous_detail_page_uses_five_queries(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(f'/recipe/{self.recipe.id}/')
+        self.assertEqual(response.context['likes_count'], 3)
+        self.assertContains(response, 'Ingredient 2')
+
+    def test_user_flags_do_not_add_queries(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Rating.objects.create(user=self.user, recipe=self.recipe, score=4)
+        self.client.login(username='cook', password='Pass123!')
+        # Two extra queries load the session and the user
+        with self.assertNumQueries(7):
+            response = self.client.get(f'/recipe/{self.recipe.id}/')
+        self.assertTrue(response.context['is_favorited'])
+        self.assertFalse(response.context['is_liked'])
+        self.assertEqual(response.context['user_rating'], 4)
+
+
+class RequestTimingMiddlewareTests(TestCase):
+    """Tests for the Server-Timing instrumentation middleware"""
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+    def test_reports_query_count_and_timings(self):
+        Recipe.objects.create(title='Pilau')
+        with self.assertLogs('ingredient.timing', 'INFO') as logs:
+            response = self.client.get('/recipes/')
+        self.assertEqual(json.loads(logs.records[0].getMessage())['queries'], 1)
+        # Only staff (or DEBUG) see the timings
+        self.assertNotIn('Server-Timing', response)
+
+        User.objects.create_user('admin', password='Pass123!', is_staff=True)
+        self.client.login(username='admin', password='Pass123!')
+        header = self.client.get('/recipes/')['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'view;dur=', 'total;dur='):
+            self.assertIn(metric, header)
+        self.assertIn('queries"', header)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_untouched(self):
+        self.assertNotIn('Server-Timing', self.client.get('/recipes/'))
+
+
+@override_settings(N_PLUS_ONE_MODE='raise', N_PLUS_ONE_THRESHOLD=3, VIEW_COUNT_FLUSH_INTERVAL=3600)
+class NPlusOneTests(TestCase):
+    """Tests for the N+1 query detector and the pages it guards"""
+
+    def setUp(self):
+        view_counter.clear()
+        self.user = User.objects.create_user('cook', password='Pass123!')
+        for i in range(6):
+            author = User.objects.create_user(f'author{i}', first_name='Author')
+            recipe = Recipe.objects.create(title=f'Recipe {i}', created_by=author)
+            Rating.objects.create(recipe=recipe, user=author, score=4)
+            Review.objects.create(recipe=recipe, user=author, title='Good', text='Good')
+            Comment.objects.create(recipe=recipe, user=author, text='Nice')
+            Favorite.objects.create(recipe=recipe, user=self.user)
+            RecipeIngredient.objects.create(recipe=recipe, amount=1, unit='g',
+                                            ingredient=Ingredient.objects.create(name=f'Ingredient {i}'))
+        self.recipe = recipe
+
+    def tearDown(self):
+        view_counter.clear()
+
+    def test_detector_attributes_repeated_queries_to_call_site(self):
+        with record_query_patterns() as recorder:
+            for recipe in Recipe.objects.order_by('pk'):
+                recipe.created_by.username
+        [(sql, site, count)] = recorder.repeated(3)
+        self.assertEqual(count, 6)
+        self.assertTrue(site.startswith('ingredient/tests.py:'), site)
+        self.assertIn('FROM "auth_user"', sql)
+
+    def test_detector_attributes_template_lookups(self):
+        with record_query_patterns() as recorder:
+            Template('{% for r in recipes %}{{ r.created_by.username }}{% endfor %}').render(
+                Context({'recipes': Recipe.objects.all()}))
+        self.assertEqual(recorder.repeated(3)[0][2], 6)
+
+    def test_list_and_detail_pages_have_no_repeated_queries(self):
+        self.client.login(username='cook', password='Pass123!')
+        for url in ('/', '/recipes/', '/community/', '/favorites/', '/my-recipes/',
+                    f'/recipe/{self.recipe.id}/'):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+
+class SyntheticDatasetTests(TestCase):
+    """Tests for seed_recipes --recipes"""
+
+    def test_generates_consistent_data_for_every_model(self):
+        call_command('seed_recipes', recipes=40, users=15, ratings_per_recipe=3, seed=7,
+                     ingredients=60, batch_size=16, stdout=StringIO())
+        self.assertEqual(Recipe.objects.count(), 40)
+        self.assertEqual(User.objects.count(), 15)
+        self.assertEqual(Ingredient.objects.count(), 60)
+        self.assertEqual(recipeItem.objects.count(), 4)
+        for model in (RecipeIngredient, RecipeStep, Rating, IngredientPrice, ShoppingListItem):
+            self.assertTrue(model.objects.exists(), model.__name__)
+
+        # Aggregates written by the generator match the Rating table
+        stored = list(Recipe.objects.order_by('pk').values_list('rating_count', 'rating_sum'))
+        Recipe.rebuild_rating_aggregates()
+        self.assertEqual(list(Recipe.objects.order_by('pk').values_list('rating_count', 'rating_sum')), stored)
+
+    def test_same_seed_produces_same_data(self):
+        def titles(seed):
+            call_command('seed_recipes', recipes=10, users=5, seed=seed, stdout=StringIO())
+            return list(Recipe.objects.order_by('pk').values_list('title', 'prep_time'))[-10:]
+
+        first = titles(1)
+        Recipe.objects.all().delete()
+        User.objects.all().delete()
+        self.assertEqual(titles(1), first)
+        self.assertNotEqual(titles(2), first)
+
+    def test_reseeding_reuses_the_legacy_catalog(self):
+        DatasetGenerator(recipes=10, users=5, seed=1, legacy_recipes=0).run()
+        self.assertFalse(ingredientItem.objects.exists())
+        DatasetGenerator(recipes=10, users=5, seed=2).run()
+        names = list(ingredientItem.objects.values_list('name', flat=True))
+        DatasetGenerator(recipes=10, users=5, seed=3).run()
+        self.assertEqual(sorted(ingredientItem.objects.values_list('name', flat=True)), sorted(names))
+        self.assertEqual(len(set(names)), len(names))
+        self.assertEqual(recipeItem.objects.count(), 2)
+
+
+class BenchmarkTests(TestCase):
+    """Tests for the per-view benchmark harness"""
+
+    def test_every_route_has_a_scenario(self):
+        self.assertEqual(sorted(scenario.route for scenario in SCENARIOS), sorted(project_routes()))
+
+    def test_runner_measures_every_view(self):
+        DatasetGenerator(recipes=10, users=5, seed=3).run()
+        results = BenchmarkRunner(iterations=2, warmup=0).run()
+
+        self.assertEqual(len(results), len(SCENARIOS))
+        for name, view in results.items():
+            self.assertLess(view['status'], 400, name)
+            self.assertLessEqual(view['p50_ms'], view['p95_ms'])
+            self.assertGreaterEqual(view['peak_memory_kib'], 0)
+        self.assertGreater(results['GET /recipe/<int:recipe_id>/']['queries'], 0)
+
+    def test_compare_reports_slower_views_and_extra_queries(self):
+        def run(p95, queries):
+            return {'migrate_ms': 500, 'scales': {'1000': {'generate_ms': 900, 'views': {
+                'GET /recipes/': {'p95_ms': p95, 'queries': queries}}}}}
+
+        baseline = run(10.0, 3)
+        self.assertEqual(compare(run(11.0, 3), baseline), [])
+        self.assertEqual(compare(run(0.9, 3), run(0.1, 3)), [])
+        regressions = compare(run(20.0, 4), baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn('p95 10.0ms -> 20.0ms', regressions[0])
+        self.assertIn('3 -> 4 queries', regressions[1])
+
+
+class RecipeSearchTests(TestCase):
+    """Tests for FTS5 recipe search"""
+
+    def setUp(self):
+        self.pilau = Recipe.objects.create(title='Beef Pilau', description='Spiced rice')
+        self.stew = Recipe.objects.create(title='Bean Stew', description='Hearty and filling')
+        self.fish = Recipe.objects.create(title='Coconut Fish', description='Coastal curry')
+        cumin = Ingredient.objects.create(name='Cumin', category='spice')
+        RecipeIngredient.objects.create(recipe=self.stew, ingredient=cumin, amount=1, unit='tsp')
+        RecipeStep.objects.create(recipe=self.fish, order=1, instruction='Toast the pilau masala first')
+
+    def search(self, q, **params):
+        return self.client.get('/recipes/search/', {'q': q, **params})
+
+    def found(self, q):
+        return [recipe.title for recipe in self.search(q).context['recipes']]
+
+    def test_matches_titles_ingredients_and_steps_ranked_by_title(self):
+        self.assertEqual(self.found('pilau'), ['Beef Pilau', 'Coconut Fish'])
+        self.assertEqual(self.found('cumin'), ['Bean Stew'])
+        self.assertEqual(self.found('coa'), ['Coconut Fish'])
+        self.assertEqual(self.found('spiced rice'), ['Beef Pilau'])
+
+    def test_index_follows_edits(self):
+        RecipeStep.objects.filter(recipe=self.fish).delete()
+        self.assertEqual(self.found('masala'), [])
+
+        self.stew.title = 'Githeri'
+        self.stew.save()
+        self.assertEqual(self.found('githeri'), ['Githeri'])
+        ingredient = Ingredient.objects.get()
+        ingredient.name = 'Jeera'
+        ingredient.save()
+        self.assertEqual(self.found('jeera'), ['Githeri'])
+
+        self.pilau.is_published = False
+        self.pilau.save()
+        self.assertEqual(self.found('beef'), [])
+        self.fish.delete()
+        self.assertEqual(rebuild_search_index(), 1)
+
+    def test_user_input_cannot_break_the_query(self):
+        self.assertIsNone(build_match_query('  -*"( '))
+        self.assertEqual(build_match_query('NEAR(beef OR "rice'), '"near" "beef" "or" "rice"*')
+        self.assertEqual(self.search('beef" OR (').status_code, 200)
+        self.assertEqual(self.found(''), [])
+
+    def test_paginates_with_cursors(self):
+        for i in range(5):
+            Recipe.objects.create(title=f'Pilau {i}')
+        data = json.loads(self.search('pilau', format='json', page_size=3).content)
+        first = data['html']
+        data = json.loads(self.search('pilau', format='json', page_size=3, cursor=data['next']).content)
+        self.assertIsNotNone(data['previous'])
+        data = json.loads(self.search('pilau', format='json', page_size=3, cursor=data['next']).content)
+        self.assertIsNone(data['next'])
+        self.assertIn('Coconut Fish', data['html'])
+        self.assertNotIn('Coconut Fish', first)
+        self.assertEqual(self.search('pilau', cursor='bogus').status_code, 404)
+
+
+class AutocompleteTests(TestCase):
+    """Tests for the ingredient autocomplete API"""
+
+    def setUp(self):
+        invalidate_completer()
+        pepper = Ingredient.objects.create(name='Black Pepper', category='spice')
+        Ingredient.objects.create(name='Peas', category='vegetable')
+        tomato = Ingredient.objects.create(name='Tomatoes', category='vegetable')
+        for i in range(3):
+            recipe = Recipe.objects.create(title=f'Recipe {i}')
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=pepper, amount=1, unit='tsp')
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=tomato, amount=1, unit='kg')
+        self.tomato = ingredientItem.objects.create(name='tomatoes', property='', img_url='')
+        legacy = recipeItem.objects.create(name='Salad', ingredients='', directions='', img_url='')
+        legacy.list_ingredient.add(self.tomato)
+
+    def complete(self, q, **params):
+        return json.loads(self.client.get('/api/ingredients/autocomplete/', {'q': q, **params}).content)
+
+    def test_ranks_word_prefix_matches_by_recipe_usage(self):
+        self.assertEqual(self.complete('pe'), [{'name': 'Black Pepper', 'recipes': 3},
+                                               {'name': 'Peas', 'recipes': 0}])
+        self.assertEqual(self.complete('PE', limit=1), [{'name': 'Black Pepper', 'recipes': 3}])
+        # Both catalogs contribute to the same name
+        self.assertEqual(self.complete('tom'), [{'name': 'Tomatoes', 'recipes': 2}])
+        self.assertEqual(self.complete('x'), [])
+        self.assertEqual(self.complete(''), [])
+
+    def test_legacy_source_suggests_names_the_match_api_knows(self):
+        self.assertEqual(self.complete('tom', source='legacy'), [{'name': 'tomatoes', 'recipes': 1}])
+        self.assertEqual(self.complete('pe', source='legacy'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredientItem.objects.create(name='peas', property='', img_url='')
+        self.assertEqual(self.complete('pe', source='legacy'), [{'name': 'peas', 'recipes': 0}])
+
+    def test_lookups_do_not_query_and_new_ingredients_are_added_in_place(self):
+        completer = get_completer()
+        with self.assertNumQueries(0):
+            completer.complete('b')
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Basil', category='spice')
+        self.assertIs(get_completer(), completer)
+        self.assertEqual([m['name'] for m in self.complete('b')], ['Black Pepper', 'Basil'])
+
+    def test_legacy_ingredient_id_lookup(self):
+        response = self.client.get('/api/ingredient_id/tomatoes')
+        self.assertEqual(json.loads(response.content), [{'ingredientId': self.tomato.pk}])
+        response = self.client.get('/api/ingredient_id/nothing')
+        self.assertEqual(json.loads(response.content), [{'Error': 'No id with that name'}])
+        # Added without this worker's completer hearing about it
+        get_completer()
+        [beans] = ingredientItem.objects.bulk_create([ingredientItem(name='beans', property='', img_url='')])
+        response = self.client.get('/api/ingredient_id/beans')
+        self.assertEqual(json.loads(response.content), [{'ingredientId': beans.pk}])
+
+
+class PantryMatchTests(TestCase):
+    """Tests for the pantry coverage API"""
+
+    def setUp(self):
+        invalidate_pantry_index()
+        self.ingredients = {name: Ingredient.objects.create(name=name, category='other')
+                            for name in ('Rice', 'Onions', 'Tomatoes', 'Beef', 'Salt')}
+
+        def recipe(title, *names, published=True):
+            recipe = Recipe.objects.create(title=title, is_published=published)
+            for name in names:
+                RecipeIngredient.objects.create(recipe=recipe, ingredient=self.ingredients[name],
+                                                amount=1, unit='g')
+            return recipe
+
+        self.pilau = recipe('Pilau', 'Rice', 'Onions', 'Beef', 'Salt')
+        self.kachumbari = recipe('Kachumbari', 'Onions', 'Tomatoes')
+        self.plain_rice = recipe('Plain Rice', 'Rice', 'Salt')
+        self.stew = recipe('Beef Stew', 'Beef', 'Tomatoes', 'Onions')
+        recipe('Draft', 'Rice', published=False)
+
+    def match(self, ingredients, **params):
+        response = self.client.get('/api/pantry/match/', {'ingredients': ingredients, **params})
+        return json.loads(response.content)
+
+    def test_ranks_by_coverage_then_matches(self):
+        data = self.match('rice, salt, onion, beef, paprika')
+        self.assertEqual([(r['title'], r['have'], r['needed']) for r in data['results']], [
+            ('Pilau', 4, 4), ('Plain Rice', 2, 2), ('Beef Stew', 2, 3), ('Kachumbari', 1, 2),
+        ])
+        self.assertEqual(data['results'][2]['missing'], ['Tomatoes'])
+        self.assertEqual(data['results'][2]['coverage'], 0.667)
+        self.assertEqual(data['results'][0]['url'], f'/recipe/{self.pilau.pk}/')
+        self.assertEqual(data['total'], 4)
+        self.assertEqual(data['unknown'], ['paprika'])
+
+        self.assertEqual(len(self.match('rice,salt,onions,beef', limit=2)['results']), 2)
+        self.assertEqual(self.match(''), {'results': [], 'total': 0, 'unknown': []})
+
+    def test_bit_sliced_counts_match_a_direct_count(self):
+        index = PantryIndex.build()
+        pantry = [ingredient.pk for ingredient in self.ingredients.values()]
+        slices = index.match_counts(pantry)
+        for position, recipe_id in enumerate(index.recipe_ids):
+            counted = sum(1 << i for i, bits in enumerate(slices) if bits >> position & 1)
+            expected = RecipeIngredient.objects.filter(recipe_id=recipe_id).count()
+            self.assertEqual(counted, expected)
+
+    def test_scoring_uses_two_queries(self):
+        self.match('rice')
+        with self.assertNumQueries(2):
+            self.match('rice,beef')
+
+
+class ShoppingListMergeTests(TestCase):
+    """Tests for adding recipes to the shopping list"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='Pass123!')
+        self.client.login(username='cook', password='Pass123!')
+        rice = Ingredient.objects.create(name='Rice', category='grain')
+        onions = Ingredient.objects.create(name='Onions', category='vegetable')
+        self.pilau = Recipe.objects.create(title='Pilau')
+        RecipeIngredient.objects.create(recipe=self.pilau, ingredient=rice, amount=500, unit='g')
+        RecipeIngredient.objects.create(recipe=self.pilau, ingredient=onions, amount=2, unit='piece')
+        self.biryani = Recipe.objects.create(title='Biryani')
+        RecipeIngredient.objects.create(recipe=self.biryani, ingredient=rice, amount=250, unit='g')
+        RecipeIngredient.objects.create(recipe=self.biryani, ingredient=onions, amount=1, unit='kg')
+
+    def items(self):
+        return sorted((item.ingredient_name, item.unit, item.amount, item.is_purchased)
+                      for item in ShoppingListItem.objects.all())
+
+    def test_adding_a_recipe_twice_merges_quantities(self):
+        self.client.get(f'/recipe/{self.pilau.pk}/add-to-list/')
+        self.client.get(f'/recipe/{self.pilau.pk}/add-to-list/')
+        self.assertEqual(self.items(), [('Onions', 'piece', 4, False), ('Rice', 'g', 1000, False)])
+
+    def test_adds_several_recipes_in_one_call(self):
+        shopping_list = ShoppingList.objects.create(user=self.user)
+        ShoppingListItem.objects.create(shopping_list=shopping_list, ingredient_name='Rice',
+                                        amount=100, unit='g', is_purchased=True)
+        # Session, user, recipes, list, recipe ingredients, open items, insert (+ savepoint)
+        with self.assertNumQueries(9):
+            response = self.client.post('/shopping-list/add-recipes/',
+                                        {'recipe_ids': f'{self.pilau.pk},{self.biryani.pk}'})
+        self.assertRedirects(response, '/shopping-list/', fetch_redirect_response=False)
+        # Purchased items are left alone; different units stay separate lines
+        self.assertEqual(self.items(), [('Onions', 'kg', 1, False), ('Onions', 'piece', 2, False),
+                                        ('Rice', 'g', 100, True), ('Rice', 'g', 750, False)])
+
+    def test_requires_a_known_recipe(self):
+        self.client.post('/shopping-list/add-recipes/', {'recipe_ids': 'x,999'})
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_merges_compatible_units(self):
+        shopping_list = ShoppingList.objects.create(user=self.user)
+        ShoppingListItem.objects.create(shopping_list=shopping_list, ingredient_name='Rice', amount=1, unit='Kg')
+        shopping_list.add_recipes([self.pilau.pk, self.biryani.pk])
+        self.assertEqual(self.items(), [('Onions', 'kg', 1, False), ('Onions', 'piece', 2, False),
+                                        ('Rice', 'kg', Decimal('1.75'), False)])
+
+
+class UnitConversionTests(TestCase):
+    """Tests for unit conversion and recipe scaling"""
+
+    def test_converts_within_a_base_and_accepts_aliases(self):
+        self.assertEqual(convert(1500, 'grams', 'kg'), Decimal('1.5'))
+        self.assertEqual(convert(2, 'Tbsp.', 'tsp').quantize(Decimal('0.01')), Decimal('6.00'))
+        with self.assertRaises(UnitConversionError):
+            convert(1, 'cup', 'piece')
+
+    def test_mass_and_volume_need_a_density(self):
+        self.assertEqual(convert(1, 'l', 'kg', 'Milk'), Decimal('1.03'))
+        rows = [(1, 'cup', 'Saffron'), (500, 'g', 'Saffron'), (2, 'bunch', 'Saffron')]
+        self.assertEqual(convert_many(rows, 'kg'), [None, Decimal('0.5'), None])
+
+    def test_scaling_keeps_units_readable(self):
+        self.assertEqual(scale_many([(600, 'g'), (1, 'cup'), (Decimal('0.25'), 'kg')], 2),
+                         [(Decimal('1.2'), 'kg'), (2, 'cup'), (500, 'g')])
+
+    def test_recipe_page_scales_to_requested_servings(self):
+        recipe = Recipe.objects.create(title='Chapati', servings=4)
+        flour = Ingredient.objects.create(name='Wheat flour', category='grain')
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=flour, amount=500, unit='g')
+        response = self.client.get(f'/recipe/{recipe.pk}/?servings=12')
+        self.assertContains(response, '1.5 kg')
+        response = self.client.get(f'/recipe/{recipe.pk}/?servings=abc')
+        self.assertContains(response, '500 g')
+
+
+class CostEstimateTests(TestCase):
+    """Tests for recipe and shopping list cost estimates"""
+
+    def setUp(self):
+        invalidate_price_matrix()
+        self.rice = Ingredient.objects.create(name='Rice', category='grain')
+        onions = Ingredient.objects.create(name='Onions', category='vegetable')
+        saffron = Ingredient.objects.create(name='Saffron', category='spice')
+        IngredientPrice.objects.create(ingredient=self.rice, unit='kg', price_kes=200, market='nairobi')
+        IngredientPrice.objects.create(ingredient=self.rice, unit='kg', price_kes=150, market='average')
+        IngredientPrice.objects.create(ingredient=onions, unit='piece', price_kes=20, market='average')
+        self.recipe = Recipe.objects.create(title='Pilau', servings=4)
+        RecipeIngredient.objects.create(recipe=self.recipe, ingredient=self.rice, amount=500, unit='g')
+        RecipeIngredient.objects.create(recipe=self.recipe, ingredient=onions, amount=2, unit='piece')
+        RecipeIngredient.objects.create(recipe=self.recipe, ingredient=saffron, amount=1, unit='tsp')
+
+    def test_prices_a_scaled_recipe(self):
+        data = self.client.get(f'/api/recipes/{self.recipe.pk}/cost/?servings=8&market=nairobi').json()
+        # Onions have no Nairobi price, so the Kenya average is used
+        self.assertEqual(data['total'], '280.00')
+        self.assertEqual(data['per_serving'], '35.00')
+        self.assertEqual(data['unpriced'], ['Saffron'])
+        self.assertEqual(data['markets']['average'], '230.00')
+        self.assertEqual(data['markets']['mombasa'], '230.00')
+        # Amounts as the detail page shows them, for rescaling it in place
+        self.assertEqual([(line['scaled_amount'], line['scaled_unit']) for line in data['lines']],
+                         [('1', 'kg'), ('4', 'piece'), ('2', 'tsp')])
+
+    def test_prices_come_from_the_cached_matrix(self):
+        get_price_matrix()
+        # Recipe and its ingredients only
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/recipes/{self.recipe.pk}/cost/')
+
+    def test_price_changes_invalidate_the_matrix(self):
+        self.assertEqual(get_price_matrix().unit_cost(self.rice.pk, 'g', 'nairobi'), Decimal('0.2'))
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientPrice.objects.filter(market='nairobi').get().delete()
+        self.assertEqual(get_price_matrix().unit_cost(self.rice.pk, 'g', 'nairobi'), Decimal('0.15'))
+
+    def test_falls_back_to_the_average_when_no_market_price_converts(self):
+        mug = Ingredient.objects.create(name='Mug', category='other')
+        IngredientPrice.objects.create(ingredient=mug, unit='kg', price_kes=500, market='nairobi')
+        IngredientPrice.objects.create(ingredient=mug, unit='piece', price_kes=80, market='average')
+        matrix = get_price_matrix()
+        self.assertEqual(matrix.unit_cost(mug.pk, 'piece', 'nairobi'), Decimal(80))
+        self.assertEqual(matrix.unit_cost(mug.pk, 'g', 'nairobi'), Decimal('0.5'))
+
+    def test_prices_the_shopping_list_by_name(self):
+        user = User.objects.create_user('cook', password='Pass123!')
+        self.client.login(username='cook', password='Pass123!')
+        shopping_list = ShoppingList.objects.create(user=user)
+        ShoppingListItem.objects.create(shopping_list=shopping_list, ingredient_name='rice', amount=2, unit='kg')
+        ShoppingListItem.objects.create(shopping_list=shopping_list, ingredient_name='Onions', amount=3,
+                                        unit='piece', is_purchased=True)
+        data = self.client.get('/api/shopping-list/cost/?market=nairobi').json()
+        self.assertEqual((data['total'], data['unpriced']), ('400.00', []))
+        response = self.client.get('/shopping-list/?market=nairobi')
+        self.assertContains(response, 'KES 400.00')
+
+
+class RecipeCardCacheTests(TestCase):
+    """Tests for the cached recipe card fragments"""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='Pass123!', first_name='Wanjiru')
+        self.recipe = Recipe.objects.create(title='Githeri', created_by=self.author)
+
+    def test_cards_are_reused_until_their_version_is_bumped(self):
+        self.assertIn('Githeri', render_cards([self.recipe], 'partials/cards/recipe.html'))
+        self.recipe.title = 'Mukimo'
+        self.assertIn('Githeri', render_cards([self.recipe], 'partials/cards/recipe.html'))
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_card_versions([self.recipe.pk])
+        self.assertIn('Mukimo', render_cards([self.recipe], 'partials/cards/recipe.html'))
+
+    def test_new_rating_refreshes_the_card(self):
+        self.assertContains(self.client.get('/recipes/'), 'Githeri')
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(recipe=self.recipe, user=self.author, score=4)
+        self.assertContains(self.client.get('/recipes/'), '<span class="text-muted small">(1)</span>')
+
+    def test_authors_do_not_see_their_own_byline(self):
+        cards = render_cards([self.recipe], 'partials/cards/community.html')
+        self.assertIn('By Wanjiru', cards)
+        cards = render_cards([self.recipe], 'partials/cards/community.html', self.author)
+        self.assertNotIn('By Wanjiru', cards)
+
+    def test_admin_publish_actions_refresh_cards_and_search(self):
+        User.objects.create_superuser('admin', password='Pass123!')
+        self.client.login(username='admin', password='Pass123!')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/ingredient/recipe/', {
+                'action': 'unpublish_recipes', '_selected_action': [self.recipe.pk]})
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.is_published)
+        self.assertNotContains(self.client.get('/recipes/search/?q=githeri'), 'Githeri</h5>')
+
+
+class RecipeStateTests(TestCase):
+    """Tests for the bulk favorite/like/rating state endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cook', password='Pass123!')
+        self.client.login(username='cook', password='Pass123!')
+        self.recipes = [Recipe.objects.create(title=f'Recipe {i}') for i in range(3)]
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        Like.objects.create(user=self.user, recipe=self.recipes[1])
+        Rating.objects.create(user=self.user, recipe=self.recipes[1], score=5)
+
+    def url(self):
+        return '/api/recipes/state/?ids=' + ','.join(str(r.pk) for r in self.recipes) + ',x'
+
+    def test_returns_state_for_every_recipe(self):
+        # Session and user, then one query per relation
+        with self.assertNumQueries(5):
+            data = self.client.get(self.url()).json()['recipes']
+        self.assertEqual(data[str(self.recipes[0].pk)], {'favorited': True, 'liked': False, 'rating': None})
+        self.assertEqual(data[str(self.recipes[1].pk)], {'favorited': False, 'liked': True, 'rating': 5})
+        with self.assertNumQueries(2):
+            self.client.get(self.url())
+
+    def test_toggling_updates_the_state(self):
+        self.client.get(self.url())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/recipe/{self.recipes[0].pk}/favorite/')
+            self.client.post(f'/recipe/{self.recipes[2].pk}/like/')
+        data = self.client.get(self.url()).json()['recipes']
+        self.assertFalse(data[str(self.recipes[0].pk)]['favorited'])
+        self.assertTrue(data[str(self.recipes[2].pk)]['liked'])
+
+    def test_list_pages_embed_the_state(self):
+        response = self.client.get('/recipes/')
+        self.assertContains(response, 'class="recipe-state"')
+        self.assertContains(response, f'"{self.recipes[0].pk}": {{"favorited": true')
+        self.client.logout()
+        self.assertNotContains(self.client.get('/recipes/'), 'class="recipe-state"')
+
+
+class EngagementCounterTests(TestCase):
+    """Tests for the denormalized like and favorite counters"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='Pass123!')
+        self.client.login(username='cook', password='Pass123!')
+        self.recipe = Recipe.objects.create(title='Mandazi')
+        Like.objects.create(user=User.objects.create_user('guest'), recipe=self.recipe)
+
+    def test_toggles_keep_the_counters_without_counting(self):
+        # Session, user, recipe, delete lookup, insert, counter update and reload (+ 4 savepoint)
+        with self.assertNumQueries(11):
+            data = self.client.post(f'/recipe/{self.recipe.pk}/like/').json()
+        self.assertEqual((data['is_liked'], data['likes_count']), (True, 2))
+        data = self.client.post(f'/recipe/{self.recipe.pk}/like/').json()
+        self.assertEqual((data['is_liked'], data['likes_count']), (False, 1))
+        data = self.client.post(f'/recipe/{self.recipe.pk}/favorite/').json()
+        self.assertEqual((data['is_favorited'], data['favorites_count']), (True, 1))
+
+    def test_counters_never_go_negative(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(likes_count=0)
+        Like.objects.all().delete()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.likes_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(likes_count=7, favorites_count=3)
+        out = StringIO()
+        call_command('reconcile_engagement_counts', '--dry-run', stdout=out)
+        self.assertIn('likes 7 -> 1, favorites 3 -> 0', out.getvalue())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.likes_count, 7)
+        call_command('reconcile_engagement_counts', stdout=StringIO())
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.likes_count, self.recipe.favorites_count), (1, 0))
+
+
+@override_settings(IMAGE_VARIANT_WORKERS=0)
+class ImageVariantTests(TestCase):
+    """Tests for the resized recipe image variants"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        media_settings = self.settings(MEDIA_ROOT=media)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def upload(self, size=(800, 600), mode='RGB'):
+        buffer = io.BytesIO()
+        Image.new(mode, size, 'orange').save(buffer, 'PNG')
+        return SimpleUploadedFile('stew.png', buffer.getvalue(), content_type='image/png')
+
+    def render(self, recipe):
+        template = Template("{% load recipe_images %}{% recipe_image recipe 'card-img-top' %}")
+        return template.render(Context({'recipe': recipe}))
+
+    def test_upload_builds_hashed_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(title='Stew', image=self.upload())
+        recipe.refresh_from_db()
+        variants = recipe.image_variants
+        self.assertEqual((variants['widths'], variants['width'], variants['height']), ([320, 640], 800, 600))
+        self.assertTrue(default_storage.exists(f"recipe_images/variants/{variants['hash']}-320.webp"))
+        html = self.render(recipe)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f"{variants['hash']}-640.jpg 640w", html)
+        self.assertIn('loading="lazy"', html)
+
+    def test_variants_never_upscale_and_flatten_transparency(self):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (200, 100), (0, 0, 0, 0)).save(buffer, 'PNG')
+        digest, size, widths, files = render_variants(buffer.getvalue())
+        self.assertEqual((size, widths), ((200, 100), [200]))
+        self.assertEqual([name.rsplit('.', 1)[1] for name, _ in files], ['webp', 'jpg'])
+        self.assertEqual(Image.open(io.BytesIO(files[1][1])).getpixel((0, 0)), (255, 255, 255))
+
+    def test_original_is_served_until_variants_exist(self):
+        recipe = Recipe.objects.create(title='Chapati', image='chapati.png')
+        html = self.render(recipe)
+        self.assertIn('/static/images/chapati.png', html)
+        self.assertNotIn('srcset', html)
+
+    def test_backfill_command_builds_static_images(self):
+        recipe = Recipe.objects.create(title='Chapati', image='chapati.png')
+        call_command('build_image_variants', '--workers', '0', stdout=StringIO())
+        recipe.refresh_from_db()
+        self.assertEqual((recipe.image_variants['source'], recipe.image_variants['widths']), ('chapati.png', [225]))
+        self.assertIn('srcset', self.render(recipe))
+
+
+class ConditionalGetTests(TestCase):
+    """Tests for ETag revalidation of recipe pages and the match API"""
+
+    def setUp(self):
+        cache.clear()
+        view_counter.clear()
+        self.addCleanup(view_counter.clear)
+        self.user = User.objects.create_user('cook', password='Pass123!')
+        self.recipe = Recipe.objects.create(title='Pilau', is_published=True)
+
+    def revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        return etag, self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_are_not_rendered_again(self):
+        for url in (f'/recipe/{self.recipe.pk}/', '/community/', '/recipes/'):
+            etag, response = self.revalidate(url)
+            self.assertTrue(etag.startswith('W/"'))
+            self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(0):
+            self.client.get('/recipes/', HTTP_IF_NONE_MATCH=etag)
+
+    def test_not_modified_detail_still_counts_the_view(self):
+        self.revalidate(f'/recipe/{self.recipe.pk}/')
+        self.assertEqual(view_counter.pending(self.recipe.pk), 2)
+
+    def test_changes_give_new_etags(self):
+        url = f'/recipe/{self.recipe.pk}/'
+        etag, _ = self.revalidate(url)
+        list_etag, _ = self.revalidate('/recipes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(user=self.user, recipe=self.recipe, text='Lovely')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get('/recipes/', HTTP_IF_NONE_MATCH=list_etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(user=self.user, recipe=self.recipe, score=4)
+        self.assertEqual(self.client.get('/recipes/', HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+    def test_users_get_their_own_etags(self):
+        url = f'/recipe/{self.recipe.pk}/'
+        anonymous = self.client.get(url)['ETag']
+        self.client.login(username='cook', password='Pass123!')
+        etag, response = self.revalidate(url)
+        self.assertNotEqual(etag, anonymous)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('private', response['Cache-Control'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/recipe/{self.recipe.pk}/favorite/')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_logging_in_again_renders_a_fresh_csrf_token(self):
+        url = f'/recipe/{self.recipe.pk}/'
+        self.client.login(username='cook', password='Pass123!')
+        etag, response = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+        self.client.logout()
+        self.client.login(username='cook', password='Pass123!')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_match_api_answers_get(self):
+        invalidate_ingredient_index()
+        egg = ingredientItem.objects.create(name='egg', property='', img_url='')
+        omelette = recipeItem.objects.create(name='Omelette', ingredients='2 eggs', directions='Fry', img_url='')
+        omelette.list_ingredient.add(egg)
+        url = '/api/match_recipe/?listIngredient=egg'
+        self.assertEqual([r['name'] for r in json.loads(self.client.get(url).content)], ['Omelette'])
+        etag, response = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            omelette.directions = 'Beat#Fry'
+            omelette.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+# A plain TestCase: Django's would refuse the scratch databases' connections
+class SqliteBackendTests(unittest.TestCase):
+    """Tests for the tuned SQLite backend"""
+
+    def test_connections_use_wal_and_pragmas(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # The backend's own defaults; settings.py keeps the tracked dev database off WAL
+            database = {'ENGINE': 'ingredient.sqlite', 'NAME': f'{directory}/tuned.sqlite3',
+                        'OPTIONS': {'transaction_mode': 'IMMEDIATE'}}
+            wrapper = DatabaseWrapper(connections.configure_settings({'default': {}, 'tuned': database})['tuned'])
+            try:
+                with wrapper.cursor() as cursor:
+                    pragmas = {name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                               for name in ('journal_mode', 'synchronous', 'busy_timeout')}
+                self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+            finally:
+                wrapper.close()
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000})
+
+    def test_lock_errors_are_retried_with_backoff(self):
+        calls = []
+
+        def locked_twice():
+            calls.append(1)
+            if len(calls) < 3:
+                raise sqlite3.OperationalError('database is locked')
+            return 'ok'
+
+        with mock.patch('ingredient.sqlite.base.time.sleep') as sleep:
+            self.assertEqual(retry_locked(locked_twice, retries=5, delay=0.01), 'ok')
+            self.assertEqual(sleep.call_count, 2)
+            with self.assertRaises(sqlite3.OperationalError):
+                retry_locked(mock.Mock(side_effect=sqlite3.OperationalError('no such table')))
+            self.assertEqual(sleep.call_count, 2)
+
+    def test_stress_writers_are_never_locked_out(self):
+        result = stress(settings.DATABASES['default'], seconds=0.3, readers=2, writers=2)
+        self.assertGreater(result['reads'], 0)
+        self.assertGreater(result['writes'], 0)
+        self.assertEqual((result['read_errors'], result['write_errors']), (0, 0))
+
+
+@override_settings(DATABASE_REPLICA_ALIASES=['default'])
+class ReplicaRoutingTests(TestCase):
+    """Tests for sending read-only views to replicas (``default`` stands in for one)"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cook', password='Pass123!')
+        self.recipe = Recipe.objects.create(title='Pilau', is_published=True)
+
+    def reads(self, method, url):
+        routed = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            routed.append(db_for_read(router, model, **hints))
+            return routed[-1]
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', spy):
+            getattr(self.client, method)(url)
+        return routed
+
+    def test_read_only_views_read_from_a_replica(self):
+        self.client.login(username='cook', password='Pass123!')
+        self.assertIn('default', self.reads('get', '/recipes/'))
+        self.assertIn('default', self.reads('get', f'/recipe/{self.recipe.pk}/'))
+        self.assertNotIn('default', self.reads('get', '/my-recipes/'))
+
+    def test_browser_reads_from_the_primary_after_writing(self):
+        self.client.login(username='cook', password='Pass123!')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/recipe/{self.recipe.pk}/like/')
+        self.assertGreater(self.client.session[PRIMARY_UNTIL], time.time())
+        self.assertNotIn('default', self.reads('get', '/recipes/'))
+        # Reads alone never pin a browser to the primary
+        self.client.logout()
+        self.reads('get', '/recipes/')
+        self.assertNotIn(PRIMARY_UNTIL, self.client.session)
+        self.assertIn('default', self.reads('get', '/recipes/'))
+
+    def test_shared_caches_are_built_from_the_primary(self):
+        item = ingredientItem.objects.create(name='rice')
+        recipeItem.objects.create(name='Pilau').list_ingredient.add(item)
+        invalidate_ingredient_index()
+        routed = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            routed.append(model)
+            return db_for_read(router, model, **hints)
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', spy):
+            response = self.client.get('/api/match_recipe/', {'listIngredient': 'rice'})
+        self.assertEqual(json.loads(response.content)[0]['name'], 'Pilau')
+        self.assertNotIn(recipeItem, routed)
+        self.assertNotIn(recipeItem.list_ingredient.through, routed)
+
+    def test_user_state_is_loaded_from_the_primary(self):
+        self.client.login(username='cook', password='Pass123!')
+        routed = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            routed.append(model)
+            return db_for_read(router, model, **hints)
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', spy):
+            self.client.get('/recipes/')
+        self.assertIn(Recipe, routed)
+        self.assertTrue({Favorite, Like, Rating}.isdisjoint(routed))
+
+    def test_request_user_is_loaded_from_the_primary(self):
+        self.client.login(username='cook', password='Pass123!')
+        routed = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            routed.append((model, db_for_read(router, model, **hints)))
+            return routed[-1][1]
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', spy):
+            self.client.get('/')
+        self.assertIn((User, None), routed)
+        self.assertNotIn((User, 'default'), routed)
+
+
+class ReplicaSyncTests(TransactionTestCase):
+    """Tests for copying the primary into replica files (outside a transaction, as the command runs)"""
+
+    def test_sync_copies_the_primary_into_replica_files(self):
+        Recipe.objects.create(title='Pilau')
+        with tempfile.TemporaryDirectory() as directory:
+            name = f'{directory}/replica.sqlite3'
+            sync_replica(name)
+            with closing(sqlite3.connect(name)) as replica:
+                titles = [title for title, in replica.execute('SELECT title FROM ingredient_recipe')]
+        self.assertEqual(titles, ['Pilau'])
+
+
+class QueryPlanTests(TestCase):
+    """Tests for the hot-path indexes and the query plan checks"""
+
+    def plan(self, queryset):
+        with CaptureQueriesContext(connection) as captured:
+            list(queryset)
+        return explain(captured.captured_queries[0]['sql'])
+
+    def test_flags_full_scans_and_temp_btrees(self):
+        self.assertEqual(plan_issues('SCAN ingredient_recipe'), ['full scan of ingredient_recipe'])
+        self.assertEqual(plan_issues('USE TEMP B-TREE FOR ORDER BY'), ['temp b-tree (for order by)'])
+        self.assertEqual(plan_issues('SCAN ingredient_recipe USING INDEX recipe_published_created_idx'), [])
+        self.assertEqual(plan_issues('SCAN CONSTANT ROW'), [])
+
+    def test_list_pages_read_recipes_in_index_order(self):
+        user = User.objects.create_user('cook')
+        steps, issues = self.plan(Recipe.objects.filter(is_published=True).order_by('-created_at', '-pk')[:25])
+        self.assertEqual(issues, [])
+        self.assertIn('recipe_published_created_idx', ' '.join(steps))
+        _, issues = self.plan(Recipe.objects.filter(created_by=user).order_by('-created_at', '-pk')[:25])
+        self.assertEqual(issues, [])
+        _, issues = self.plan(Comment.objects.filter(recipe_id=1)[:20])
+        self.assertEqual(issues, [])
+        steps, _ = self.plan(User.objects.filter(email='cook@example.com'))
+        self.assertIn('auth_user_email_idx', ' '.join(steps))
+
+
+class SiteStatsTests(TestCase):
+    """Tests for the community page's cached site totals"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cook')
+        self.recipe = Recipe.objects.create(title='Pilau', is_published=True, created_by=self.user)
+        Rating.objects.create(recipe=self.recipe, user=self.user, score=5)
+
+    def counted(self):
+        return mock.patch('ingredient.stats.count_totals', wraps=stats.count_totals)
+
+    def test_totals_are_counted_once(self):
+        response = self.client.get('/community/')
+        self.assertEqual(response.context['stats'], {'recipes': 1, 'users': 1, 'ratings': 1, 'reviews': 0})
+        with self.counted() as count:
+            self.client.get('/community/')
+        count.assert_not_called()
+
+    def test_stale_totals_are_served_while_one_request_recounts(self):
+        self.client.get('/community/')
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user('baker')
+
+        # Another worker is already recounting: serve the stale totals, count nothing
+        cache.add(stats.LOCK_KEY, True)
+        with self.counted() as count:
+            self.assertEqual(self.client.get('/community/').context['stats']['users'], 1)
+        count.assert_not_called()
+
+        cache.delete(stats.LOCK_KEY)
+        with self.counted() as count:
+            self.assertEqual(self.client.get('/community/').context['stats']['users'], 1)
+        # Counted after the response was sent
+        count.assert_called_once()
+        self.assertEqual(self.client.get('/community/').context['stats']['users'], 2)
+
+    def test_stale_totals_are_recounted_at_once_outside_a_request(self):
+        stats.get_site_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user('baker')
+        self.assertEqual(stats.get_site_stats()['users'], 2)
+        self.assertIsNone(cache.get(stats.LOCK_KEY))
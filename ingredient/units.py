@@ -0,0 +1,204 @@
+"""Quantity conversion between recipe, shopping list and price units.
+
+Every known unit belongs to one of three bases: grams for mass, millilitres
+for volume and pieces for countable things. Units are matched
+case-insensitively, with common spellings ("grams", "litre", "tbsp.")
+accepted, because ShoppingListItem.unit and IngredientPrice.unit are free
+text. Units that are not recognised are kept as they are and only
+combine with the same unit.
+
+Mass and volume convert into each other only through an ingredient's
+density (grams per millilitre): DENSITIES, overridable with the
+INGREDIENT_DENSITIES setting. All arithmetic uses Decimal.
+
+The *_many functions take thousands of rows at once. Each distinct unit
+or ingredient is looked up once, and every row then costs one multiply.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+
+GRAM = 'g'
+MILLILITRE = 'ml'
+PIECE = 'piece'
+
+CENT = Decimal('0.01')
+
+# unit: (base, size in base units)
+UNITS = {
+    'g': (GRAM, Decimal('1')),
+    'kg': (GRAM, Decimal('1000')),
+    'ml': (MILLILITRE, Decimal('1')),
+    'l': (MILLILITRE, Decimal('1000')),
+    'tsp': (MILLILITRE, Decimal('4.92892')),
+    'tbsp': (MILLILITRE, Decimal('14.7868')),
+    'cup': (MILLILITRE, Decimal('236.588')),
+    'pinch': (MILLILITRE, Decimal('0.308')),
+    'dash': (MILLILITRE, Decimal('0.616')),
+    'piece': (PIECE, Decimal('1')),
+    'whole': (PIECE, Decimal('1')),
+    'dozen': (PIECE, Decimal('12')),
+}
+
+ALIASES = {
+    'gram': 'g', 'grams': 'g', 'gm': 'g', 'gms': 'g', 'gr': 'g',
+    'kilo': 'kg', 'kilos': 'kg', 'kgs': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'millilitre': 'ml', 'millilitres': 'ml', 'milliliter': 'ml', 'milliliters': 'ml',
+    'litre': 'l', 'litres': 'l', 'liter': 'l', 'liters': 'l', 'ltr': 'l',
+    'teaspoon': 'tsp', 'teaspoons': 'tsp', 'tablespoon': 'tbsp', 'tablespoons': 'tbsp',
+    'cups': 'cup', 'pinches': 'pinch', 'dashes': 'dash',
+    'pieces': 'piece', 'pcs': 'piece', 'pc': 'piece', 'each': 'piece', 'unit': 'piece', 'units': 'piece',
+}
+
+# Grams per millilitre
+DENSITIES = {
+    'water': Decimal('1.00'),
+    'milk': Decimal('1.03'),
+    'coconut milk': Decimal('0.97'),
+    'oil': Decimal('0.92'),
+    'butter': Decimal('0.96'),
+    'sugar': Decimal('0.85'),
+    'salt': Decimal('1.20'),
+    'wheat flour': Decimal('0.53'),
+    'chapati flour': Decimal('0.53'),
+    'ugali flour': Decimal('0.60'),
+    'pilau rice': Decimal('0.85'),
+    'rice': Decimal('0.85'),
+    'beans': Decimal('0.78'),
+    'lentils': Decimal('0.80'),
+    'green grams': Decimal('0.80'),
+    'honey': Decimal('1.42'),
+}
+
+
+class UnitConversionError(ValueError):
+    """Raised when two quantities cannot be expressed in the same unit"""
+
+
+def canonical_unit(unit):
+    """The canonical code for ``unit``, or the cleaned-up text if it is not known"""
+    key = unit.strip().lower().rstrip('.')
+    return ALIASES.get(key, key)
+
+
+def base_unit(unit):
+    """'g', 'ml' or 'piece' for known units, otherwise the canonical text itself"""
+    code = canonical_unit(unit)
+    return UNITS[code][0] if code in UNITS else code
+
+
+def density(ingredient):
+    """Grams per millilitre for an ingredient name, or None if unknown"""
+    if not ingredient:
+        return None
+    key = ' '.join(ingredient.lower().split())
+    overrides = getattr(settings, 'INGREDIENT_DENSITIES', {})
+    value = overrides.get(key, DENSITIES.get(key))
+    return Decimal(str(value)) if value is not None else None
+
+
+def quantize(amount):
+    """Round to the two decimal places used by every amount column"""
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _trim(amount):
+    """Drop trailing zeros without switching to exponent notation"""
+    return amount.quantize(Decimal(1)) if amount == amount.to_integral_value() else amount.normalize()
+
+
+def _factor(unit, target, ingredient=None):
+    """Multiplier taking an amount in ``unit`` to ``target``"""
+    source, target = canonical_unit(unit), canonical_unit(target)
+    if source == target:
+        return Decimal('1')
+    if source not in UNITS or target not in UNITS:
+        raise UnitConversionError(f'Cannot convert {unit!r} to {target!r}')
+    (source_base, source_size), (target_base, target_size) = UNITS[source], UNITS[target]
+    if source_base == target_base:
+        return source_size / target_size
+    if {source_base, target_base} == {GRAM, MILLILITRE}:
+        grams_per_ml = density(ingredient)
+        if grams_per_ml is None:
+            raise UnitConversionError(f'No density for {ingredient!r} to convert {unit!r} to {target!r}')
+        if source_base == MILLILITRE:
+            return source_size * grams_per_ml / target_size
+        return source_size / grams_per_ml / target_size
+    raise UnitConversionError(f'Cannot convert {unit!r} to {target!r}')
+
+
+def convert(amount, unit, target, ingredient=None):
+    """Express ``amount`` of ``unit`` in ``target`` (unrounded)"""
+    return Decimal(amount) * _factor(unit, target, ingredient)
+
+
+def convert_many(rows, target):
+    """Convert ``(amount, unit, ingredient)`` rows to ``target``.
+
+    Returns a list with the converted Decimal for each row, or None where the
+    row cannot be converted (for example a volume of an ingredient with no
+    known density).
+    """
+    factors = {}
+    converted = []
+    for amount, unit, ingredient in rows:
+        key = (unit, ingredient)
+        if key not in factors:
+            try:
+                factors[key] = _factor(unit, target, ingredient)
+            except UnitConversionError:
+                factors[key] = None
+        factor = factors[key]
+        converted.append(None if factor is None else Decimal(amount) * factor)
+    return converted
+
+
+def from_base(amount, unit):
+    """Express an amount of ``unit``'s base unit in ``unit`` itself"""
+    code = canonical_unit(unit)
+    return amount / UNITS[code][1] if code in UNITS else amount
+
+
+def to_base_many(rows):
+    """Convert ``(amount, unit)`` rows to ``(amount, base unit)`` pairs.
+
+    Unknown units are passed through unchanged, so summing by base unit
+    never mixes them with anything else.
+    """
+    sizes = {}
+    result = []
+    for amount, unit in rows:
+        entry = sizes.get(unit)
+        if entry is None:
+            code = canonical_unit(unit)
+            entry = sizes[unit] = UNITS.get(code, (code, Decimal('1')))
+        base, size = entry
+        result.append((Decimal(amount) * size, base))
+    return result
+
+
+def humanize(amount, unit):
+    """Switch grams and millilitres to kg and litres once there are 1000 or more"""
+    code = canonical_unit(unit)
+    if code == GRAM and amount >= 1000:
+        return amount / 1000, 'kg'
+    if code == MILLILITRE and amount >= 1000:
+        return amount / 1000, 'l'
+    if code in ('kg', 'l') and amount < 1:
+        return amount * 1000, 'g' if code == 'kg' else 'ml'
+    return amount, code
+
+
+def scale_many(rows, multiplier):
+    """Scale ``(amount, unit)`` rows by ``multiplier``, keeping units readable.
+
+    Kitchen units (cups, spoons, pieces) are kept; metric amounts switch
+    between g/kg and ml/l as they grow or shrink. Amounts are rounded to
+    two decimal places.
+    """
+    multiplier = Decimal(multiplier)
+    scaled = []
+    for amount, unit in rows:
+        amount, unit = humanize(Decimal(amount) * multiplier, unit)
+        scaled.append((_trim(quantize(amount)), unit))
+    return scaled
@@ -0,0 +1,73 @@
+"""The current user's favorite, like and rating state for many recipes at once.
+
+Each user's favorited recipe ids, liked recipe ids and ratings are cached
+as three entries, loaded with one query per relation the first time they
+are needed. Any list of cards can then be answered from memory, however
+many recipes it shows. Signals in signals.py drop a user's entry when one
+of their favorites, likes or ratings changes, and bump the user's state
+version that their page ETags are built from.
+
+The entries are always loaded from the primary, even inside replica views:
+they are the user's own writes, and are cached longer than a replica may
+lag behind.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .caching import bump_version
+from .conditional import user_state_version
+from .models import Favorite, Like, Rating
+
+STATE_TIMEOUT = 60 * 60
+MAX_RECIPES = 100
+
+FAVORITES = 'favorites'
+LIKES = 'likes'
+RATINGS = 'ratings'
+
+
+def _key(user_id, relation):
+    return f'nourish:user-state:{user_id}:{relation}'
+
+
+def _load(user_id, relation):
+    # No ordering: the results go into sets and dicts, and sorting them needs a temp B-tree
+    if relation == FAVORITES:
+        return set(Favorite.objects.using('default').filter(user_id=user_id).order_by().values_list('recipe_id', flat=True))
+    if relation == LIKES:
+        return set(Like.objects.using('default').filter(user_id=user_id).order_by().values_list('recipe_id', flat=True))
+    return dict(Rating.objects.using('default').filter(user_id=user_id).order_by().values_list('recipe_id', 'score'))
+
+
+def get_user_state(user):
+    """Return ``(favorite ids, liked ids, {recipe id: score})`` for a user"""
+    if not user.is_authenticated:
+        return set(), set(), {}
+    relations = (FAVORITES, LIKES, RATINGS)
+    keys = {_key(user.pk, relation): relation for relation in relations}
+    found = cache.get_many(keys)
+    state = {relation: found.get(key) for key, relation in keys.items()}
+    missing = {}
+    for key, relation in keys.items():
+        if state[relation] is None:
+            state[relation] = missing[key] = _load(user.pk, relation)
+    if missing:
+        cache.set_many(missing, STATE_TIMEOUT)
+    return state[FAVORITES], state[LIKES], state[RATINGS]
+
+
+def recipe_state(user, recipe_ids):
+    """``{recipe id: {'favorited', 'liked', 'rating'}}`` for the given recipes"""
+    favorites, likes, ratings = get_user_state(user)
+    return {
+        pk: {'favorited': pk in favorites, 'liked': pk in likes, 'rating': ratings.get(pk)}
+        for pk in recipe_ids
+    }
+
+
+def invalidate_user_state(user_id, relation):
+    """Drop one of a user's cached relations once the current transaction commits"""
+    def invalidate():
+        cache.delete(_key(user_id, relation))
+        bump_version(user_state_version(user_id))
+    transaction.on_commit(invalidate)
@@ -1,15 +1,30 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.http import HttpResponse, JsonResponse
-from .models import ingredientItem, recipeItem, Recipe, Favorite, Rating, Review, Comment, Like, ShoppingList
+from .models import ingredientItem, recipeItem, Recipe, RecipeIngredient, Favorite, Rating, Review, Comment, Like, ShoppingList
+from .autocomplete import DEFAULT_LIMIT, MAX_LIMIT, get_completer
+from .conditional import CATALOG_VERSION, conditional, make_etag, recipe_page_version
+from .costing import DEFAULT_MARKET, MARKET_NAMES, PRICE_VERSION, cost_recipe, cost_shopping_list
+from .counters import view_counter
+from .loaders import recipe_detail_queryset
+from .matching import INDEX_VERSION, PAYLOAD_VERSION, match_recipe_items, search_recipe_items
+from .pagination import paginate
+from .pantry import DEFAULT_LIMIT as PANTRY_LIMIT, MAX_LIMIT as MAX_PANTRY_LIMIT, match_pantry
+from .replicas import read_from_replica
+from .search import search_page
+from .stats import STATS_VERSION, get_site_stats
+from .units import scale_many
+from .user_state import MAX_RECIPES as MAX_STATE_RECIPES, recipe_state
 from .forms import SignupForm, LoginForm, UserProfileForm, ReviewForm, RatingForm, AddRecipeForm, RecipeIngredientForm, RecipeStepForm, CommentForm
 import json
 from django.views.decorators.csrf import csrf_exempt
+from django.middleware.csrf import get_token
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Avg, Count
-from django.db import models
+from django.db.models import Avg, Count, Prefetch
+from django.db import IntegrityError, models, transaction
 from decimal import Decimal
 
 #view for ingredient page
@@ -18,21 +33,11 @@ def ingredientView(request):
     return render(request, 'ingredient.html', {'all_ingredients': all_ingredients})
 
 #view for search recipe page
+@read_from_replica
 def searchView(request, ingredientId):
     all_recipes= recipeItem.objects.all()
     ingredientObject = ingredientItem.objects.get(id = ingredientId)
-    payload = [ingredientObject.name]
-    list_recipes = []
-    for i in range(0, len(all_recipes)):
-      names = []
-      ingredients = all_recipes[i].list_ingredient.all()
-      for j in range(0, len(ingredients)):
-        names.append(ingredients[j].name)
-      if set(payload).issubset(set(names)):
-        list_recipes.append({'name': all_recipes[i].name,
-        'ingredients': all_recipes[i].ingredients.split('#'),
-        'directions': all_recipes[i].directions.split('#'),
-        'img_url': all_recipes[i].img_url})
+    list_recipes = search_recipe_items(ingredientObject)
     return render(request, 'searchRecipe.html',
     {'ingredientObject': ingredientObject,
     'all_recipes': all_recipes,
@@ -41,34 +46,48 @@ def searchView(request, ingredientId):
 #get ingredient id
 def get_ingredientId(request, ingredientName):
   if request.method == 'GET':
-    try:
-        ingredientId = ingredientItem.objects.get(name = ingredientName).id
-        response = json.dumps([{'ingredientId': ingredientId}])
-    except:
-        response = json.dumps([{'Error': 'No id with that name'}])
+    ingredientId = get_completer().legacy_ids.get(ingredientName)
+    if ingredientId is None:
+      # Possibly created by another worker since this one built its completer
+      ingredientId = (ingredientItem.objects.filter(name=ingredientName).order_by('pk')
+                      .values_list('pk', flat=True).first())
+    if ingredientId is None:
+      response = json.dumps([{'Error': 'No id with that name'}])
+    else:
+      response = json.dumps([{'ingredientId': ingredientId}])
   return HttpResponse(response, content_type='text/json')
 
-#get match recipes by list of ingredients
+#autocomplete ingredient names, most used first
+def ingredient_autocomplete(request):
+  try:
+    limit = min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+  except ValueError:
+    limit = DEFAULT_LIMIT
+  # ?source=legacy: only ingredientItem names, spelled the way the match API expects
+  legacy = request.GET.get('source') == 'legacy'
+  matches = get_completer().complete(request.GET.get('q', ''), limit, legacy)
+  response = JsonResponse(matches, safe=False)
+  response['Cache-Control'] = 'public, max-age=60'
+  return response
+
+
+def _match_recipe_etag(request):
+  return make_etag([INDEX_VERSION, PAYLOAD_VERSION])
+
+
+#get match recipes by list of ingredients, POSTed as JSON or as ?listIngredient=a&listIngredient=b
 @csrf_exempt
+@conditional(_match_recipe_etag, private=False)
+@read_from_replica
 def get_match_recipe(request):
   if request.method == 'POST':
     payload = json.loads(request.body).get('listIngredient')
-    try:
-      all_recipes = recipeItem.objects.all()
-      response = []
-      for i in range(0, len(all_recipes)):
-        names = []
-        ingredients = all_recipes[i].list_ingredient.all()
-        for j in range(0, len(ingredients)):
-          names.append(ingredients[j].name)
-        if set(payload).issubset(set(names)):
-          response.append({'name': all_recipes[i].name,
-          'ingredients': all_recipes[i].ingredients.split('#'),
-          'directions': all_recipes[i].directions.split('#'),
-          'img_url': all_recipes[i].img_url})
-      response = json.dumps(response)
-    except:
-      response = json.dumps([{'Error': 'No id with that name'}])
+  else:
+    payload = request.GET.getlist('listIngredient')
+  try:
+    response = json.dumps(match_recipe_items(payload))
+  except:
+    response = json.dumps([{'Error': 'No id with that name'}])
   return HttpResponse(response, content_type='text/json')
 
 
@@ -148,89 +167,180 @@ def profile(request):
 
 # ============ RECIPE DETAIL & FAVORITES ============
 
+def _render_page(request, template, fragment, context):
+  """Render a paginated list, or just its cards as JSON for infinite scroll"""
+  if request.GET.get('format') == 'json':
+    page = context['page']
+    return JsonResponse({
+      'html': render_to_string(fragment, context, request=request),
+      'next': page.next_cursor,
+      'previous': page.previous_cursor,
+    })
+  return render(request, template, context)
+
+
+@read_from_replica
 def home(request):
   """Home page - list all recipes"""
   recipes = Recipe.objects.filter(is_published=True)[:12]
   return render(request, 'index.html', {'recipes': recipes})
 
 
+def _catalog_etag(request):
+  return make_etag([CATALOG_VERSION], user=request.user)
+
+
+@conditional(_catalog_etag)
+@read_from_replica
 def recipes(request):
   """All recipes page"""
-  recipes = Recipe.objects.filter(is_published=True)
-  return render(request, 'recipes.html', {'recipes': recipes})
+  page = paginate(Recipe.objects.filter(is_published=True), request)
+  context = {'recipes': page.items, 'page': page}
+  return _render_page(request, 'recipes.html', 'partials/recipe_cards.html', context)
+
+
+@read_from_replica
+def recipe_search(request):
+  """Full-text search over recipe titles, descriptions, ingredients and steps"""
+  query = request.GET.get('q', '').strip()
+  page = search_page(query, request)
+  context = {'recipes': page.items, 'page': page, 'query': query}
+  return _render_page(request, 'recipes.html', 'partials/recipe_cards.html', context)
+
+
+MAX_SERVINGS = 100
+
 
+def _requested_servings(request, recipe):
+  """Servings asked for with ?servings=, falling back to the recipe's own"""
+  try:
+    servings = int(request.GET.get('servings', ''))
+  except ValueError:
+    return recipe.servings
+  return min(max(servings, 1), MAX_SERVINGS)
 
+
+def _requested_market(request):
+  """Market asked for with ?market=, falling back to the Kenya average"""
+  market = request.GET.get('market', DEFAULT_MARKET)
+  return market if market in MARKET_NAMES else DEFAULT_MARKET
+
+
+def _scale_ingredients(recipe, ingredients, servings):
+  """Set ``scaled_amount``/``scaled_unit`` on each RecipeIngredient for ``servings``"""
+  multiplier = Decimal(servings) / recipe.servings if recipe.servings > 0 else 1
+  scaled = scale_many([(item.amount, item.unit) for item in ingredients], multiplier)
+  for item, (amount, unit) in zip(ingredients, scaled):
+    item.scaled_amount, item.scaled_unit = amount, unit
+
+
+def _recipe_detail_etag(request, recipe_id):
+  # The cost estimate depends on prices; view counts are left out on purpose
+  extra = ()
+  if request.user.is_authenticated:
+    # The comment form embeds the CSRF token, which login() rotates
+    get_token(request)
+    extra = (request.META['CSRF_COOKIE'],)
+  return make_etag([recipe_page_version(recipe_id), PRICE_VERSION], *extra, user=request.user)
+
+
+def _count_view(request, recipe_id):
+  view_counter.increment(recipe_id)
+
+
+@conditional(_recipe_detail_etag, not_modified=_count_view)
+@read_from_replica
 def recipe_detail(request, recipe_id):
   """Recipe detail page"""
-  recipe = get_object_or_404(Recipe, id=recipe_id)
+  recipe = get_object_or_404(recipe_detail_queryset(request.user), id=recipe_id)
   
-  # Increment view count
-  recipe.views_count += 1
-  recipe.save(update_fields=['views_count'])
-  
-  # Get average rating
-  avg_rating = recipe.ratings.aggregate(Avg('score'))['score__avg'] or 0
+  # Count the view in memory; the buffer writes counts in batches
+  view_counter.increment(recipe.id)
+  recipe.views_count += view_counter.pending(recipe.id)
   
-  # Get user's rating if logged in
-  user_rating = None
-  is_favorited = False
-  is_liked = False
-  if request.user.is_authenticated:
-    user_rating = recipe.ratings.filter(user=request.user).first()
-    is_favorited = Favorite.objects.filter(user=request.user, recipe=recipe).exists()
-    is_liked = Like.objects.filter(user=request.user, recipe=recipe).exists()
+  # Scale the ingredient amounts to the requested number of servings; the
+  # page's own controls rescale through recipe_cost instead of reloading
+  servings = _requested_servings(request, recipe)
+  ingredients = list(recipe.ingredients.all())
+  _scale_ingredients(recipe, ingredients, servings)
   
-  # Get comments and likes
-  comments = recipe.comments.all()
-  likes_count = recipe.likes.count()
-  comment_form = CommentForm()
+  # Get average rating
+  avg_rating = recipe.average_rating()
   
   context = {
     'recipe': recipe,
+    'servings': servings,
+    'max_servings': MAX_SERVINGS,
+    'ingredients': ingredients,
+    'cost': cost_recipe(recipe, ingredients, servings, _requested_market(request)),
+    'market_names': MARKET_NAMES,
     'avg_rating': round(avg_rating, 1) if avg_rating else 0,
-    'user_rating': user_rating,
-    'is_favorited': is_favorited,
-    'is_liked': is_liked,
+    'user_rating': recipe.user_score,
+    'is_favorited': recipe.is_favorited,
+    'is_liked': recipe.is_liked,
     'reviews': recipe.reviews.all(),
-    'comments': comments,
-    'likes_count': likes_count,
-    'comment_form': comment_form,
+    'comments': recipe.comments.all(),
+    'likes_count': recipe.likes_count,
+    'comment_form': CommentForm(),
   }
   
   return render(request, 'recipe_detail.html', context)
 
 
+def _toggle_engagement(model, user, recipe):
+  """Add or remove the user's Like/Favorite row, returning whether it now exists.
+  
+  The row change and the counter update made by signals.py commit together;
+  the recipe's counters are reloaded afterwards for the response.
+  """
+  with transaction.atomic():
+    deleted, _ = model.objects.filter(user=user, recipe=recipe).delete()
+    exists = not deleted
+    if exists:
+      try:
+        with transaction.atomic():
+          model.objects.create(user=user, recipe=recipe)
+      except IntegrityError:
+        pass  # A concurrent request added it first
+  recipe.refresh_from_db(fields=['likes_count', 'favorites_count'])
+  return exists
+
+
 @login_required(login_url='login')
 def toggle_favorite(request, recipe_id):
   """Toggle favorite status for a recipe (AJAX)"""
   recipe = get_object_or_404(Recipe, id=recipe_id)
   
-  favorite, created = Favorite.objects.get_or_create(user=request.user, recipe=recipe)
-  
-  if not created:
-    favorite.delete()
-    is_favorited = False
-    message = 'Recipe removed from favorites'
-  else:
-    is_favorited = True
-    message = 'Recipe added to favorites'
+  is_favorited = _toggle_engagement(Favorite, request.user, recipe)
+  message = 'Recipe added to favorites' if is_favorited else 'Recipe removed from favorites'
   
-  return JsonResponse({'is_favorited': is_favorited, 'message': message})
+  return JsonResponse({
+    'is_favorited': is_favorited,
+    'favorites_count': recipe.favorites_count,
+    'message': message
+  })
 
 
 @login_required(login_url='login')
 def my_favorites(request):
   """User's favorite recipes"""
-  favorites = Favorite.objects.filter(user=request.user).select_related('recipe')
-  recipes = [fav.recipe for fav in favorites]
-  return render(request, 'my_favorites.html', {'recipes': recipes})
+  favorites = Favorite.objects.filter(user=request.user)
+  page = paginate(favorites.select_related('recipe'), request, field='saved_at')
+  context = {
+    'recipes': [fav.recipe for fav in page.items],
+    'page': page,
+    'total': favorites.count(),
+  }
+  return _render_page(request, 'my_favorites.html', 'partials/favorite_cards.html', context)
 
 
 @login_required(login_url='login')
 def my_recipes(request):
   """User's submitted recipes"""
   recipes = Recipe.objects.filter(created_by=request.user)
-  return render(request, 'my_recipes.html', {'recipes': recipes})
+  page = paginate(recipes, request)
+  context = {'recipes': page.items, 'page': page, 'total': recipes.count()}
+  return _render_page(request, 'my_recipes.html', 'partials/my_recipe_cards.html', context)
 
 
 @login_required(login_url='login')
@@ -261,6 +371,10 @@ def add_rating(request, recipe_id):
   if request.method == 'POST':
     score = request.POST.get('score')
     if score:
+      if score not in ('1', '2', '3', '4', '5'):
+        messages.error(request, 'Rating must be between 1 and 5 stars.')
+        return redirect('recipe_detail', recipe_id=recipe_id)
+      # Recipe rating aggregates are updated in the same transaction (see signals.py)
       rating, created = Rating.objects.update_or_create(
         user=request.user,
         recipe=recipe,
@@ -279,7 +393,20 @@ def shopping_list(request):
   """User's shopping list"""
   shopping_list, created = ShoppingList.objects.get_or_create(user=request.user)
   items = shopping_list.items.all()
-  return render(request, 'shopping_list.html', {'shopping_list': shopping_list, 'items': items})
+  context = {
+    'shopping_list': shopping_list,
+    'items': items,
+    'cost': cost_shopping_list(shopping_list, _requested_market(request)),
+    'market_names': MARKET_NAMES,
+  }
+  return render(request, 'shopping_list.html', context)
+
+
+@login_required(login_url='login')
+def shopping_list_cost(request):
+  """Estimated cost of the unpurchased shopping list items (JSON)"""
+  shopping_list, created = ShoppingList.objects.get_or_create(user=request.user)
+  return JsonResponse(cost_shopping_list(shopping_list, _requested_market(request)))
 
 
 @login_required(login_url='login')
@@ -287,19 +414,32 @@ def add_to_shopping_list(request, recipe_id):
   """Add recipe ingredients to shopping list"""
   recipe = get_object_or_404(Recipe, id=recipe_id)
   shopping_list, created = ShoppingList.objects.get_or_create(user=request.user)
-  
-  for ingredient in recipe.ingredients.all():
-    shopping_list.items.create(
-      ingredient_name=ingredient.ingredient.name,
-      amount=ingredient.amount,
-      unit=ingredient.unit,
-      from_recipe=recipe
-    )
+  shopping_list.add_recipes([recipe.id])
   
   messages.success(request, f'Ingredients from "{recipe.title}" added to your shopping list!')
   return redirect('shopping_list')
 
 
+@login_required(login_url='login')
+def add_recipes_to_shopping_list(request):
+  """Add the ingredients of several recipes to the shopping list at once"""
+  if request.method != 'POST':
+    return redirect('shopping_list')
+  
+  recipe_ids = set()
+  for value in request.POST.getlist('recipe_ids'):
+    recipe_ids.update(int(part) for part in value.split(',') if part.strip().isdigit())
+  recipe_ids = list(Recipe.objects.filter(id__in=recipe_ids).order_by().values_list('id', flat=True))
+  if not recipe_ids:
+    messages.error(request, 'Choose at least one recipe to add.')
+    return redirect('shopping_list')
+  
+  shopping_list, created = ShoppingList.objects.get_or_create(user=request.user)
+  shopping_list.add_recipes(recipe_ids)
+  messages.success(request, f'Ingredients from {len(recipe_ids)} recipes added to your shopping list!')
+  return redirect('shopping_list')
+
+
 @login_required(login_url='login')
 def toggle_shopping_item(request, item_id):
   """Toggle purchased status of shopping list item (AJAX)"""
@@ -355,24 +495,67 @@ def ai_view(request):
   """AI recipe assistant page"""
   return render(request, 'ai.html')
 
+
+def recipe_cost(request, recipe_id):
+  """Estimated cost of a recipe, optionally scaled with ?servings= (JSON)"""
+  recipe = get_object_or_404(Recipe.objects.prefetch_related(
+    Prefetch('ingredients', queryset=RecipeIngredient.objects.select_related('ingredient'))), id=recipe_id)
+  servings = _requested_servings(request, recipe)
+  ingredients = list(recipe.ingredients.all())
+  estimate = cost_recipe(recipe, ingredients, servings, _requested_market(request))
+  # The amounts as the detail page shows them, for its servings control
+  _scale_ingredients(recipe, ingredients, servings)
+  for line, item in zip(estimate['lines'], ingredients):
+    line['scaled_amount'], line['scaled_unit'] = item.scaled_amount, item.scaled_unit
+  return JsonResponse(estimate)
+
+
+def recipe_state_view(request):
+  """The user's favorite, like and rating state for ?ids=1,2,3 (JSON)"""
+  recipe_ids = []
+  for value in request.GET.get('ids', '').split(','):
+    if value.strip().isdigit():
+      recipe_ids.append(int(value))
+  state = recipe_state(request.user, recipe_ids[:MAX_STATE_RECIPES])
+  return JsonResponse({'recipes': {str(pk): value for pk, value in state.items()}})
+
+
+def pantry_match(request):
+  """Recipes ranked by how many of their ingredients are in the pantry (JSON)"""
+  names = [name.strip() for name in request.GET.get('ingredients', '').split(',') if name.strip()]
+  try:
+    limit = min(max(int(request.GET.get('limit', PANTRY_LIMIT)), 1), MAX_PANTRY_LIMIT)
+  except ValueError:
+    limit = PANTRY_LIMIT
+  return JsonResponse(match_pantry(names, limit))
+
 def statistic_view(request):
   """Statistics page"""
-  return render(request, 'statistic.html')
+  return render(request, 'statitic.html')
+
+def _community_etag(request):
+  # Load the stats first: counting them on a cold cache bumps STATS_VERSION
+  get_site_stats()
+  return make_etag([CATALOG_VERSION, STATS_VERSION], user=request.user)
+
 
+@conditional(_community_etag)
+@read_from_replica
 def community(request):
   """Community page showing all recipes with reviews and ratings"""
-  recipes = Recipe.objects.filter(is_published=True).annotate(
-    avg_rating=Avg('ratings__score'),
-    review_count=models.Count('reviews')
-  ).order_by('-created_at')
+  recipes = Recipe.objects.filter(is_published=True)
+  # A subquery per card, not a GROUP BY over every published recipe before the LIMIT
+  page = paginate(
+    recipes.select_related('created_by').annotate(review_count=Recipe.related_count(Review)), request
+  )
   
   context = {
-    'recipes': recipes,
-    'total_recipes': recipes.count(),
-    'total_users': User.objects.count(),
+    'recipes': page.items,
+    'page': page,
+    'stats': get_site_stats(),
   }
   
-  return render(request, 'community.html', context)
+  return _render_page(request, 'community.html', 'partials/community_cards.html', context)
 
 
 # ============ RECIPE CREATION & EDITING ============
@@ -472,20 +655,11 @@ def toggle_like(request, recipe_id):
   """Toggle like status for a recipe (AJAX)"""
   recipe = get_object_or_404(Recipe, id=recipe_id)
   
-  like, created = Like.objects.get_or_create(user=request.user, recipe=recipe)
-  
-  if not created:
-    like.delete()
-    is_liked = False
-    message = 'Like removed'
-  else:
-    is_liked = True
-    message = 'Recipe liked'
-  
-  likes_count = recipe.likes.count()
+  is_liked = _toggle_engagement(Like, request.user, recipe)
+  message = 'Recipe liked' if is_liked else 'Like removed'
   
   return JsonResponse({
     'is_liked': is_liked,
-    'likes_count': likes_count,
+    'likes_count': recipe.likes_count,
     'message': message
   })
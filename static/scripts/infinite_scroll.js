@@ -0,0 +1,38 @@
+/* infinite scroll: when the "Older" link scrolls into view, fetch the next
+   page as a JSON fragment and append its cards to the grid */
+document.addEventListener('DOMContentLoaded', function () {
+  const link = document.querySelector('.load-more');
+  if (!link || !('IntersectionObserver' in window)) return;
+
+  const grid = document.getElementById(link.dataset.grid);
+  let loading = false;
+
+  const observer = new IntersectionObserver(function (entries) {
+    if (!entries[0].isIntersecting || loading) return;
+    loading = true;
+
+    const url = new URL(link.href);
+    url.searchParams.set('format', 'json');
+    fetch(url, { headers: { 'Accept': 'application/json' } })
+      .then(response => response.json())
+      .then(data => {
+        grid.insertAdjacentHTML('beforeend', data.html);
+        document.dispatchEvent(new CustomEvent('cards:loaded'));
+        if (data.next) {
+          url.searchParams.delete('format');
+          url.searchParams.set('cursor', data.next);
+          link.href = url.toString();
+          loading = false;
+        } else {
+          observer.disconnect();
+          link.remove();
+        }
+      })
+      .catch(error => {
+        console.error('Error:', error);
+        loading = false;
+      });
+  }, { rootMargin: '400px' });
+
+  observer.observe(link);
+});
@@ -0,0 +1,22 @@
+/* recipe state: mark the cards the user has favorited, liked or rated,
+   using the JSON blocks written next to each batch of cards */
+function applyRecipeState() {
+  document.querySelectorAll('script.recipe-state:not([data-applied])').forEach(function (block) {
+    block.dataset.applied = 'true';
+    const state = JSON.parse(block.textContent);
+    Object.keys(state).forEach(function (id) {
+      const card = document.querySelector('[data-recipe-id="' + id + '"]');
+      const icons = card && card.querySelector('.recipe-state-icons');
+      if (!icons) return;
+      const recipe = state[id];
+      let html = '';
+      if (recipe.favorited) html += ' <i class="fas fa-heart text-danger" title="In your favorites"></i>';
+      if (recipe.liked) html += ' <i class="fas fa-thumbs-up text-primary" title="You liked this"></i>';
+      if (recipe.rating) html += ' <small class="text-warning" title="Your rating">' + recipe.rating + '&#9733;</small>';
+      icons.innerHTML = html;
+    });
+  });
+}
+
+document.addEventListener('DOMContentLoaded', applyRecipeState);
+document.addEventListener('cards:loaded', applyRecipeState);
@@ -2,7 +2,12 @@ $(document).ready(function () {
   /* tokenfileld (bootstrap): autocomplete input */
   $('#tokenfield').tokenfield({
     autocomplete: {
-      source: ['egg', 'tomato', 'beef steak', 'potato'],
+      source: function (request, response) {
+        // Legacy names only: the match API compares ingredientItem names exactly
+        $.getJSON('/api/ingredients/autocomplete/', { q: request.term, source: 'legacy' }, function (matches) {
+          response(matches.map(match => match.name));
+        });
+      },
       delay: 100
     },
     showAutocompleteOnFocus: true
@@ -28,10 +33,11 @@ $(document).ready(function () {
   function filter(list_recipe) {
     $('#recipe').empty();
     $.ajax({
-      type: 'POST',
+      type: 'GET',
       url: 'http://127.0.0.1:8000/api/match_recipe/',
-      contentType: 'application/json',
-      data: JSON.stringify({ 'listIngredient': list_recipe }),
+      // GET so the browser can revalidate with If-None-Match and get a 304
+      traditional: true,
+      data: { 'listIngredient': list_recipe },
       success: function (res) {
         if (res.length === 0) {
           $('#recipe').append('<h5 style="padding-left: 23px;" class="card-text">No results were found. Try another search </h5>');